@@ -0,0 +1,294 @@
+#!/usr/bin/env python3
+"""
+Statistical gate for the ArchitectureBenchmarks results.
+
+Consumes repeated benchmark runs instead of a single sample:
+- median, MAD and a distribution-free confidence interval for the median per metric;
+- hard limits from performance-baseline.json applied to the median;
+- regression check against the recent history (one-sided Mann-Whitney U test
+  plus a minimum effect size, so tiny but "significant" shifts do not fail CI);
+- append-only JSONL history and a Markdown summary for CI.
+
+Only the Python 3 standard library is needed, so it can be fed recorded samples
+without a Swift toolchain:
+
+    python3 scripts/analyze-performance.py --no-append samples.jsonl
+    swift run -q ArchitectureBenchmarks | python3 scripts/analyze-performance.py -
+
+Each input may be a JSON object (one run), a JSON array of runs or JSONL.
+Exit code: 0 gate passed, 1 gate failed, 2 invalid input.
+"""
+
+import argparse
+import json
+import math
+import statistics
+import sys
+from datetime import datetime, timezone
+from pathlib import Path
+
+ROOT_DIR = Path(__file__).resolve().parent.parent
+DEFAULT_BASELINE = ROOT_DIR / "benchmarks" / "performance-baseline.json"
+DEFAULT_HISTORY = ROOT_DIR / "benchmarks" / "performance-history.jsonl"
+
+# (run key, baseline limit key, label, unit, minimum absolute effect for a regression)
+METRICS = [
+    ("cold_ms", "cold_ms_max", "Cold load", "ms", 1.0),
+    ("warm_ms", "warm_ms_max", "Warm load", "ms", 1.0),
+    ("warm_to_cold_ratio", "warm_to_cold_ratio_max", "Warm/Cold ratio", "", 0.01),
+]
+
+
+class InvalidInput(Exception):
+    pass
+
+
+def parse_runs(text, source):
+    text = text.strip()
+    if not text:
+        return []
+    try:
+        data = json.loads(text)
+    except ValueError:
+        data = []
+        for line_no, line in enumerate(text.splitlines(), 1):
+            if not line.strip():
+                continue
+            try:
+                data.append(json.loads(line))
+            except ValueError as exc:
+                raise InvalidInput(f"{source}:{line_no}: invalid JSON ({exc})") from exc
+    runs = data if isinstance(data, list) else [data]
+    for index, run in enumerate(runs, 1):
+        if not isinstance(run, dict):
+            raise InvalidInput(f"{source}: run #{index} is not a JSON object")
+    return runs
+
+
+def load_samples(paths):
+    runs = []
+    for path in paths:
+        if path == "-":
+            runs.extend(parse_runs(sys.stdin.read(), "<stdin>"))
+        else:
+            runs.extend(parse_runs(Path(path).read_text(encoding="utf-8"), path))
+    for index, run in enumerate(runs, 1):
+        for key, _, _, _, _ in METRICS:
+            if not isinstance(run.get(key), (int, float)):
+                raise InvalidInput(f"sample #{index} has no numeric '{key}'")
+    return runs
+
+
+def load_history(path):
+    if not path.exists():
+        return []
+    return parse_runs(path.read_text(encoding="utf-8"), str(path))
+
+
+def append_history(path, runs, recorded_at):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with path.open("a", encoding="utf-8") as handle:
+        for run in runs:
+            entry = dict(run)
+            entry.setdefault("recorded_at", recorded_at)
+            handle.write(json.dumps(entry, sort_keys=True, separators=(",", ":")) + "\n")
+
+
+def mad(values):
+    center = statistics.median(values)
+    return statistics.median(abs(value - center) for value in values)
+
+
+def binomial_cdf(k, n):
+    """P(X <= k) for X ~ Binomial(n, 0.5)."""
+    if k < 0:
+        return 0.0
+    return sum(math.comb(n, i) for i in range(0, min(k, n) + 1)) / 2**n
+
+
+def median_confidence_interval(values, confidence):
+    """Order-statistic CI for the median. Returns (low, high, achieved confidence)."""
+    ordered = sorted(values)
+    n = len(ordered)
+    alpha = 1 - confidence
+    # Largest k such that [x_(k), x_(n-k+1)] still covers the median with the requested confidence.
+    k = 0
+    while k + 1 <= n // 2 and binomial_cdf(k, n) <= alpha / 2:
+        k += 1
+    if k == 0:
+        # Too few samples for the requested level: fall back to the full range.
+        return ordered[0], ordered[-1], 1 - 2 * binomial_cdf(0, n) if n > 1 else 0.0
+    return ordered[k - 1], ordered[n - k], 1 - 2 * binomial_cdf(k - 1, n)
+
+
+def mann_whitney_greater(current, reference):
+    """One-sided Mann-Whitney U test (normal approximation with tie correction).
+
+    Returns the p-value for "current tends to be larger than reference".
+    """
+    n1, n2 = len(current), len(reference)
+    combined = sorted([(value, 0) for value in current] + [(value, 1) for value in reference])
+    ranks = [0.0] * len(combined)
+    tie_term = 0.0
+    i = 0
+    while i < len(combined):
+        j = i
+        while j + 1 < len(combined) and combined[j + 1][0] == combined[i][0]:
+            j += 1
+        average_rank = (i + j) / 2 + 1
+        for position in range(i, j + 1):
+            ranks[position] = average_rank
+        ties = j - i + 1
+        tie_term += ties**3 - ties
+        i = j + 1
+
+    rank_sum = sum(rank for rank, (_, group) in zip(ranks, combined) if group == 0)
+    u_stat = rank_sum - n1 * (n1 + 1) / 2
+    mean_u = n1 * n2 / 2
+    total = n1 + n2
+    variance = n1 * n2 / 12 * ((total + 1) - tie_term / (total * (total - 1)))
+    if variance <= 0:
+        return 1.0
+    z = (u_stat - mean_u - 0.5) / math.sqrt(variance)
+    return 0.5 * math.erfc(z / math.sqrt(2))
+
+
+def analyze(samples, history, baseline, args):
+    recent = history[-args.window:] if args.window > 0 else history
+    results = []
+    for key, limit_key, label, unit, min_abs_effect in METRICS:
+        values = [float(run[key]) for run in samples]
+        median = statistics.median(values)
+        low, high, achieved = median_confidence_interval(values, args.confidence)
+        result = {
+            "key": key,
+            "label": label,
+            "unit": unit,
+            "n": len(values),
+            "median": median,
+            "mad": mad(values),
+            "ci_low": low,
+            "ci_high": high,
+            "ci_confidence": achieved,
+            "limit": float(baseline[limit_key]) if limit_key in baseline else None,
+            "history_n": 0,
+            "history_median": None,
+            "p_value": None,
+            "regression": False,
+            "over_limit": False,
+        }
+        if result["limit"] is not None:
+            result["over_limit"] = median > result["limit"]
+
+        reference = [float(run[key]) for run in recent if isinstance(run.get(key), (int, float))]
+        result["history_n"] = len(reference)
+        if len(reference) >= args.min_history:
+            reference_median = statistics.median(reference)
+            min_effect = max(args.min_effect * reference_median, min_abs_effect)
+            result["history_median"] = reference_median
+            result["history_mad"] = mad(reference)
+            result["p_value"] = mann_whitney_greater(values, reference)
+            result["regression"] = result["p_value"] < args.alpha and median - reference_median > min_effect
+        results.append(result)
+    return results
+
+
+def fmt(value, unit):
+    if value is None:
+        return "n/a"
+    if unit:
+        return f"{value:.2f}{unit}"
+    return f"{value:.4f}"
+
+
+def markdown_summary(results, failures, history_path):
+    lines = [
+        "## Performance Baseline",
+        "",
+        f"- Result: **{'Failed' if failures else 'Passed'}**",
+        f"- Samples: **{results[0]['n']}**, history window: **{results[0]['history_n']}** runs",
+        f"- History: <code>{history_path}</code>",
+        "",
+        "| Metric | Median | MAD | CI | Limit | History median | p-value | Status |",
+        "|---|---:|---:|---:|---:|---:|---:|---|",
+    ]
+    for r in results:
+        status = "over limit" if r["over_limit"] else "regression" if r["regression"] else "ok"
+        p_value = f"{r['p_value']:.4f}" if r["p_value"] is not None else "n/a"
+        lines.append(
+            f"| {r['label']} | {fmt(r['median'], r['unit'])} | {fmt(r['mad'], r['unit'])} | "
+            f"{fmt(r['ci_low'], r['unit'])} – {fmt(r['ci_high'], r['unit'])} ({r['ci_confidence'] * 100:.0f}%) | "
+            f"{fmt(r['limit'], r['unit'])} | {fmt(r['history_median'], r['unit'])} | {p_value} | {status} |"
+        )
+    if failures:
+        lines.append("")
+        lines.extend(f"- {failure}" for failure in failures)
+    return "\n".join(lines) + "\n"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Statistical performance gate for ArchitectureBenchmarks.")
+    parser.add_argument("samples", nargs="+", help="JSON/JSONL files with benchmark runs ('-' for stdin)")
+    parser.add_argument("--baseline", type=Path, default=DEFAULT_BASELINE)
+    parser.add_argument("--history", type=Path, default=DEFAULT_HISTORY)
+    parser.add_argument("--summary", type=Path, help="write the Markdown summary to this file")
+    parser.add_argument("--window", type=int, default=30, help="recent history runs used as reference")
+    parser.add_argument("--min-history", type=int, default=5, help="history runs needed for the regression test")
+    parser.add_argument("--alpha", type=float, default=0.05, help="significance level for the regression test")
+    parser.add_argument("--min-effect", type=float, default=0.05, help="minimum relative slowdown to flag")
+    parser.add_argument("--confidence", type=float, default=0.95, help="confidence level for the median CI")
+    parser.add_argument("--warn-on-regression", action="store_true", help="report regressions without failing")
+    parser.add_argument("--no-append", action="store_true", help="do not append the samples to the history")
+    args = parser.parse_args(argv)
+
+    try:
+        samples = load_samples(args.samples)
+        history = load_history(args.history)
+        baseline = json.loads(args.baseline.read_text(encoding="utf-8"))
+    except (OSError, ValueError, InvalidInput) as exc:
+        print(f"Performance analysis failed: {exc}", file=sys.stderr)
+        return 2
+    if not samples:
+        print("Performance analysis failed: no benchmark samples.", file=sys.stderr)
+        return 2
+
+    results = analyze(samples, history, baseline, args)
+    by_key = {r["key"]: r for r in results}
+
+    failures = []
+    for r in results:
+        print(
+            f"{r['label']}: median {fmt(r['median'], r['unit'])} "
+            f"(MAD {fmt(r['mad'], r['unit'])}, CI {fmt(r['ci_low'], r['unit'])}–{fmt(r['ci_high'], r['unit'])}, "
+            f"n={r['n']}; max {fmt(r['limit'], r['unit'])})"
+        )
+        if r["over_limit"]:
+            failures.append(f"Performance gate failed: {r['key']} median over baseline.")
+        if r["regression"]:
+            message = (
+                f"{r['key']} regressed: median {fmt(r['median'], r['unit'])} vs "
+                f"{fmt(r['history_median'], r['unit'])} over the last {r['history_n']} runs (p={r['p_value']:.4f})."
+            )
+            if args.warn_on_regression:
+                print(f"Warning: {message}")
+            else:
+                failures.append(f"Performance gate failed: {message}")
+    if by_key["warm_ms"]["median"] >= by_key["cold_ms"]["median"]:
+        failures.append("Performance gate failed: warm load is not faster than cold load.")
+
+    if not args.no_append:
+        append_history(args.history, samples, datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ"))
+
+    if args.summary:
+        args.summary.write_text(markdown_summary(results, failures, args.history), encoding="utf-8")
+
+    for failure in failures:
+        print(failure)
+    if failures:
+        return 1
+    print("Performance baseline gate passed.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -23,6 +23,9 @@ RUN_UI_SMOKE="${RUN_UI_SMOKE:-0}"
 echo "Running architecture dependency checks..."
 "${SCRIPT_DIR}/check-dependencies.sh"
 
+echo "Running performance analyzer tests..."
+python3 -m unittest discover -s "${SCRIPT_DIR}/tests"
+
 echo "Running performance baseline checks..."
 "${SCRIPT_DIR}/check-performance-baseline.sh"
 
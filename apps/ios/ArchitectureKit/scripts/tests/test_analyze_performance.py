@@ -0,0 +1,140 @@
+"""
+Tests for scripts/analyze-performance.py using the recorded samples in fixtures/.
+
+    python3 -m unittest discover -s scripts/tests
+"""
+
+import contextlib
+import importlib.util
+import io
+import json
+import shutil
+import tempfile
+import unittest
+from pathlib import Path
+
+TESTS_DIR = Path(__file__).resolve().parent
+FIXTURES_DIR = TESTS_DIR / "fixtures"
+SCRIPT_PATH = TESTS_DIR.parent / "analyze-performance.py"
+
+spec = importlib.util.spec_from_file_location("analyze_performance", SCRIPT_PATH)
+analyze_performance = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(analyze_performance)
+
+BASELINE = {"cold_ms_max": 500, "warm_ms_max": 120, "warm_to_cold_ratio_max": 0.35}
+
+
+class AnalyzePerformanceTestCase(unittest.TestCase):
+    def setUp(self):
+        self.tmp = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, self.tmp)
+        self.baseline = self.tmp / "baseline.json"
+        self.baseline.write_text(json.dumps(BASELINE), encoding="utf-8")
+        self.history = self.tmp / "history.jsonl"
+        shutil.copy(FIXTURES_DIR / "history.jsonl", self.history)
+
+    def run_main(self, *args):
+        stdout = io.StringIO()
+        with contextlib.redirect_stdout(stdout), contextlib.redirect_stderr(io.StringIO()):
+            code = analyze_performance.main(
+                ["--baseline", str(self.baseline), "--history", str(self.history), *map(str, args)]
+            )
+        return code, stdout.getvalue()
+
+    def analyze(self, samples_name, baseline=None, history=True):
+        args = analyze_performance.argparse.Namespace(
+            window=30, min_history=5, alpha=0.05, min_effect=0.05, confidence=0.95
+        )
+        samples = analyze_performance.load_samples([str(FIXTURES_DIR / samples_name)])
+        runs = analyze_performance.load_history(self.history) if history else []
+        results = analyze_performance.analyze(samples, runs, baseline or BASELINE, args)
+        return {result["key"]: result for result in results}
+
+
+class AggregationTests(AnalyzePerformanceTestCase):
+    def test_median_mad_and_confidence_interval(self):
+        cold = self.analyze("samples.jsonl")["cold_ms"]
+
+        # cold_ms = 120, 122, 125, 121, 130
+        self.assertEqual(cold["n"], 5)
+        self.assertEqual(cold["median"], 122)
+        self.assertEqual(cold["mad"], 2)
+        # Five samples cannot reach 95%: the interval falls back to the full range.
+        self.assertEqual((cold["ci_low"], cold["ci_high"]), (120, 130))
+        self.assertAlmostEqual(cold["ci_confidence"], 1 - 2 / 32)
+
+    def test_confidence_interval_narrows_with_more_samples(self):
+        values = list(range(1, 21))
+        low, high, achieved = analyze_performance.median_confidence_interval(values, 0.95)
+        self.assertEqual((low, high), (6, 15))
+        self.assertGreaterEqual(achieved, 0.95)
+
+    def test_history_reference_is_limited_to_the_window(self):
+        args = analyze_performance.argparse.Namespace(
+            window=3, min_history=3, alpha=0.05, min_effect=0.05, confidence=0.95
+        )
+        samples = analyze_performance.load_samples([str(FIXTURES_DIR / "samples.jsonl")])
+        history = analyze_performance.load_history(self.history)
+        cold = analyze_performance.analyze(samples, history, BASELINE, args)[0]
+        self.assertEqual(cold["history_n"], 3)
+        self.assertEqual(cold["history_median"], 122.8)
+
+
+class RegressionFlagTests(AnalyzePerformanceTestCase):
+    def test_samples_in_line_with_history_are_not_flagged(self):
+        results = self.analyze("samples.jsonl")
+        for result in results.values():
+            self.assertFalse(result["regression"], result["key"])
+            self.assertFalse(result["over_limit"], result["key"])
+            self.assertGreater(result["p_value"], 0.05)
+
+    def test_slower_samples_are_flagged_as_regression(self):
+        results = self.analyze("samples-regressed.jsonl")
+        self.assertTrue(results["cold_ms"]["regression"])
+        self.assertLess(results["cold_ms"]["p_value"], 0.01)
+        self.assertFalse(results["cold_ms"]["over_limit"])
+        self.assertFalse(results["warm_ms"]["regression"])
+
+    def test_regression_needs_enough_history(self):
+        results = self.analyze("samples-regressed.jsonl", history=False)
+        self.assertIsNone(results["cold_ms"]["p_value"])
+        self.assertFalse(results["cold_ms"]["regression"])
+
+    def test_median_over_baseline_limit_is_flagged(self):
+        results = self.analyze("samples.jsonl", baseline=dict(BASELINE, cold_ms_max=121))
+        self.assertTrue(results["cold_ms"]["over_limit"])
+        self.assertFalse(results["warm_ms"]["over_limit"])
+
+
+class MainTests(AnalyzePerformanceTestCase):
+    def test_gate_passes_without_touching_history(self):
+        before = self.history.read_text(encoding="utf-8")
+        code, output = self.run_main("--no-append", FIXTURES_DIR / "samples.jsonl")
+        self.assertEqual(code, 0)
+        self.assertIn("Performance baseline gate passed.", output)
+        self.assertEqual(self.history.read_text(encoding="utf-8"), before)
+
+    def test_gate_fails_on_regression_and_appends_history(self):
+        summary = self.tmp / "summary.md"
+        code, output = self.run_main("--summary", summary, FIXTURES_DIR / "samples-regressed.jsonl")
+        self.assertEqual(code, 1)
+        self.assertIn("cold_ms regressed", output)
+        self.assertIn("| Cold load |", summary.read_text(encoding="utf-8"))
+        history = analyze_performance.load_history(self.history)
+        self.assertEqual(len(history), 15)
+        self.assertTrue(all("recorded_at" in run for run in history[10:]))
+
+    def test_warn_on_regression_keeps_the_gate_green(self):
+        code, output = self.run_main("--no-append", "--warn-on-regression", FIXTURES_DIR / "samples-regressed.jsonl")
+        self.assertEqual(code, 0)
+        self.assertIn("Warning: cold_ms regressed", output)
+
+    def test_invalid_samples_exit_with_2(self):
+        broken = self.tmp / "broken.jsonl"
+        broken.write_text('{"cold_ms": 120, "warm_ms": 30}\n', encoding="utf-8")
+        code, _ = self.run_main("--no-append", broken)
+        self.assertEqual(code, 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -64,11 +64,62 @@
         return {
             selectedText: text,
             surroundingContext: surrounding,
+            contextRefs: selectionContextRefs(sel.getRangeAt(0), element),
             courseId: currentCourseId(),
             topicId: currentTopicId()
         };
     }
 
+    function contextStoreVersion() {
+        var meta = document.querySelector('meta[name="sma-context-store"]');
+        return meta && meta.content ? String(meta.content).trim() : null;
+    }
+
+    function textOffsetIn(block, container, offset) {
+        var range = document.createRange();
+        range.setStart(block, 0);
+        range.setEnd(container, offset);
+        return range.toString().length;
+    }
+
+    // Referencias {block, start, end} a los bloques data-ctx que cubre la seleccion,
+    // para que el panel no tenga que enviar el texto. Si parte de la seleccion cae
+    // fuera de bloques etiquetados (titulos, diagramas) se devuelve null.
+    function selectionContextRefs(range, element) {
+        var store = contextStoreVersion();
+        if (!store || !range) return null;
+
+        var root = range.commonAncestorContainer;
+        if (root && root.nodeType !== 1) root = root.parentElement;
+        var owner = root && root.closest ? root.closest('[data-ctx]') : null;
+        var blocks = owner ? [owner] : Array.prototype.filter.call(
+            (root || document).querySelectorAll('[data-ctx]'),
+            function (block) { return range.intersectsNode(block); }
+        );
+        if (!blocks.length) return null;
+
+        var selection = blocks.map(function (block) {
+            var length = String(block.textContent || '').length;
+            return {
+                block: block.getAttribute('data-ctx'),
+                start: block.contains(range.startContainer) ? textOffsetIn(block, range.startContainer, range.startOffset) : 0,
+                end: block.contains(range.endContainer) ? textOffsetIn(block, range.endContainer, range.endOffset) : length
+            };
+        });
+
+        var covered = blocks.map(function (block, index) {
+            return String(block.textContent || '').slice(selection[index].start, selection[index].end);
+        }).join('');
+        if (covered.replace(/\s+/g, '') !== String(range.toString()).replace(/\s+/g, '')) return null;
+
+        var host = element && element.closest ? element.closest('[data-ctx]') : null;
+        return {
+            store: store,
+            selection: selection,
+            surrounding: host ? host.getAttribute('data-ctx') : null
+        };
+    }
+
     function ensureSelectionButton() {
         var btn = document.createElement('button');
         btn.type = 'button';
@@ -16,6 +16,12 @@
     var SMALL_PNG_MAX_BYTES = 350 * 1024;
     var JPEG_QUALITY = 0.85;
     var DAILY_WARNING_DEFAULT = 0.25;
+    var REQUEST_IDLE_TIMEOUT_MS = 60000;
+    var CONTEXT_KNOWN_LIMIT = 16;
+
+    // `build-html.py serve-dist` sirve el curso y el bridge en el mismo puerto:
+    // con URLs relativas no hay preflight CORS ni un segundo pool de conexiones.
+    var SAME_ORIGIN_PROXY = isSameOriginProxy();
 
     var courseId = detectCourseId() || 'unknown';
     var KEY_MEMORY = 'sma:' + courseId + ':assistant:memory';
@@ -38,7 +44,11 @@
         maxAttachments: IMAGE_MAX_ATTACHMENTS,
         maxImageBytes: IMAGE_MAX_BYTES,
         allowedImageTypes: ['image/png', 'image/jpeg'],
-        visionModels: [VISION_FALLBACK_MODEL]
+        visionModels: [VISION_FALLBACK_MODEL],
+        contextStore: null,
+        imageStore: false,
+        knownImages: {},
+        knownContext: []
     };
 
     var refs = {
@@ -129,6 +139,7 @@
 
     function clearMemory() {
         localStorage.removeItem(KEY_MEMORY);
+        state.knownContext = [];
         setStatus('Contexto del asistente limpiado.', 'success');
     }
 
@@ -213,7 +224,7 @@
     function saveConfig() {
         localStorage.setItem(KEY_MODEL, state.model);
         localStorage.setItem(KEY_MAX_TOKENS, String(state.maxTokens));
-        localStorage.setItem(KEY_PROXY_BASE, state.proxyBase);
+        if (!SAME_ORIGIN_PROXY) localStorage.setItem(KEY_PROXY_BASE, state.proxyBase);
         localStorage.setItem(KEY_DAILY_BUDGET, String(state.softDailyBudgetUsd));
     }
 
@@ -309,6 +320,10 @@
         proxyInput.autocomplete = 'off';
         proxyInput.placeholder = 'http://localhost:8090';
         proxyInput.value = state.proxyBase;
+        if (SAME_ORIGIN_PROXY) {
+            proxyInput.placeholder = 'Mismo origen';
+            proxyInput.disabled = true;
+        }
         proxyInput.addEventListener('change', function () {
             state.proxyBase = normalizeProxyBase(proxyInput.value);
             proxyInput.value = state.proxyBase;
@@ -499,6 +514,14 @@
         refs.body.scrollTop = refs.body.scrollHeight;
     }
 
+    function updateStreamingMessage(text) {
+        if (!refs.body) return;
+        var blocks = refs.body.querySelectorAll('.assistant-msg-text');
+        var last = blocks[blocks.length - 1];
+        if (last) last.textContent = text;
+        refs.body.scrollTop = refs.body.scrollHeight;
+    }
+
     function setLoadingState(isLoading) {
         state.isLoading = !!isLoading;
         if (refs.sendBtn) {
@@ -525,7 +548,13 @@
         return (n / (1024 * 1024)).toFixed(2) + ' MB';
     }
 
+    function isSameOriginProxy() {
+        var meta = document.querySelector('meta[name="sma-assistant-proxy"]');
+        return !!(meta && meta.getAttribute('content') === 'same-origin');
+    }
+
     function normalizeProxyBase(value) {
+        if (SAME_ORIGIN_PROXY) return '';
         var raw = String(value || '').trim();
         if (!raw) return defaultProxyBase();
         return raw.replace(/\/$/, '');
@@ -541,6 +570,7 @@
     }
 
     function proxyCandidates() {
+        if (SAME_ORIGIN_PROXY) return [''];
         var list = [
             normalizeProxyBase(state.proxyBase),
             defaultProxyBase(),
@@ -742,20 +772,45 @@
                                     throw new Error((file.name || 'archivo') + ': supera 3MB tras compresión.');
                                 }
 
-                                return {
-                                    id: 'att-' + Date.now() + '-' + Math.random().toString(36).slice(2, 8),
-                                    name: truncateText(file.name || 'imagen', 90),
-                                    type: outputType,
-                                    size: sizeBytes,
-                                    data: base64,
-                                    dataUrl: processedDataUrl
-                                };
+                                return hashBase64(base64).then(function (hash) {
+                                    return {
+                                        id: 'att-' + Date.now() + '-' + Math.random().toString(36).slice(2, 8),
+                                        name: truncateText(file.name || 'imagen', 90),
+                                        type: outputType,
+                                        size: sizeBytes,
+                                        data: base64,
+                                        dataUrl: processedDataUrl,
+                                        hash: hash
+                                    };
+                                });
                             });
                         });
                 });
             });
     }
 
+    // sha256 del base64, el mismo hash con el que el bridge guarda la imagen.
+    function hashBase64(base64) {
+        if (typeof crypto === 'undefined' || !crypto.subtle || typeof TextEncoder === 'undefined') {
+            return Promise.resolve(null);
+        }
+        return crypto.subtle.digest('SHA-256', new TextEncoder().encode(base64))
+            .then(function (digest) {
+                return Array.prototype.map.call(new Uint8Array(digest), function (byte) {
+                    return ('0' + byte.toString(16)).slice(-2);
+                }).join('');
+            })
+            .catch(function () { return null; });
+    }
+
+    // Las imagenes que el bridge ya tiene se envian solo por hash.
+    function imagePayload(att, allowRefs) {
+        if (allowRefs !== false && state.imageStore && att.hash && state.knownImages[att.hash]) {
+            return { name: att.name, type: att.type, hash: att.hash };
+        }
+        return { name: att.name, type: att.type, data: att.data };
+    }
+
     function handleSelectedFiles(fileList) {
         var files = Array.prototype.slice.call(fileList || []);
         if (!files.length) return;
@@ -945,7 +1000,57 @@
         }
     }
 
-    function postQueryWithFallback(payload, signal) {
+    function supportsStreaming() {
+        return typeof ReadableStream !== 'undefined' && typeof TextDecoder !== 'undefined';
+    }
+
+    // Lee el SSE del proxy (event: delta | done | error) y resuelve con el payload final.
+    function readEventStream(res, onDelta) {
+        var reader = res.body.getReader();
+        var decoder = new TextDecoder();
+        var buffer = '';
+        var finalPayload = null;
+
+        function handleEvent(rawEvent) {
+            var eventName = 'message';
+            var dataLines = [];
+            rawEvent.split('\n').forEach(function (line) {
+                if (line.indexOf('event:') === 0) eventName = line.slice(6).trim();
+                else if (line.indexOf('data:') === 0) dataLines.push(line.slice(5).replace(/^ /, ''));
+            });
+            var data = parseJsonSafe(dataLines.join('\n')) || {};
+            if (eventName === 'delta' && data.text) {
+                if (typeof onDelta === 'function') onDelta(String(data.text));
+            } else if (eventName === 'done') {
+                finalPayload = data;
+            } else if (eventName === 'error') {
+                throw new Error(String(data.error || data.detail || 'Error en el stream del proxy'));
+            }
+        }
+
+        function pump() {
+            return reader.read().then(function (chunk) {
+                if (chunk.done) {
+                    buffer += decoder.decode();
+                    if (buffer.trim()) handleEvent(buffer);
+                    if (!finalPayload) throw new Error('El stream del proxy terminó sin respuesta final.');
+                    return finalPayload;
+                }
+                buffer += decoder.decode(chunk.value, { stream: true });
+                var boundary = buffer.indexOf('\n\n');
+                while (boundary !== -1) {
+                    handleEvent(buffer.slice(0, boundary));
+                    buffer = buffer.slice(boundary + 2);
+                    boundary = buffer.indexOf('\n\n');
+                }
+                return pump();
+            });
+        }
+
+        return pump();
+    }
+
+    function postQueryWithFallback(payload, signal, onDelta) {
         var paths = queryPathCandidates();
 
         function tryPath(index) {
@@ -960,6 +1065,14 @@
                 body: JSON.stringify(payload),
                 signal: signal
             }).then(function (res) {
+                var contentType = (res.headers && res.headers.get('content-type')) || '';
+                if (res.ok && res.body && contentType.indexOf('text/event-stream') !== -1) {
+                    if (state.queryPath !== path) {
+                        state.queryPath = path;
+                    }
+                    return readEventStream(res, onDelta);
+                }
+
                 return res.text().then(function (text) {
                     var json = parseJsonSafe(text) || {};
 
@@ -969,7 +1082,9 @@
 
                     if (!res.ok) {
                         var errorText = json.error || json.detail || ('HTTP ' + res.status);
-                        throw new Error(String(errorText));
+                        var error = new Error(String(errorText));
+                        error.code = json.code || null;
+                        throw error;
                     }
 
                     if (state.queryPath !== path) {
@@ -1087,6 +1202,11 @@
                     }
                 }
 
+                state.imageStore = Boolean(cfg.image_store && cfg.image_store.enabled);
+                state.contextStore = cfg.context_store && cfg.context_store.store
+                    ? String(cfg.context_store.store)
+                    : null;
+
                 if (Array.isArray(cfg.vision_models) && cfg.vision_models.length) {
                     state.visionModels = cfg.vision_models.map(function (value) {
                         return String(value || '').trim();
@@ -1160,15 +1280,47 @@
         return 'No se recibió contenido de respuesta.';
     }
 
-    function collectContext(metadata) {
+    // Si el bridge tiene cargado el mismo almacen de contexto que la pagina, se
+    // envian solo ids de bloque y offsets; el bridge resuelve el texto. Sin almacen,
+    // un texto que el bridge ya recibio en esta conversacion se envia solo por hash.
+    function collectContext(metadata, allowRefs) {
+        var refs = metadata && metadata.contextRefs ? metadata.contextRefs : null;
+        var useRefs = Boolean(allowRefs !== false && refs && state.contextStore && refs.store === state.contextStore);
+        var selectedText = !useRefs && metadata && metadata.selectedText ? metadata.selectedText : null;
+        var surroundingContext = !useRefs && metadata && metadata.surroundingContext ? metadata.surroundingContext : null;
+        var hashes = {
+            selectedText: allowRefs !== false ? knownContextHash(selectedText) : null,
+            surroundingContext: allowRefs !== false ? knownContextHash(surroundingContext) : null
+        };
         return {
             courseId: metadata && metadata.courseId ? metadata.courseId : courseId,
             topicId: metadata && metadata.topicId ? metadata.topicId : null,
-            selectedText: metadata && metadata.selectedText ? metadata.selectedText : null,
-            surroundingContext: metadata && metadata.surroundingContext ? metadata.surroundingContext : null
+            selectedText: hashes.selectedText ? null : selectedText,
+            surroundingContext: hashes.surroundingContext ? null : surroundingContext,
+            contextRefs: useRefs ? refs : null,
+            contextHashes: hashes.selectedText || hashes.surroundingContext ? hashes : null
         };
     }
 
+    function knownContextHash(text) {
+        if (!text) return null;
+        for (var i = 0; i < state.knownContext.length; i++) {
+            if (state.knownContext[i].text === text) return state.knownContext[i].hash;
+        }
+        return null;
+    }
+
+    function rememberContext(text, hash) {
+        if (!text || !hash) return;
+        state.knownContext = state.knownContext.filter(function (item) {
+            return item.text !== text;
+        });
+        state.knownContext.push({ text: text, hash: hash });
+        if (state.knownContext.length > CONTEXT_KNOWN_LIMIT) {
+            state.knownContext = state.knownContext.slice(-CONTEXT_KNOWN_LIMIT);
+        }
+    }
+
     function submitQuestion(rawQuestion, metadata) {
         if (state.isLoading) return;
 
@@ -1185,7 +1337,8 @@
                 type: att.type,
                 size: att.size,
                 data: att.data,
-                dataUrl: att.dataUrl
+                dataUrl: att.dataUrl,
+                hash: att.hash
             };
         });
 
@@ -1200,6 +1353,16 @@
         }
 
         var context = collectContext(metadata);
+        function withContext(ctx) {
+            payload.context = ctx;
+            payload.courseId = ctx.courseId;
+            payload.topicId = ctx.topicId;
+            payload.selectedText = ctx.selectedText;
+            payload.surroundingContext = ctx.surroundingContext;
+            payload.contextRefs = ctx.contextRefs;
+            payload.contextHashes = ctx.contextHashes;
+            return payload;
+        }
         var payload = {
             prompt: question,
             question: question,
@@ -1211,13 +1374,12 @@
             topicId: context.topicId,
             selectedText: context.selectedText,
             surroundingContext: context.surroundingContext,
+            contextRefs: context.contextRefs,
+            contextHashes: context.contextHashes,
             memory: buildMemoryPayload(),
+            stream: supportsStreaming(),
             images: attachmentsSnapshot.map(function (att) {
-                return {
-                    name: att.name,
-                    type: att.type,
-                    data: att.data
-                };
+                return imagePayload(att);
             })
         };
 
@@ -1226,15 +1388,70 @@
         setLoadingState(true);
         setStatus(localWarning ? localWarning + ' Enviando…' : 'Enviando…', localWarning ? 'warning' : null);
 
+        // Timeout de inactividad: cada fragmento recibido lo reinicia, asi que una
+        // respuesta en streaming de mas de un minuto no se corta mientras siga llegando.
         var controller = typeof AbortController !== 'undefined' ? new AbortController() : null;
-        var timeoutId = setTimeout(function () {
-            if (controller) controller.abort();
-        }, 60000);
+        var timeoutId = null;
+        function armIdleTimeout() {
+            clearTimeout(timeoutId);
+            timeoutId = setTimeout(function () {
+                if (controller) controller.abort();
+            }, REQUEST_IDLE_TIMEOUT_MS);
+        }
+        armIdleTimeout();
+
+        // Borrador de la respuesta en streaming: se pinta token a token y se sustituye
+        // por el mensaje definitivo al recibir el evento done.
+        var draft = null;
+        function onDelta(text) {
+            armIdleTimeout();
+            if (!draft) {
+                draft = { role: 'assistant', text: '', at: Date.now(), attachments: [] };
+                state.messages.push(draft);
+                renderMessages();
+                setStatus('Recibiendo respuesta…', localWarning ? 'warning' : null);
+            }
+            draft.text += text;
+            updateStreamingMessage(draft.text);
+        }
+        function discardDraft() {
+            if (!draft) return;
+            state.messages = state.messages.filter(function (msg) { return msg !== draft; });
+            draft = null;
+        }
 
-        postQueryWithFallback(payload, controller ? controller.signal : undefined)
+        var signal = controller ? controller.signal : undefined;
+        postQueryWithFallback(payload, signal, onDelta)
+            .catch(function (err) {
+                // El bridge cargo otro build del almacen de contexto o ya no tiene alguna
+                // imagen referenciada: se repite la consulta con el contenido completo.
+                if (err && err.code === 'context_store_mismatch' && payload.contextRefs) {
+                    state.contextStore = null;
+                    return postQueryWithFallback(withContext(collectContext(metadata, false)), signal, onDelta);
+                }
+                if (err && err.code === 'context_unknown' && payload.contextHashes) {
+                    state.knownContext = [];
+                    return postQueryWithFallback(withContext(collectContext(metadata, false)), signal, onDelta);
+                }
+                if (err && err.code === 'image_unknown') {
+                    state.knownImages = {};
+                    payload.images = attachmentsSnapshot.map(function (att) {
+                        return imagePayload(att, false);
+                    });
+                    return postQueryWithFallback(payload, signal, onDelta);
+                }
+                throw err;
+            })
             .then(function (json) {
+                discardDraft();
                 var answer = extractAnswer(json);
                 var usage = normalizeUsage(json);
+                ((json && json.imageHashes) || []).forEach(function (hash) {
+                    state.knownImages[hash] = true;
+                });
+                var contextHashes = (json && json.contextHashes) || {};
+                rememberContext(metadata && metadata.selectedText, contextHashes.selectedText);
+                rememberContext(metadata && metadata.surroundingContext, contextHashes.surroundingContext);
 
                 var responseWarning = String((json && json.warning) || '').trim();
                 var warningText = [localWarning, responseWarning].filter(Boolean).join(' ');
@@ -1273,13 +1490,19 @@
 
                 if (warningText) {
                     setStatus('Respuesta recibida con aviso: ' + warningText, 'warning');
+                } else if (json && json.cached) {
+                    setStatus('Respuesta recibida (caché del proxy).', 'success');
                 } else {
                     setStatus('Respuesta recibida.', 'success');
                 }
             })
             .catch(function (err) {
+                if (draft) {
+                    discardDraft();
+                    renderMessages();
+                }
                 var message = err && err.name === 'AbortError'
-                    ? 'Tiempo de espera agotado al consultar el asistente.'
+                    ? 'El asistente no ha enviado datos en ' + Math.round(REQUEST_IDLE_TIMEOUT_MS / 1000) + ' s.'
                     : (err && err.message ? err.message : 'error desconocido');
                 setStatus(message + ' Inicia open-proxy.command si el proxy no está activo.', 'error');
             })
@@ -1,4 +1,5 @@
 (function () {
+  const initStartedAt = performance.now();
   const meta = document.querySelector('meta[name="course-id"]');
   if (!meta) return;
 
@@ -10,6 +11,14 @@
   const keyZen = `sma:${courseId}:zen`;
   const keyStats = `sma:${courseId}:stats`;
   const keyFontSize = `sma:${courseId}:font:size`;
+  // Compact format: topics are addressed by the numeric data-topic-num the
+  // builder assigns (stable across FILE_ORDER changes). Completion/review are
+  // base64url bitsets and scroll offsets use one tiny key per topic, so a
+  // debounced scroll writes a few bytes instead of the whole map.
+  const keyCompletedBits = `sma:${courseId}:t:done`;
+  const keyReviewBits = `sma:${courseId}:t:review`;
+  const keyLastNum = `sma:${courseId}:t:last`;
+  const keyScrollPrefix = `sma:${courseId}:t:scroll:`;
 
   const completionBtn = document.getElementById('study-completion-toggle');
   const zenBtn = document.getElementById('study-zen-toggle');
@@ -23,11 +32,6 @@
   let fontDownBtn = null;
   let fontUpBtn = null;
 
-  const completed = readJson(keyCompleted, {});
-  const review = readJson(keyReview, {});
-  const scrollMap = readJson(keyScroll, {});
-  const stats = ensureStatsShape(readJson(keyStats, {}));
-
   let timerState = { topicId: null, startedAt: null };
   let filterReviewOnly = false;
 
@@ -36,11 +40,22 @@
     section.setAttribute('data-topic-id', topicId);
     return {
       id: topicId,
+      num: Number(section.getAttribute('data-topic-num')) || 0,
       section,
       path: normalizePath(section.getAttribute('data-lesson-path') || topicId)
     };
   });
 
+  // Pages without data-topic-num (older builds, other courses) keep the JSON format.
+  const compactStorage = topics.length > 0 && topics.every((t) => t.num > 0);
+  const topicsByNum = new Map(topics.map((t) => [t.num, t]));
+  if (compactStorage) migrateLegacyProgress();
+
+  const completed = readTopicSet(keyCompleted, keyCompletedBits);
+  const review = readTopicSet(keyReview, keyReviewBits);
+  const scrollMap = compactStorage ? {} : readJson(keyScroll, {});
+  const stats = ensureStatsShape(readJson(keyStats, {}));
+
   const navLinks = Array.from(document.querySelectorAll('a.doc-nav-link'));
   mapLinksToTopics(navLinks, topics);
   setupTopBarLayout();
@@ -52,10 +67,10 @@
   reorderTopControls();
   observeTopControlsOrder();
 
-  let currentTopic = resolveCurrentTopic(topics, location.hash, localStorage.getItem(keyLastTopic));
+  let currentTopic = resolveCurrentTopic(topics, location.hash, readLastTopicId());
   if (!currentTopic) return;
 
-  renderTopic(currentTopic.id, false);
+  renderTopic(currentTopic.id, false, hashAnchorInside(currentTopic));
   applyZen(localStorage.getItem(keyZen) === '1');
   updateCompletionUi();
   updateReviewUi();
@@ -66,6 +81,7 @@
   setupScrollPersistence();
   setupIndexActions();
   startTopicTimer(currentTopic.id);
+  if (window.SMAPerf) window.SMAPerf.measure('study-ux-init', null, initStartedAt);
 
   document.addEventListener('visibilitychange', function () {
     if (document.hidden) {
@@ -82,13 +98,14 @@
   window.addEventListener('hashchange', function () {
     const next = resolveCurrentTopic(topics, location.hash, null);
     if (!next) return;
-    renderTopic(next.id, true);
+    renderTopic(next.id, true, hashAnchorInside(next));
   });
 
   function ensureStatsShape(raw) {
     return {
       totalTimeMs: Number(raw.totalTimeMs || 0),
       perTopicTimeMs: raw.perTopicTimeMs && typeof raw.perTopicTimeMs === 'object' ? raw.perTopicTimeMs : {},
+      compactIds: compactStorage || undefined,
       lastSessionStart: null
     };
   }
@@ -224,6 +241,8 @@
     if (fromHash) {
       const foundHash = topicList.find((t) => t.id === fromHash);
       if (foundHash) return foundHash;
+      const foundAnchor = topicForAnchor(topicList, fromHash);
+      if (foundAnchor) return foundAnchor;
     }
     if (stored) {
       const foundStored = topicList.find((t) => t.id === stored);
@@ -232,6 +251,19 @@
     return topicList[0] || null;
   }
 
+  function topicForAnchor(topicList, anchorId) {
+    const el = document.getElementById(anchorId);
+    const section = el && el.closest('section.lesson');
+    if (!section) return null;
+    return topicList.find((t) => t.section === section) || null;
+  }
+
+  function hashAnchorInside(topic) {
+    const anchorId = location.hash.replace('#', '');
+    if (!anchorId || anchorId === topic.id) return null;
+    return topicForAnchor(topics, anchorId) === topic ? anchorId : null;
+  }
+
   function ensureTopicNavigation() {
     topics.forEach((topic, index) => {
       let nav = topic.section.querySelector('.study-topic-nav');
@@ -272,9 +304,10 @@
     });
   }
 
-  function renderTopic(topicId, shouldRestoreScroll) {
+  function renderTopic(topicId, shouldRestoreScroll, anchorId) {
     const target = topics.find((t) => t.id === topicId);
     if (!target) return;
+    const switchStartedAt = performance.now();
 
     stopTopicTimer();
 
@@ -289,9 +322,9 @@
     });
 
     currentTopic = target;
-    localStorage.setItem(keyLastTopic, currentTopic.id);
+    writeLastTopicId(currentTopic.id);
 
-    if (location.hash.replace('#', '') !== currentTopic.id) {
+    if (!anchorId && location.hash.replace('#', '') !== currentTopic.id) {
       history.replaceState(null, '', `#${currentTopic.id}`);
     }
 
@@ -300,11 +333,22 @@
     updateReviewUi();
     updateProgressUi();
 
-    if (shouldRestoreScroll) {
+    if (anchorId) {
+      scrollToAnchor(anchorId);
+    } else if (shouldRestoreScroll) {
       restoreScrollForTopic(currentTopic.id);
     }
 
     startTopicTimer(currentTopic.id);
+    measureLessonSwitch(topicId, switchStartedAt);
+  }
+
+  // Lesson switch cost up to the frame after the switch (style, layout, paint).
+  function measureLessonSwitch(topicId, startedAt) {
+    if (!window.SMAPerf) return;
+    requestAnimationFrame(() => {
+      setTimeout(() => window.SMAPerf.measure('lesson-switch', topicId, startedAt), 0);
+    });
   }
 
   function setupButtons() {
@@ -356,8 +400,7 @@
   function setupScrollPersistence() {
     const save = debounce(function () {
       if (!currentTopic) return;
-      scrollMap[currentTopic.id] = Math.max(0, Math.round(window.scrollY || 0));
-      localStorage.setItem(keyScroll, JSON.stringify(scrollMap));
+      saveScroll(currentTopic, window.scrollY);
     }, 180);
     window.addEventListener('scroll', save, { passive: true });
   }
@@ -410,12 +453,9 @@
   }
 
   function goResume() {
-    if (currentTopic) {
-      scrollMap[currentTopic.id] = Math.max(0, Math.round(window.scrollY || 0));
-      localStorage.setItem(keyScroll, JSON.stringify(scrollMap));
-    }
+    if (currentTopic) saveScroll(currentTopic, window.scrollY);
 
-    const last = localStorage.getItem(keyLastTopic) || (currentTopic && currentTopic.id) || null;
+    const last = readLastTopicId() || (currentTopic && currentTopic.id) || null;
     const target = last ? topics.find((t) => t.id === last) : null;
 
     if (target) {
@@ -439,7 +479,7 @@
   function updateResumeButtonState() {
     const btn = document.getElementById('study-resume-btn');
     if (!btn) return;
-    const last = localStorage.getItem(keyLastTopic);
+    const last = readLastTopicId();
     const exists = !!topics.find((t) => t.id === last);
     btn.disabled = !exists;
     btn.title = exists ? 'Abrir el último tema visitado' : 'Aún no hay un tema previo guardado';
@@ -474,7 +514,7 @@
     } else {
       completed[id] = true;
     }
-    localStorage.setItem(keyCompleted, JSON.stringify(completed));
+    writeTopicSet(keyCompleted, keyCompletedBits, completed);
     ensureTopicNavigation();
     updateCompletionUi();
     updateProgressUi();
@@ -490,7 +530,7 @@
     } else {
       review[id] = true;
     }
-    localStorage.setItem(keyReview, JSON.stringify(review));
+    writeTopicSet(keyReview, keyReviewBits, review);
     updateReviewUi();
     decorateNavStates();
     applyReviewFilter();
@@ -579,7 +619,8 @@
     if (!timerState.topicId || !timerState.startedAt) return;
     const elapsed = Math.max(0, Date.now() - timerState.startedAt);
     stats.totalTimeMs += elapsed;
-    stats.perTopicTimeMs[timerState.topicId] = Number(stats.perTopicTimeMs[timerState.topicId] || 0) + elapsed;
+    const statsKey = storageIdFor(timerState.topicId);
+    stats.perTopicTimeMs[statsKey] = Number(stats.perTopicTimeMs[statsKey] || 0) + elapsed;
     stats.lastSessionStart = null;
     persistStats();
     timerState = { topicId: null, startedAt: null };
@@ -758,7 +799,7 @@
   }
 
   function restoreScrollForTopic(topicId) {
-    const value = scrollMap[topicId];
+    const value = readScroll(topicId);
     const top = typeof value === 'number' ? value : 0;
     requestAnimationFrame(() => {
       setTimeout(() => {
@@ -767,6 +808,13 @@
     });
   }
 
+  function scrollToAnchor(anchorId) {
+    requestAnimationFrame(() => {
+      const el = document.getElementById(anchorId);
+      if (el) el.scrollIntoView({ block: 'center', behavior: 'auto' });
+    });
+  }
+
   function normalizePath(path) {
     if (!path) return '';
     let p = String(path).trim();
@@ -779,6 +827,156 @@
     return p;
   }
 
+  function storageIdFor(topicId) {
+    if (!compactStorage) return topicId;
+    const topic = topics.find((t) => t.id === topicId);
+    return topic ? String(topic.num) : topicId;
+  }
+
+  function readTopicSet(legacyKey, bitsKey) {
+    if (!compactStorage) return readJson(legacyKey, {});
+    const set = {};
+    decodeBits(localStorage.getItem(bitsKey)).forEach((num) => {
+      const topic = topicsByNum.get(num);
+      if (topic) set[topic.id] = true;
+    });
+    return set;
+  }
+
+  function writeTopicSet(legacyKey, bitsKey, set) {
+    if (!compactStorage) {
+      localStorage.setItem(legacyKey, JSON.stringify(set));
+      return;
+    }
+    const nums = topics.filter((t) => set[t.id]).map((t) => t.num);
+    localStorage.setItem(bitsKey, encodeBits(nums));
+  }
+
+  function readLastTopicId() {
+    if (!compactStorage) return localStorage.getItem(keyLastTopic);
+    const topic = topicsByNum.get(Number(localStorage.getItem(keyLastNum)));
+    return topic ? topic.id : null;
+  }
+
+  function writeLastTopicId(topicId) {
+    if (!compactStorage) {
+      localStorage.setItem(keyLastTopic, topicId);
+      return;
+    }
+    localStorage.setItem(keyLastNum, storageIdFor(topicId));
+  }
+
+  function readScroll(topicId) {
+    if (!compactStorage) return scrollMap[topicId];
+    const raw = localStorage.getItem(keyScrollPrefix + storageIdFor(topicId));
+    return raw === null ? undefined : Number(raw);
+  }
+
+  function saveScroll(topic, y) {
+    const top = Math.max(0, Math.round(y || 0));
+    if (!compactStorage) {
+      scrollMap[topic.id] = top;
+      localStorage.setItem(keyScroll, JSON.stringify(scrollMap));
+      return;
+    }
+    const key = keyScrollPrefix + topic.num;
+    if (top === 0) {
+      localStorage.removeItem(key);
+    } else {
+      localStorage.setItem(key, String(top));
+    }
+  }
+
+  // Bit n of the set is topic num n; stored as unpadded base64url.
+  function encodeBits(nums) {
+    if (!nums.length) return '';
+    const bytes = new Uint8Array((Math.max.apply(null, nums) >> 3) + 1);
+    nums.forEach((num) => {
+      bytes[num >> 3] |= 1 << (num & 7);
+    });
+    let binary = '';
+    bytes.forEach((byte) => {
+      binary += String.fromCharCode(byte);
+    });
+    return btoa(binary).replace(/\+/g, '-').replace(/\//g, '_').replace(/=+$/, '');
+  }
+
+  function decodeBits(value) {
+    if (!value) return [];
+    let binary = '';
+    try {
+      binary = atob(value.replace(/-/g, '+').replace(/_/g, '/'));
+    } catch (_err) {
+      return [];
+    }
+    const nums = [];
+    for (let i = 0; i < binary.length; i++) {
+      const byte = binary.charCodeAt(i);
+      for (let bit = 0; bit < 8; bit++) {
+        if (byte & (1 << bit)) nums.push(i * 8 + bit);
+      }
+    }
+    return nums;
+  }
+
+  // Move from the JSON maps keyed by long path ids to the compact keys. Ids this page
+  // does not know (a lesson missing from this build) stay under the legacy key, so a
+  // later build that has them still migrates them instead of losing that progress.
+  function migrateLegacyProgress() {
+    const byId = new Map(topics.map((t) => [t.id, t]));
+    [[keyCompleted, keyCompletedBits], [keyReview, keyReviewBits]].forEach(([legacyKey, bitsKey]) => {
+      const legacy = readJson(legacyKey, null);
+      if (!legacy) return;
+      const nums = new Set(decodeBits(localStorage.getItem(bitsKey)));
+      Object.keys(legacy).forEach((id) => {
+        if (legacy[id] && byId.has(id)) nums.add(byId.get(id).num);
+      });
+      localStorage.setItem(bitsKey, encodeBits(Array.from(nums)));
+      keepUnmigrated(legacyKey, legacy, (id) => !legacy[id] || byId.has(id));
+    });
+
+    const legacyScroll = readJson(keyScroll, null);
+    if (legacyScroll) {
+      Object.keys(legacyScroll).forEach((id) => {
+        const topic = byId.get(id);
+        if (topic && legacyScroll[id] > 0) localStorage.setItem(keyScrollPrefix + topic.num, String(legacyScroll[id]));
+      });
+      keepUnmigrated(keyScroll, legacyScroll, (id) => byId.has(id));
+    }
+
+    const legacyLast = localStorage.getItem(keyLastTopic);
+    if (legacyLast !== null && byId.has(legacyLast)) {
+      if (localStorage.getItem(keyLastNum) === null) {
+        localStorage.setItem(keyLastNum, String(byId.get(legacyLast).num));
+      }
+      localStorage.removeItem(keyLastTopic);
+    }
+
+    const legacyStats = readJson(keyStats, null);
+    if (legacyStats && legacyStats.perTopicTimeMs && !legacyStats.compactIds) {
+      const perTopic = {};
+      Object.keys(legacyStats.perTopicTimeMs).forEach((id) => {
+        const key = byId.has(id) ? String(byId.get(id).num) : id;
+        perTopic[key] = Number(perTopic[key] || 0) + Number(legacyStats.perTopicTimeMs[id] || 0);
+      });
+      legacyStats.perTopicTimeMs = perTopic;
+      legacyStats.compactIds = true;
+      localStorage.setItem(keyStats, JSON.stringify(legacyStats));
+    }
+  }
+
+  function keepUnmigrated(key, map, migrated) {
+    const rest = {};
+    Object.keys(map).forEach((id) => {
+      if (!migrated(id)) rest[id] = map[id];
+    });
+    if (Object.keys(rest).length) {
+      localStorage.setItem(key, JSON.stringify(rest));
+    } else {
+      localStorage.removeItem(key);
+    }
+  }
+
   function readJson(key, fallback) {
     const raw = localStorage.getItem(key);
     if (!raw) return fallback;
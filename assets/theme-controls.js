@@ -17,7 +17,14 @@
   }
 
   function applyStyle(style) {
-    document.documentElement.setAttribute('data-style', style);
+    const setStyle = (ready) => document.documentElement.setAttribute('data-style', ready);
+    // The course shell only downloads the stylesheet of the active style; wait
+    // for it before switching so the page never paints without its variables.
+    if (typeof window.loadVisualStyle === 'function') {
+      style = window.loadVisualStyle(style, setStyle);
+    } else {
+      setStyle(style);
+    }
     localStorage.setItem('course-style', style);
     const btn = document.getElementById('style-cycle-btn');
     if (btn) btn.textContent = 'Estilo: ' + style.charAt(0).toUpperCase() + style.slice(1);
@@ -81,19 +88,26 @@
   }
 
   function rerenderMermaidSafely() {
+    // The course template keeps a per-theme SVG cache and only re-renders
+    // diagrams near the viewport; prefer it when available.
+    if (typeof window.renderMermaid === 'function') {
+      window.renderMermaid();
+      return;
+    }
     if (typeof mermaid === 'undefined') return;
 
-    const blocks = document.querySelectorAll('pre.mermaid');
+    // Only diagrams already rendered by their section; the rest pick up the
+    // current theme when their section becomes visible.
+    const blocks = Array.from(document.querySelectorAll('pre.mermaid[data-original-mermaid]'));
+    if (!blocks.length) return;
+
     blocks.forEach((el) => {
-      if (!el.dataset.originalMermaid) {
-        el.dataset.originalMermaid = el.textContent || '';
-      }
       el.textContent = el.dataset.originalMermaid;
       el.removeAttribute('data-processed');
     });
 
     mermaid.initialize({ startOnLoad: false, theme: currentMermaidTheme(), securityLevel: 'loose' });
-    mermaid.run({ querySelector: 'pre.mermaid' });
+    mermaid.run({ nodes: blocks });
   }
 
   window.applyStyle = applyStyle;
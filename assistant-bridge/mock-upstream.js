@@ -0,0 +1,152 @@
+#!/usr/bin/env node
+
+// Upstream falso compatible con /chat/completions de OpenAI para probar el bridge
+// sin API key ni coste. Responde en JSON o en SSE (stream: true), con usage.
+// Puede simular un upstream lento o inestable para probar deadlines y hedging.
+// Para pruebas deterministas, una directiva en la pregunta decide la respuesta:
+// [mock:slow-first] atasca solo la primera peticion con ese prompt (el hedge
+// gana), [mock:fail-first] responde 500 solo a la primera (el reintento la
+// salva) y [mock:400] responde siempre 400 (no se reintenta).
+//
+//   node assistant-bridge/mock-upstream.js
+//   OPENAI_BASE_URL=http://localhost:8799/v1 OPENAI_API_KEY=mock node assistant-bridge/server.js
+//   MOCK_UPSTREAM_SLOW_RATE=0.1 MOCK_UPSTREAM_FAIL_RATE=0.05 node assistant-bridge/mock-upstream.js
+//   curl http://localhost:8799/stats   # peticiones, conexiones TCP abiertas y respuestas cortadas
+
+const http = require('http');
+
+const PORT = Number(process.env.MOCK_UPSTREAM_PORT || 8799);
+const FIRST_TOKEN_DELAY_MS = Number(process.env.MOCK_UPSTREAM_DELAY_MS || 300);
+const TOKEN_DELAY_MS = Number(process.env.MOCK_UPSTREAM_TOKEN_DELAY_MS || 40);
+const INCLUDE_USAGE = process.env.MOCK_UPSTREAM_NO_USAGE !== '1';
+const SLOW_RATE = Number(process.env.MOCK_UPSTREAM_SLOW_RATE || 0);
+const SLOW_MS = Number(process.env.MOCK_UPSTREAM_SLOW_MS || 5000);
+const FAIL_RATE = Number(process.env.MOCK_UPSTREAM_FAIL_RATE || 0);
+
+let requestCount = 0;
+const stats = { connections: 0, requests: 0, slow: 0, failed: 0, cancelled: 0 };
+const seenPrompts = new Set();
+
+const server = http.createServer((req, res) => {
+    if (req.method === 'GET' && req.url === '/stats') {
+        writeJson(res, 200, stats);
+        return;
+    }
+
+    if (req.method !== 'POST' || !/\/chat\/completions$/.test(req.url)) {
+        writeJson(res, 404, { error: { message: 'Not found' } });
+        return;
+    }
+
+    let raw = '';
+    req.on('data', (chunk) => {
+        raw += chunk;
+    });
+    req.on('end', () => {
+        let body;
+        try {
+            body = JSON.parse(raw || '{}');
+        } catch (_err) {
+            writeJson(res, 400, { error: { message: 'JSON inválido' } });
+            return;
+        }
+
+        requestCount += 1;
+        stats.requests += 1;
+        // El bridge cierra la conexion al abortar (cliente que cancela, hedge perdedor,
+        // deadline): la respuesta queda a medias.
+        res.on('close', () => {
+            if (!res.writableFinished) stats.cancelled += 1;
+        });
+
+        const promptKey = JSON.stringify(body.messages || []);
+        const directive = (promptKey.match(/\[mock:([\w-]+)\]/) || [])[1];
+        const first = !seenPrompts.has(promptKey);
+        seenPrompts.add(promptKey);
+
+        if (directive === '400') {
+            writeJson(res, 400, { error: { message: 'Peticion rechazada (simulada)' } });
+            return;
+        }
+        if ((directive === 'fail-first' && first) || Math.random() < FAIL_RATE) {
+            stats.failed += 1;
+            writeJson(res, 500, { error: { message: 'Fallo simulado del upstream' } });
+            return;
+        }
+        const stalled = (directive === 'slow-first' && first) || Math.random() < SLOW_RATE;
+        if (stalled) stats.slow += 1;
+
+        const answer = mockAnswer(body, requestCount);
+        const tokens = answer.match(/\S+\s*/g) || [];
+        const usage = {
+            prompt_tokens: Math.ceil(JSON.stringify(body.messages || []).length / 4),
+            completion_tokens: tokens.length
+        };
+        usage.total_tokens = usage.prompt_tokens + usage.completion_tokens;
+
+        setTimeout(() => {
+            if (body.stream) {
+                streamAnswer(res, body, tokens, usage);
+            } else {
+                writeJson(res, 200, {
+                    id: `mock-${requestCount}`,
+                    object: 'chat.completion',
+                    model: body.model,
+                    choices: [{ index: 0, message: { role: 'assistant', content: answer }, finish_reason: 'stop' }],
+                    usage
+                });
+            }
+        }, FIRST_TOKEN_DELAY_MS + (stalled ? SLOW_MS : 0));
+    });
+});
+
+server.on('connection', () => {
+    stats.connections += 1;
+});
+
+server.listen(PORT, () => {
+    console.log(`[mock-upstream] running on http://localhost:${PORT}/v1`);
+});
+
+function streamAnswer(res, body, tokens, usage) {
+    res.writeHead(200, { 'Content-Type': 'text/event-stream; charset=utf-8', 'Cache-Control': 'no-cache' });
+
+    let index = 0;
+    const timer = setInterval(() => {
+        if (index < tokens.length) {
+            writeChunk(res, { choices: [{ index: 0, delta: { content: tokens[index] }, finish_reason: null }] });
+            index += 1;
+            return;
+        }
+        clearInterval(timer);
+        writeChunk(res, { choices: [{ index: 0, delta: {}, finish_reason: 'stop' }] });
+        const wantsUsage = body.stream_options && body.stream_options.include_usage;
+        if (INCLUDE_USAGE && wantsUsage) {
+            writeChunk(res, { choices: [], usage });
+        }
+        res.end('data: [DONE]\n\n');
+    }, TOKEN_DELAY_MS);
+
+    res.on('close', () => clearInterval(timer));
+}
+
+function writeChunk(res, payload) {
+    res.write(`data: ${JSON.stringify(payload)}\n\n`);
+}
+
+function mockAnswer(body, count) {
+    const messages = Array.isArray(body.messages) ? body.messages : [];
+    const user = messages.filter((msg) => msg.role === 'user').pop();
+    const content = user && typeof user.content === 'string'
+        ? user.content
+        : JSON.stringify((user && user.content) || '');
+    const question = (content.match(/Pregunta[^:]*:\s*(.+)/i) || [null, content])[1].trim().slice(0, 120);
+    return `Respuesta simulada #${count} (${body.model || 'sin modelo'}). ` +
+        `Has preguntado: "${question}". ` +
+        'Esta respuesta la genera mock-upstream.js para probar el bridge sin coste.';
+}
+
+function writeJson(res, status, payload) {
+    res.writeHead(status, { 'Content-Type': 'application/json; charset=utf-8' });
+    res.end(JSON.stringify(payload));
+}
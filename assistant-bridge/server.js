@@ -1,6 +1,8 @@
 #!/usr/bin/env node
 
 const http = require('http');
+const https = require('https');
+const crypto = require('crypto');
 const fs = require('fs');
 const path = require('path');
 
@@ -28,6 +30,42 @@ const MAX_IMAGES_PER_QUERY = 3;
 const MAX_IMAGE_BYTES = 3 * 1024 * 1024;
 const MAX_BODY_BYTES = 16 * 1024 * 1024;
 const ALLOWED_IMAGE_TYPES = ['image/png', 'image/jpeg'];
+const SYSTEM_PROMPT = 'Asistente pedagógico. Claro, práctico, breve y preciso.';
+const ANSWER_CACHE_MAX_ENTRIES = Math.max(0, Math.round(Number(process.env.ASSISTANT_CACHE_MAX_ENTRIES ?? 500)) || 0);
+const ANSWER_CACHE_TTL_MS = Math.max(0, Number(process.env.ASSISTANT_CACHE_TTL_SECONDS ?? 3600) || 0) * 1000;
+const UPSTREAM_MAX_CONCURRENCY = Math.max(1, Math.round(Number(process.env.ASSISTANT_UPSTREAM_CONCURRENCY ?? 4)) || 1);
+const UPSTREAM_QUEUE_MAX = Math.max(0, Math.round(Number(process.env.ASSISTANT_UPSTREAM_QUEUE_MAX ?? 16)) || 0);
+const UPSTREAM_QUEUE_TIMEOUT_MS = Math.max(0, Number(process.env.ASSISTANT_UPSTREAM_QUEUE_TIMEOUT_MS ?? 5000) || 0);
+const UPSTREAM_RETRY_AFTER_SECONDS = 2;
+const UPSTREAM_TIMEOUT_MS = Math.max(1000, Number(process.env.ASSISTANT_UPSTREAM_TIMEOUT_MS ?? 60000) || 60000);
+const UPSTREAM_MAX_SOCKETS = Math.max(1, Math.round(Number(process.env.ASSISTANT_UPSTREAM_MAX_SOCKETS ?? 16)) || 1);
+const UPSTREAM_HEDGE_ENABLED = process.env.ASSISTANT_UPSTREAM_HEDGE === '1';
+const UPSTREAM_HEDGE_DELAY_MS = Math.max(0, Number(process.env.ASSISTANT_UPSTREAM_HEDGE_DELAY_MS ?? 1500) || 0);
+const UPSTREAM_HEDGE_MIN_DELAY_MS = 100;
+const UPSTREAM_RETRY_ENABLED = process.env.ASSISTANT_UPSTREAM_RETRY !== '0';
+// Errores de red transitorios: el mismo POST puede salir bien en otra conexion.
+const UPSTREAM_RETRYABLE_CODES = new Set(['ECONNRESET', 'ECONNREFUSED', 'ECONNABORTED', 'EPIPE', 'ETIMEDOUT', 'EHOSTUNREACH', 'ENETUNREACH', 'EAI_AGAIN']);
+const UPSTREAM_HEDGE_MIN_SAMPLES = 20;
+const UPSTREAM_HEDGE_WINDOW = 200;
+const LATENCY_STAGES = ['parse', 'normalize_images', 'build_prompt', 'upstream', 'total'];
+const LATENCY_BUCKETS_MS = [0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000, 60000];
+const LATENCY_MAX_TOPICS = Math.max(1, Math.round(Number(process.env.ASSISTANT_METRICS_MAX_TOPICS ?? 100)) || 1);
+const IMAGE_STORE_MAX_BYTES = Math.max(0, Number(process.env.ASSISTANT_IMAGE_STORE_MAX_MB ?? 32) || 0) * 1024 * 1024;
+const IMAGE_STORE_MAX_ENTRIES = Math.max(0, Math.round(Number(process.env.ASSISTANT_IMAGE_STORE_MAX_ENTRIES ?? 64)) || 0);
+const IMAGE_STORE_TTL_MS = Math.max(0, Number(process.env.ASSISTANT_IMAGE_STORE_TTL_SECONDS ?? 1800) || 0) * 1000;
+const PROMPT_BUDGET_TOKENS = Math.max(200, Math.round(Number(process.env.ASSISTANT_PROMPT_BUDGET_TOKENS ?? 2000)) || 2000);
+const PROMPT_BUDGET_SHARES = parsePromptShares(process.env.ASSISTANT_PROMPT_BUDGET_SHARES || 'context:0.55,memory:0.45');
+const PROMPT_PARTS = ['question', 'context', 'memory'];
+const PROMPT_SHARED_PARTS = ['context', 'memory'];
+const PROMPT_CHARS_PER_TOKEN = 4;
+const PROMPT_DIGEST_TOKENS = 30;
+const CONTEXT_STORE_PATH = process.env.ASSISTANT_CONTEXT_STORE || path.join(__dirname, '..', 'dist', 'context-store.json');
+const CONTEXT_STORE_CHECK_MS = 1000;
+const CONTEXT_MAX_REFS = 64;
+const CONTEXT_SELECTION_MAX_CHARS = 1200;
+const CONTEXT_SURROUNDING_MAX_CHARS = 900;
+const CONTEXT_TEXT_MAX_ENTRIES = Math.max(0, Math.round(Number(process.env.ASSISTANT_CONTEXT_TEXT_ENTRIES ?? 256)) || 0);
+const CONTEXT_TEXT_MAX_CHARS = 8000;
 
 const runtimeConfig = {
     softDailyBudgetUsd: normalizeNonNegativeNumber(SOFT_DAILY_BUDGET_USD_DEFAULT, 2.0),
@@ -61,6 +99,118 @@ const usage = {
     }
 };
 
+const answerCache = {
+    entries: new Map(),
+    hits: 0,
+    misses: 0,
+    bypassed: 0,
+    evictions: 0,
+    savedTokens: 0,
+    savedEstimatedCostUSD: 0
+};
+
+const upstreamLimiter = {
+    active: 0,
+    queue: [],
+    admitted: 0,
+    queued: 0,
+    rejected: 0,
+    timedOut: 0,
+    maxQueueDepth: 0,
+    totalWaitMs: 0,
+    maxWaitMs: 0
+};
+
+const inFlight = new Map();
+
+// Conexiones keep-alive reutilizadas entre consultas: sin TLS ni TCP nuevos por pregunta.
+const UPSTREAM_URL = new URL(`${OPENAI_BASE_URL.replace(/\/+$/, '')}/chat/completions`);
+const upstreamTransport = UPSTREAM_URL.protocol === 'http:' ? http : https;
+const upstreamAgent = new upstreamTransport.Agent({ keepAlive: true, maxSockets: UPSTREAM_MAX_SOCKETS });
+
+const upstreamCalls = {
+    attempts: 0,
+    reusedSockets: 0,
+    newSockets: 0,
+    deadlineExceeded: 0,
+    hedgesFired: 0,
+    hedgeWins: 0,
+    retries: 0,
+    losersAborted: 0,
+    // Lo que el upstream puede facturar por los intentos abortados (estimado).
+    loserPromptTokens: 0,
+    loserCompletionTokens: 0,
+    loserEstimatedCostUSD: 0,
+    // Latencias recientes por modelo y modo (respuesta completa en JSON,
+    // primer token en streaming) para calcular el retraso del hedge.
+    samples: new Map()
+};
+
+// Imagenes ya aceptadas, por sha256 de su base64 (LRU por orden de insercion del Map).
+// Tras la primera subida el panel las referencia solo por hash.
+const imageStore = {
+    entries: new Map(),
+    bytes: 0,
+    hits: 0,
+    misses: 0,
+    stored: 0,
+    evictions: 0,
+    savedUploadBytes: 0
+};
+
+// Uso del presupuesto de tokens del prompt, acumulado por parte.
+const promptBudget = {
+    requests: 0,
+    trimmedRequests: 0,
+    usedTokens: 0,
+    maxUsedTokens: 0,
+    parts: {
+        system: { used: 0, trimmed: 0 },
+        question: { used: 0, trimmed: 0 },
+        context: { used: 0, trimmed: 0 },
+        memory: { used: 0, trimmed: 0 }
+    },
+    summarizedTurns: 0,
+    droppedTurns: 0
+};
+
+// Almacen bloque -> texto generado por scripts/build-html.py. El panel envia ids
+// de bloque y offsets en lugar del texto seleccionado; se recarga si cambia el fichero.
+const contextStore = {
+    store: null,
+    blocks: new Map(),
+    mtimeMs: 0,
+    checkedAt: 0,
+    loads: 0,
+    loadErrors: 0,
+    refRequests: 0,
+    textRequests: 0,
+    mismatches: 0,
+    resolvedChars: 0,
+    dedupedSurrounding: 0,
+    // Textos de contexto enviados tal cual, por sha256 (LRU): en la conversacion el
+    // panel ya no los reenvia, solo su hash.
+    texts: new Map(),
+    textHits: 0,
+    textMisses: 0,
+    savedUploadChars: 0
+};
+
+const coalescing = {
+    leaders: 0,
+    joined: 0,
+    savedTokens: 0,
+    savedEstimatedCostUSD: 0
+};
+
+// Histogramas por (etapa, modelo, topic). Los topics son texto del cliente:
+// se acotan a LATENCY_MAX_TOPICS distintos y el resto cuenta como "other".
+const latency = {
+    series: new Map(),
+    topics: new Set(),
+    overflowTopics: 0
+};
+
 const server = http.createServer(async (req, res) => {
     setCors(res);
 
@@ -85,8 +235,11 @@ const server = http.createServer(async (req, res) => {
             daily_warning_usd: runtimeConfig.dailyWarningUsd,
             max_images: MAX_IMAGES_PER_QUERY,
             max_image_bytes: MAX_IMAGE_BYTES,
+            image_store: { enabled: isImageStoreEnabled(), ttl_seconds: IMAGE_STORE_TTL_MS / 1000 },
             vision_models: VISION_MODELS,
-            query_path: DEFAULT_QUERY_PATH
+            query_path: DEFAULT_QUERY_PATH,
+            streaming: true,
+            context_store: loadContextStore() ? { store: contextStore.store, blocks: contextStore.blocks.size } : null
         });
         return;
     }
@@ -114,7 +267,14 @@ const server = http.createServer(async (req, res) => {
 
     if (req.method === 'GET' && req.url === '/metrics') {
         rollDailyIfNeeded();
-        writeJson(res, 200, metricsPayload());
+        writeJson(res, 200, metricsPayload({ latencySeries: true }));
+        return;
+    }
+
+    if (req.method === 'GET' && (req.url === '/metrics/prometheus' || req.url === '/metrics?format=prometheus')) {
+        rollDailyIfNeeded();
+        res.writeHead(200, { 'Content-Type': 'text/plain; version=0.0.4; charset=utf-8' });
+        res.end(prometheusMetrics());
         return;
     }
 
@@ -126,8 +286,10 @@ const server = http.createServer(async (req, res) => {
             return;
         }
 
+        const requestStartedAt = performance.now();
         const body = await readJsonBody(req, res);
         if (!body) return;
+        const parseMs = performance.now() - requestStartedAt;
 
         const question = String(body.question || body.prompt || '').trim();
         if (!question) {
@@ -135,9 +297,15 @@ const server = http.createServer(async (req, res) => {
             return;
         }
 
+        let stageStartedAt = performance.now();
         const imagesResult = normalizeImages(body.images);
+        const normalizeImagesMs = performance.now() - stageStartedAt;
         if (imagesResult.error) {
-            writeJson(res, 400, { error: imagesResult.error });
+            writeJson(res, imagesResult.status || 400, {
+                error: imagesResult.error,
+                code: imagesResult.code,
+                missing: imagesResult.missing
+            });
             return;
         }
 
@@ -160,48 +328,143 @@ const server = http.createServer(async (req, res) => {
                 : `El modelo ${requestedModel} no soporta visión. Fallback automático a ${usedModel}.`;
         }
 
-        const prompt = buildPrompt({
+        stageStartedAt = performance.now();
+        const contextResult = resolveRequestContext(body);
+        if (contextResult.error) {
+            writeJson(res, contextResult.status, { error: contextResult.error, code: contextResult.code });
+            return;
+        }
+        const promptInput = {
             question,
-            selectedText: body.selectedText || (body.context && body.context.selectedText),
-            surroundingContext: body.surroundingContext || (body.context && body.context.surroundingContext),
+            selectedText: contextResult.selectedText,
+            surroundingContext: contextResult.surroundingContext,
             courseId: body.courseId || (body.context && body.context.courseId),
             topicId: body.topicId || (body.context && body.context.topicId),
             memory: normalizeMemory(body.memory)
-        });
+        };
+        const prompt = buildPrompt(promptInput);
 
-        try {
-            const completion = await callOpenAI({
-                model: usedModel,
-                maxTokens,
-                prompt,
-                images
-            });
+        const latencyModel = usedModel;
+        const latencyTopic = latencyTopicLabel(promptInput.topicId);
+        const observeStage = (stage, ms) => recordLatency(stage, latencyModel, latencyTopic, ms);
+        observeStage('parse', parseMs);
+        observeStage('normalize_images', normalizeImagesMs);
+        observeStage('build_prompt', performance.now() - stageStartedAt);
 
-            const answer = extractAnswer(completion);
-            const usageTokens = completion && completion.usage ? completion.usage : {};
+        const wantsStream = body.stream === true || String(req.headers.accept || '').includes('text/event-stream');
 
-            const promptTokens = Number(usageTokens.prompt_tokens || 0);
-            const completionTokens = Number(usageTokens.completion_tokens || 0);
-            const totalTokens = Number(usageTokens.total_tokens || promptTokens + completionTokens);
-            const estimated = estimateCost(usedModel, promptTokens, completionTokens);
+        const cacheable = isAnswerCacheEnabled() && images.length === 0 && body.cache !== false && body.noCache !== true;
+        const cacheKey = cacheable ? answerCacheKey(promptInput, usedModel, maxTokens) : null;
+        if (!cacheable) answerCache.bypassed += 1;
 
-            registerUsage({
+        const cached = cacheKey ? readAnswerCache(cacheKey) : null;
+        if (cached) {
+            answerCache.savedTokens += cached.totalTokens;
+            answerCache.savedEstimatedCostUSD = Number((answerCache.savedEstimatedCostUSD + cached.estimatedCostUSD).toFixed(8));
+
+            const cachedPayload = {
+                ok: true,
+                answer: cached.answer,
                 model: usedModel,
-                promptTokens,
-                completionTokens,
-                totalTokens,
-                estimatedCostUSD: estimated,
-                imagesCount: images.length
-            });
+                selectedModel: requestedModel,
+                warning,
+                cached: true,
+                hasImages: false,
+                imagesCount: 0,
+                contextHashes: contextResult.hashes,
+                usage: {
+                    inputTokens: 0,
+                    outputTokens: 0,
+                    totalTokens: 0,
+                    estimatedCostUsd: 0,
+                    hasImages: false,
+                    imagesCount: 0,
+                    prompt_tokens: 0,
+                    completion_tokens: 0,
+                    total_tokens: 0,
+                    estimated_cost_usd: 0
+                },
+                metrics: metricsPayload()
+            };
+
+            if (wantsStream) {
+                startEventStream(res);
+                writeEvent(res, 'delta', { text: cached.answer });
+                writeEvent(res, 'done', cachedPayload);
+                res.end();
+            } else {
+                writeJson(res, 200, cachedPayload);
+            }
+            observeStage('total', performance.now() - requestStartedAt);
+            return;
+        }
+
+        // Consultas identicas en vuelo comparten una unica llamada al upstream.
+        const flightKey = cacheKey ? upstreamFlightKey(usedModel, maxTokens, prompt) : null;
+        let flight = flightKey ? inFlight.get(flightKey) : null;
+        const coalesced = Boolean(flight);
+        if (flight) {
+            flight.waiters += 1;
+            coalescing.joined += 1;
+        } else {
+            flight = startUpstreamFlight({ model: usedModel, maxTokens, prompt, images, stream: wantsStream, cacheKey, flightKey });
+            if (flightKey) {
+                inFlight.set(flightKey, flight);
+                const forget = () => forgetUpstreamFlight(flight);
+                flight.promise.then(forget, forget);
+            }
+        }
+
+        let streamStarted = false;
+        let streamedChars = 0;
+        const ensureStream = () => {
+            if (streamStarted) return;
+            streamStarted = true;
+            startEventStream(res);
+        };
+        const onDelta = (text) => {
+            ensureStream();
+            streamedChars += text.length;
+            writeEvent(res, 'delta', { text });
+        };
+        if (wantsStream) {
+            flight.deltas.forEach(onDelta);
+            flight.listeners.add(onDelta);
+        }
+        res.on('close', () => {
+            flight.listeners.delete(onDelta);
+            if (!res.writableEnded) leaveUpstreamFlight(flight);
+        });
+
+        try {
+            const result = await flight.promise;
+            // Solo quien hizo la llamada mide el upstream; los que se unen esperan, no llaman.
+            if (!coalesced) observeStage('upstream', result.upstreamMs);
+            if (result.aborted) return;
+
+            if (coalesced) {
+                coalescing.savedTokens += result.totalTokens;
+                coalescing.savedEstimatedCostUSD = Number((coalescing.savedEstimatedCostUSD + result.estimatedCostUSD).toFixed(8));
+            }
+
+            // Los peticionarios que se unen a una consulta en vuelo no consumen tokens propios.
+            const promptTokens = coalesced ? 0 : result.promptTokens;
+            const completionTokens = coalesced ? 0 : result.completionTokens;
+            const totalTokens = coalesced ? 0 : result.totalTokens;
+            const estimated = coalesced ? 0 : result.estimatedCostUSD;
 
             const responsePayload = {
                 ok: true,
-                answer,
+                answer: result.answer,
                 model: usedModel,
                 selectedModel: requestedModel,
                 warning,
+                cached: false,
+                coalesced,
                 hasImages: images.length > 0,
                 imagesCount: images.length,
+                imageHashes: isImageStoreEnabled() ? images.map((item) => item.hash) : [],
+                contextHashes: contextResult.hashes,
                 usage: {
                     inputTokens: promptTokens,
                     outputTokens: completionTokens,
@@ -212,19 +475,46 @@ const server = http.createServer(async (req, res) => {
                     prompt_tokens: promptTokens,
                     completion_tokens: completionTokens,
                     total_tokens: totalTokens,
-                    estimated_cost_usd: estimated
+                    estimated_cost_usd: estimated,
+                    estimated: !coalesced && result.usageEstimated
                 },
                 metrics: metricsPayload()
             };
 
-            writeJson(res, 200, responsePayload);
+            if (wantsStream) {
+                if (!res.writableEnded && !res.destroyed) {
+                    if (!streamedChars) onDelta(result.answer);
+                    writeEvent(res, 'done', responsePayload);
+                    res.end();
+                }
+            } else {
+                writeJson(res, 200, responsePayload);
+            }
         } catch (err) {
-            writeJson(res, 502, {
-                ok: false,
-                error: 'Fallo al consultar OpenAI',
-                detail: err && err.message ? err.message : 'unknown'
-            });
+            const overloaded = err && err.code === 'BRIDGE_OVERLOADED';
+            const failure = overloaded
+                ? {
+                    ok: false,
+                    error: 'Bridge saturado: demasiadas consultas simultáneas. Reintenta en unos segundos.',
+                    detail: err.message
+                }
+                : {
+                    ok: false,
+                    error: 'Fallo al consultar OpenAI',
+                    detail: err && err.message ? err.message : 'unknown'
+                };
+            if (res.writableEnded || res.destroyed) {
+                // El cliente ya no espera respuesta.
+            } else if (wantsStream && streamStarted) {
+                writeEvent(res, 'error', failure);
+                res.end();
+            } else {
+                if (overloaded) res.setHeader('Retry-After', String(UPSTREAM_RETRY_AFTER_SECONDS));
+                writeJson(res, overloaded ? 503 : 502, failure);
+            }
         } finally {
+            observeStage('total', performance.now() - requestStartedAt);
+            flight.listeners.delete(onDelta);
             images.forEach((item) => {
                 item.data = '';
             });
@@ -255,6 +545,21 @@ function writeJson(res, status, payload) {
     res.end(JSON.stringify(payload));
 }
 
+function startEventStream(res) {
+    res.writeHead(200, {
+        'Content-Type': 'text/event-stream; charset=utf-8',
+        'Cache-Control': 'no-cache',
+        Connection: 'keep-alive',
+        'X-Accel-Buffering': 'no'
+    });
+    res.flushHeaders();
+}
+
+function writeEvent(res, event, payload) {
+    if (res.writableEnded || res.destroyed) return;
+    res.write(`event: ${event}\ndata: ${JSON.stringify(payload)}\n\n`);
+}
+
 function readJsonBody(req, res) {
     return new Promise((resolve) => {
         let raw = '';
@@ -301,46 +606,457 @@ function normalizeMemory(memory) {
     };
 }
 
-function buildPrompt(input) {
-    const lines = [
-        'Eres un asistente didáctico para cursos técnicos.',
-        'Responde SIEMPRE en español.',
-        'Explica con claridad para nivel junior.',
-        'Evita bloques de código largos y evita suposiciones avanzadas.',
-        ''
-    ];
+function loadContextStore() {
+    const now = Date.now();
+    if (now - contextStore.checkedAt < CONTEXT_STORE_CHECK_MS) return Boolean(contextStore.store);
+    contextStore.checkedAt = now;
+
+    let stat;
+    try {
+        stat = fs.statSync(CONTEXT_STORE_PATH);
+    } catch (_err) {
+        contextStore.store = null;
+        contextStore.blocks = new Map();
+        contextStore.mtimeMs = 0;
+        return false;
+    }
+    if (stat.mtimeMs === contextStore.mtimeMs) return Boolean(contextStore.store);
+
+    try {
+        const data = JSON.parse(fs.readFileSync(CONTEXT_STORE_PATH, 'utf8'));
+        contextStore.store = String(data.store || '') || null;
+        contextStore.blocks = new Map(Object.entries(data.blocks || {}));
+        contextStore.mtimeMs = stat.mtimeMs;
+        contextStore.loads += 1;
+    } catch (err) {
+        contextStore.loadErrors += 1;
+        console.error(`[assistant-bridge] No se pudo leer ${CONTEXT_STORE_PATH}: ${err.message}`);
+        contextStore.store = null;
+        contextStore.blocks = new Map();
+    }
+    return Boolean(contextStore.store);
+}
 
-    if (input.courseId) lines.push(`Curso: ${input.courseId}`);
-    if (input.topicId) lines.push(`Tema: ${input.topicId}`);
+// Texto seleccionado y contexto cercano de la consulta: resueltos desde el
+// almacen si llegan como contextRefs, desde los textos ya recibidos si llegan
+// como contextHashes, o tal cual si el panel envia el texto.
+function resolveRequestContext(body) {
+    const context = body.context || {};
+    const refs = body.contextRefs || context.contextRefs;
+    let selectedText = body.selectedText || context.selectedText || null;
+    let surroundingContext = body.surroundingContext || context.surroundingContext || null;
+    let hashes = null;
+
+    if (refs && typeof refs === 'object') {
+        if (!loadContextStore() || refs.store !== contextStore.store) {
+            contextStore.mismatches += 1;
+            return {
+                status: 409,
+                code: 'context_store_mismatch',
+                error: 'El bridge no tiene cargado el almacen de contexto de esta pagina. Reenvia el texto.'
+            };
+        }
+        const selection = Array.isArray(refs.selection) ? refs.selection.slice(0, CONTEXT_MAX_REFS) : [];
+        const parts = [];
+        for (const ref of selection) {
+            const text = contextStore.blocks.get(String(ref && ref.block));
+            if (text === undefined) {
+                return { status: 400, code: 'context_block_unknown', error: `Bloque de contexto desconocido: ${ref && ref.block}` };
+            }
+            const start = clampNumber(ref.start, 0, text.length, 0);
+            const end = clampNumber(ref.end, start, text.length, text.length);
+            parts.push(text.slice(start, end));
+        }
+        const surrounding = refs.surrounding ? contextStore.blocks.get(String(refs.surrounding)) : undefined;
+        selectedText = parts.join('\n').trim().slice(0, CONTEXT_SELECTION_MAX_CHARS) || null;
+        surroundingContext = surrounding ? surrounding.trim().slice(0, CONTEXT_SURROUNDING_MAX_CHARS) : null;
+        contextStore.refRequests += 1;
+        contextStore.resolvedChars += (selectedText || '').length + (surroundingContext || '').length;
+    } else {
+        const sent = body.contextHashes || context.contextHashes;
+        if (sent && typeof sent === 'object') {
+            const missing = [];
+            if (!selectedText && sent.selectedText) {
+                selectedText = readContextText(sent.selectedText);
+                if (selectedText === null) missing.push(String(sent.selectedText));
+            }
+            if (!surroundingContext && sent.surroundingContext) {
+                surroundingContext = readContextText(sent.surroundingContext);
+                if (surroundingContext === null) missing.push(String(sent.surroundingContext));
+            }
+            if (missing.length) {
+                return {
+                    status: 409,
+                    code: 'context_unknown',
+                    missing,
+                    error: 'El bridge ya no tiene el contexto referenciado. Reenvíalo completo.'
+                };
+            }
+        }
+        if (selectedText || surroundingContext) {
+            contextStore.textRequests += 1;
+            hashes = {
+                selectedText: writeContextText(selectedText),
+                surroundingContext: writeContextText(surroundingContext)
+            };
+        }
+    }
 
-    if (input.memory && input.memory.conversation_summary) {
-        lines.push('', 'conversation_summary:');
-        lines.push(input.memory.conversation_summary);
+    // Si el bloque cercano ya esta entero en la seleccion no se repite en el prompt.
+    if (selectedText && surroundingContext && String(selectedText).includes(String(surroundingContext).trim())) {
+        surroundingContext = null;
+        contextStore.dedupedSurrounding += 1;
     }
+    return { selectedText, surroundingContext, hashes };
+}
 
-    if (input.memory && Array.isArray(input.memory.recent_messages) && input.memory.recent_messages.length) {
-        lines.push('', 'recent_messages:');
-        input.memory.recent_messages.forEach((item) => {
-            lines.push(`- ${item.role}: ${item.text}`);
-        });
+function readContextText(hash) {
+    const text = contextStore.texts.get(String(hash));
+    if (text === undefined) {
+        contextStore.textMisses += 1;
+        return null;
     }
+    contextStore.texts.delete(String(hash));
+    contextStore.texts.set(String(hash), text);
+    contextStore.textHits += 1;
+    contextStore.savedUploadChars += text.length;
+    return text;
+}
 
-    if (input.selectedText) {
-        lines.push('', 'Texto seleccionado:');
-        lines.push(String(input.selectedText).slice(0, 1800));
+// Devuelve el hash con el que el panel puede referenciar el texto en la siguiente consulta.
+function writeContextText(text) {
+    if (!text || !CONTEXT_TEXT_MAX_ENTRIES) return null;
+    const value = String(text);
+    if (value.length > CONTEXT_TEXT_MAX_CHARS) return null;
+    const hash = crypto.createHash('sha256').update(value).digest('hex');
+    contextStore.texts.delete(hash);
+    contextStore.texts.set(hash, value);
+    while (contextStore.texts.size > CONTEXT_TEXT_MAX_ENTRIES) {
+        contextStore.texts.delete(contextStore.texts.keys().next().value);
     }
-    if (input.surroundingContext) {
-        lines.push('', 'Contexto cercano:');
-        lines.push(String(input.surroundingContext).slice(0, 1800));
+    return hash;
+}
+
+const PROMPT_INSTRUCTIONS = [
+    'Eres un asistente didáctico para cursos técnicos.',
+    'Responde SIEMPRE en español.',
+    'Explica con claridad para nivel junior.',
+    'Evita bloques de código largos y evita suposiciones avanzadas.'
+];
+
+// Aproximacion rapida de ~4 caracteres por token; basta para repartir el presupuesto.
+function estimateTokens(text) {
+    return Math.ceil(String(text || '').length / PROMPT_CHARS_PER_TOKEN);
+}
+
+function truncateToTokens(text, tokens) {
+    const value = String(text || '');
+    const maxChars = Math.max(0, tokens) * PROMPT_CHARS_PER_TOKEN;
+    if (value.length <= maxChars) return value;
+    if (maxChars < 2) return '';
+    const cut = value.slice(0, maxChars - 1);
+    const space = cut.lastIndexOf(' ');
+    return `${space > maxChars * 0.6 ? cut.slice(0, space) : cut}…`;
+}
+
+const PROMPT_LABEL_TOKENS = {
+    question: estimateTokens('\n\nPregunta del usuario:\n'),
+    context: estimateTokens('\nTexto seleccionado:\n'),
+    summary: estimateTokens('\nconversation_summary:\n'),
+    recent: estimateTokens('\nrecent_messages:\n')
+};
+
+// Solo contexto y memoria tienen cuota: la pregunta se presupuesta antes y entera.
+// Una entrada `question:` de configuraciones antiguas se ignora.
+function parsePromptShares(value) {
+    const shares = { context: 0, memory: 0 };
+    String(value).split(',').forEach((pair) => {
+        const [name, raw] = pair.split(':').map((s) => s.trim());
+        if (name in shares && Number.isFinite(Number(raw)) && Number(raw) >= 0) shares[name] = Number(raw);
+    });
+    const total = shares.context + shares.memory;
+    if (!total) return { context: 0.55, memory: 0.45 };
+    Object.keys(shares).forEach((name) => {
+        shares[name] = Number((shares[name] / total).toFixed(4));
+    });
+    return shares;
+}
+
+// Reparte los tokens disponibles: la pregunta entra primero y completa (solo se
+// recorta si por si sola no cabe). Con lo que queda, contexto y memoria reciben
+// como maximo su cuota y lo que sobra va a la que necesite mas, en ese orden.
+function allocatePromptBudget(available, demands) {
+    const grants = { question: Math.min(demands.question, available) };
+    const rest = available - grants.question;
+    let spare = rest;
+    PROMPT_SHARED_PARTS.forEach((part) => {
+        grants[part] = Math.min(demands[part], Math.floor(rest * PROMPT_BUDGET_SHARES[part]));
+        spare -= grants[part];
+    });
+    PROMPT_SHARED_PARTS.forEach((part) => {
+        const extra = Math.min(spare, demands[part] - grants[part]);
+        grants[part] += extra;
+        spare -= extra;
+    });
+    return grants;
+}
+
+function fitMemory(memory, allowance, report) {
+    const recent = Array.isArray(memory.recent_messages) ? memory.recent_messages : [];
+    const turns = [];
+    const older = [];
+    let left = allowance;
+    // Primero los turnos mas recientes; en cuanto uno no cabe, los anteriores se resumen.
+    for (let i = recent.length - 1; i >= 0; i--) {
+        const line = `- ${recent[i].role}: ${recent[i].text}`;
+        const cost = estimateTokens(line) + (turns.length ? 0 : PROMPT_LABEL_TOKENS.recent);
+        if (!older.length && cost <= left) {
+            turns.unshift(line);
+            left -= cost;
+        } else {
+            older.unshift(`${recent[i].role}: ${truncateToTokens(recent[i].text, PROMPT_DIGEST_TOKENS)}`);
+        }
     }
 
+    // Resumen: los turnos resumidos (mas recientes) antes que conversation_summary,
+    // que es lo mas antiguo y lo primero que se recorta.
+    const summary = [];
+    while (older.length) {
+        const digest = older.pop();
+        const cost = estimateTokens(digest) + (summary.length ? 0 : PROMPT_LABEL_TOKENS.summary);
+        if (cost > left) {
+            report.droppedTurns += older.length + 1;
+            break;
+        }
+        summary.unshift(digest);
+        left -= cost;
+        report.summarizedTurns += 1;
+    }
+    if (memory.conversation_summary) {
+        const labelCost = summary.length ? 0 : PROMPT_LABEL_TOKENS.summary;
+        const fitted = left > labelCost ? truncateToTokens(memory.conversation_summary, left - labelCost) : '';
+        if (fitted) {
+            summary.unshift(fitted);
+            left -= labelCost + estimateTokens(fitted);
+        }
+    }
+    return { summary, turns, used: allowance - left };
+}
+
+// Monta el prompt dentro de PROMPT_BUDGET_TOKENS. Las instrucciones (y SYSTEM_PROMPT)
+// siempre entran, luego la pregunta; el resto se reparte entre contexto del curso
+// (seleccion antes que el bloque cercano) y memoria segun PROMPT_BUDGET_SHARES.
+function buildPrompt(input) {
+    const header = [...PROMPT_INSTRUCTIONS, ''];
+    if (input.courseId) header.push(`Curso: ${input.courseId}`);
+    if (input.topicId) header.push(`Tema: ${input.topicId}`);
+
+    const memory = input.memory || {};
+    const recent = Array.isArray(memory.recent_messages) ? memory.recent_messages : [];
+    const contextParts = [['Texto seleccionado:', input.selectedText], ['Contexto cercano:', input.surroundingContext]]
+        .filter(([, text]) => text)
+        .map(([label, text]) => [label, String(text)]);
+
+    const demands = {
+        question: estimateTokens(input.question),
+        context: contextParts.reduce((sum, [, text]) => sum + PROMPT_LABEL_TOKENS.context + estimateTokens(text), 0),
+        memory: (memory.conversation_summary ? PROMPT_LABEL_TOKENS.summary + estimateTokens(memory.conversation_summary) : 0) +
+            (recent.length ? PROMPT_LABEL_TOKENS.recent : 0) +
+            recent.reduce((sum, item) => sum + estimateTokens(`- ${item.role}: ${item.text}`), 0)
+    };
+    const systemTokens = estimateTokens(SYSTEM_PROMPT) + estimateTokens(header.join('\n')) + PROMPT_LABEL_TOKENS.question;
+    const grants = allocatePromptBudget(Math.max(0, PROMPT_BUDGET_TOKENS - systemTokens), demands);
+    const report = { system: systemTokens, question: 0, context: 0, memory: 0, demands, summarizedTurns: 0, droppedTurns: 0 };
+
+    const question = truncateToTokens(input.question, grants.question);
+    report.question = estimateTokens(question);
+
+    const contextLines = [];
+    let contextLeft = grants.context;
+    contextParts.forEach(([label, text]) => {
+        const fitted = contextLeft > PROMPT_LABEL_TOKENS.context ? truncateToTokens(text, contextLeft - PROMPT_LABEL_TOKENS.context) : '';
+        if (!fitted) return;
+        contextLines.push('', label, fitted);
+        contextLeft -= PROMPT_LABEL_TOKENS.context + estimateTokens(fitted);
+    });
+    report.context = grants.context - contextLeft;
+
+    const fitted = fitMemory(memory, grants.memory, report);
+    report.memory = fitted.used;
+
+    const lines = [...header];
+    if (fitted.summary.length) lines.push('', 'conversation_summary:', ...fitted.summary);
+    if (fitted.turns.length) lines.push('', 'recent_messages:', ...fitted.turns);
+    lines.push(...contextLines);
     lines.push('', 'Pregunta del usuario:');
-    lines.push(input.question);
+    lines.push(question);
 
+    recordPromptBudget(report);
     return lines.join('\n');
 }
 
-async function callOpenAI({ model, maxTokens, prompt, images }) {
+function recordPromptBudget(report) {
+    const used = report.system + report.question + report.context + report.memory;
+    let trimmed = false;
+    promptBudget.requests += 1;
+    promptBudget.usedTokens += used;
+    promptBudget.maxUsedTokens = Math.max(promptBudget.maxUsedTokens, used);
+    promptBudget.parts.system.used += report.system;
+    PROMPT_PARTS.forEach((part) => {
+        const cut = Math.max(0, report.demands[part] - report[part]);
+        promptBudget.parts[part].used += report[part];
+        promptBudget.parts[part].trimmed += cut;
+        if (cut > 0) trimmed = true;
+    });
+    if (trimmed) promptBudget.trimmedRequests += 1;
+    promptBudget.summarizedTurns += report.summarizedTurns;
+    promptBudget.droppedTurns += report.droppedTurns;
+}
+
+// Una "flight" es una llamada al upstream compartida por todos los peticionarios
+// identicos que llegan mientras esta en curso. Registra el uso una sola vez.
+function startUpstreamFlight({ model, maxTokens, prompt, images, stream, cacheKey, flightKey }) {
+    const flight = {
+        key: flightKey || null,
+        deltas: [],
+        listeners: new Set(),
+        waiters: 1,
+        abort: new AbortController(),
+        promise: null
+    };
+
+    flight.promise = (async () => {
+        await acquireUpstreamSlot();
+        coalescing.leaders += 1;
+        const upstreamStartedAt = performance.now();
+        try {
+            let answer;
+            let usageTokens;
+            let usageEstimated = false;
+            let aborted = false;
+
+            if (stream) {
+                const streamed = await callUpstream({
+                    model,
+                    maxTokens,
+                    prompt,
+                    images,
+                    stream: true,
+                    signal: flight.abort.signal,
+                    onDelta: (text) => {
+                        flight.deltas.push(text);
+                        flight.listeners.forEach((listener) => listener(text));
+                    }
+                });
+                aborted = streamed.aborted;
+                answer = streamed.answer.trim() || 'No se recibió respuesta de contenido.';
+                usageTokens = streamed.usage;
+                if (!usageTokens) {
+                    // Upstream sin stream_options.include_usage o stream cortado: se estima.
+                    usageTokens = estimateUsageTokens(prompt, streamed.answer);
+                    usageEstimated = true;
+                }
+            } else {
+                // Sin signal: aunque el cliente se vaya, la respuesta queda en cache para el siguiente.
+                const completion = await callUpstream({ model, maxTokens, prompt, images, stream: false });
+                answer = extractAnswer(completion);
+                usageTokens = completion && completion.usage ? completion.usage : {};
+            }
+            const upstreamMs = performance.now() - upstreamStartedAt;
+
+            const promptTokens = Number(usageTokens.prompt_tokens || 0);
+            const completionTokens = Number(usageTokens.completion_tokens || 0);
+            const totalTokens = Number(usageTokens.total_tokens || promptTokens + completionTokens);
+            const estimatedCostUSD = estimateCost(model, promptTokens, completionTokens);
+
+            registerUsage({
+                model,
+                promptTokens,
+                completionTokens,
+                totalTokens,
+                estimatedCostUSD,
+                imagesCount: images.length
+            });
+
+            if (cacheKey && !aborted) {
+                writeAnswerCache(cacheKey, { answer, totalTokens, estimatedCostUSD });
+            }
+
+            return { answer, promptTokens, completionTokens, totalTokens, estimatedCostUSD, usageEstimated, aborted, upstreamMs };
+        } finally {
+            releaseUpstreamSlot();
+        }
+    })();
+    return flight;
+}
+
+// Solo se corta el upstream cuando se han ido todos los peticionarios de la flight.
+function leaveUpstreamFlight(flight) {
+    flight.waiters -= 1;
+    if (flight.waiters > 0) return;
+    // Nadie mas puede unirse a una flight abortada.
+    forgetUpstreamFlight(flight);
+    flight.abort.abort();
+}
+
+function forgetUpstreamFlight(flight) {
+    if (flight.key && inFlight.get(flight.key) === flight) inFlight.delete(flight.key);
+}
+
+function acquireUpstreamSlot() {
+    if (upstreamLimiter.active < UPSTREAM_MAX_CONCURRENCY) {
+        upstreamLimiter.active += 1;
+        upstreamLimiter.admitted += 1;
+        return Promise.resolve();
+    }
+    if (upstreamLimiter.queue.length >= UPSTREAM_QUEUE_MAX) {
+        // Rechazo inmediato: mejor un 503 ahora que un timeout del cliente despues.
+        upstreamLimiter.rejected += 1;
+        return Promise.reject(overloadError('queue_full'));
+    }
+
+    return new Promise((resolve, reject) => {
+        const entry = { enqueuedAt: Date.now(), resolve, timer: null };
+        if (UPSTREAM_QUEUE_TIMEOUT_MS > 0) {
+            entry.timer = setTimeout(() => {
+                const index = upstreamLimiter.queue.indexOf(entry);
+                if (index !== -1) upstreamLimiter.queue.splice(index, 1);
+                upstreamLimiter.timedOut += 1;
+                recordQueueWait(Date.now() - entry.enqueuedAt);
+                reject(overloadError('queue_timeout'));
+            }, UPSTREAM_QUEUE_TIMEOUT_MS);
+        }
+        upstreamLimiter.queue.push(entry);
+        upstreamLimiter.queued += 1;
+        upstreamLimiter.maxQueueDepth = Math.max(upstreamLimiter.maxQueueDepth, upstreamLimiter.queue.length);
+    });
+}
+
+function releaseUpstreamSlot() {
+    const next = upstreamLimiter.queue.shift();
+    if (!next) {
+        upstreamLimiter.active -= 1;
+        return;
+    }
+    // El hueco pasa directamente al siguiente de la cola.
+    if (next.timer) clearTimeout(next.timer);
+    recordQueueWait(Date.now() - next.enqueuedAt);
+    upstreamLimiter.admitted += 1;
+    next.resolve();
+}
+
+function recordQueueWait(waitMs) {
+    upstreamLimiter.totalWaitMs += waitMs;
+    upstreamLimiter.maxWaitMs = Math.max(upstreamLimiter.maxWaitMs, waitMs);
+}
+
+function overloadError(reason) {
+    const err = new Error(reason);
+    err.code = 'BRIDGE_OVERLOADED';
+    return err;
+}
+
+function chatCompletionsBody({ model, maxTokens, prompt, images }) {
     const imageItems = Array.isArray(images) ? images : [];
 
     const userContent = imageItems.length
@@ -355,34 +1071,310 @@ async function callOpenAI({ model, maxTokens, prompt, images }) {
 
     const tokenLimitField = String(model || '').startsWith('gpt-5') ? 'max_completion_tokens' : 'max_tokens';
 
-    const response = await fetch(`${OPENAI_BASE_URL}/chat/completions`, {
-        method: 'POST',
-        headers: {
-            'Content-Type': 'application/json',
-            Authorization: `Bearer ${OPENAI_API_KEY}`
-        },
-        body: JSON.stringify({
-            model,
-            temperature: 0.2,
-            [tokenLimitField]: maxTokens,
-            messages: [
-                {
-                    role: 'system',
-                    content: 'Asistente pedagógico. Claro, práctico, breve y preciso.'
-                },
-                {
-                    role: 'user',
-                    content: userContent
+    return {
+        model,
+        temperature: 0.2,
+        [tokenLimitField]: maxTokens,
+        messages: [
+            {
+                role: 'system',
+                content: SYSTEM_PROMPT
+            },
+            {
+                role: 'user',
+                content: userContent
+            }
+        ]
+    };
+}
+
+// POST al upstream por el agente keep-alive. Resuelve con la respuesta (stream legible).
+function upstreamPost(requestBody, { accept, signal } = {}) {
+    const payload = JSON.stringify(requestBody);
+    return new Promise((resolve, reject) => {
+        const req = upstreamTransport.request(UPSTREAM_URL, {
+            method: 'POST',
+            agent: upstreamAgent,
+            signal,
+            headers: {
+                'Content-Type': 'application/json',
+                'Content-Length': Buffer.byteLength(payload),
+                Accept: accept || 'application/json',
+                Authorization: `Bearer ${OPENAI_API_KEY}`
+            }
+        }, (response) => {
+            if (req.reusedSocket) {
+                upstreamCalls.reusedSockets += 1;
+            } else {
+                upstreamCalls.newSockets += 1;
+            }
+            resolve(response);
+        });
+        req.on('error', reject);
+        req.end(payload);
+    });
+}
+
+async function readResponseText(response) {
+    let text = '';
+    response.setEncoding('utf8');
+    for await (const chunk of response) text += chunk;
+    return text;
+}
+
+function upstreamHttpError(statusCode, text) {
+    const err = new Error(`OpenAI HTTP ${statusCode}: ${text}`);
+    err.status = statusCode;
+    return err;
+}
+
+// Solo se reintenta lo transitorio (red, 429 y 5xx): un 4xx o una respuesta
+// invalida fallarian igual la segunda vez.
+function isRetryableUpstreamError(err) {
+    if (!err || err.name === 'AbortError') return false;
+    if (err.status) return err.status === 429 || err.status >= 500;
+    return UPSTREAM_RETRYABLE_CODES.has(err.code);
+}
+
+async function callOpenAI({ model, maxTokens, prompt, images, signal }) {
+    const response = await upstreamPost(chatCompletionsBody({ model, maxTokens, prompt, images }), { signal });
+    const text = await readResponseText(response);
+    if (response.statusCode < 200 || response.statusCode >= 300) {
+        throw upstreamHttpError(response.statusCode, text);
+    }
+    return JSON.parse(text);
+}
+
+// Reenvia cada delta de contenido a onDelta. Devuelve { answer, usage, aborted };
+// usage es null si el upstream no lo envia (o el cliente corto antes del final).
+async function callOpenAIStream({ model, maxTokens, prompt, images, signal, onDelta, onActivity }) {
+    const requestBody = chatCompletionsBody({ model, maxTokens, prompt, images });
+    requestBody.stream = true;
+    requestBody.stream_options = { include_usage: true };
+
+    let answer = '';
+    let usage = null;
+    try {
+        const response = await upstreamPost(requestBody, { accept: 'text/event-stream', signal });
+
+        if (response.statusCode < 200 || response.statusCode >= 300) {
+            const text = await readResponseText(response);
+            throw upstreamHttpError(response.statusCode, text);
+        }
+
+        const decoder = new TextDecoder();
+        let buffer = '';
+        for await (const chunk of response) {
+            if (onActivity) onActivity();
+            buffer += decoder.decode(chunk, { stream: true });
+            let newline = buffer.indexOf('\n');
+            while (newline !== -1) {
+                const line = buffer.slice(0, newline).trim();
+                buffer = buffer.slice(newline + 1);
+                newline = buffer.indexOf('\n');
+
+                if (!line.startsWith('data:')) continue;
+                const data = line.slice(5).trim();
+                if (!data || data === '[DONE]') continue;
+
+                let event;
+                try {
+                    event = JSON.parse(data);
+                } catch (_err) {
+                    continue;
+                }
+                if (event.usage) usage = event.usage;
+                const choice = event.choices && event.choices[0];
+                const delta = choice && choice.delta && choice.delta.content;
+                if (delta) {
+                    answer += delta;
+                    onDelta(delta);
+                }
+            }
+        }
+    } catch (err) {
+        if (signal && signal.aborted) return { answer, usage: null, aborted: true };
+        throw err;
+    }
+    return { answer, usage, aborted: false };
+}
+
+// Llamada al upstream con timeout de inactividad (UPSTREAM_TIMEOUT_MS sin recibir
+// datos; en streaming cada chunk lo reinicia, asi que una respuesta larga que
+// sigue llegando no se corta) y un reintento si el primer intento falla por red,
+// 429/5xx o timeout antes de enviar nada al cliente (ASSISTANT_UPSTREAM_RETRY=0
+// lo desactiva). Con ASSISTANT_UPSTREAM_HEDGE=1 se lanza ademas un segundo
+// intento si el primero tarda mas que el p95 reciente. Gana la primera respuesta
+// completa (JSON) o el primer token (streaming); el otro intento se aborta y su
+// gasto estimado se anota aparte. Solo el ganador reenvia deltas, asi que el
+// cliente nunca ve dos respuestas mezcladas.
+function callUpstream({ model, maxTokens, prompt, images, stream, signal, onDelta }) {
+    return new Promise((resolve, reject) => {
+        const sampleKey = `${model}:${stream ? 'stream' : 'json'}`;
+        const promptTokens = estimateTokens(SYSTEM_PROMPT) + estimateTokens(prompt);
+        const attempts = [];
+        let winner = null;
+        let finished = false;
+        let pending = 0;
+        let hedgeTimer = null;
+
+        let deadline = null;
+        const armDeadline = () => {
+            if (finished) return;
+            clearTimeout(deadline);
+            deadline = setTimeout(() => {
+                upstreamCalls.deadlineExceeded += 1;
+                // Sin ganador el cliente aun no ha recibido nada: se puede reintentar.
+                if (!winner && canRetry()) {
+                    attempts.forEach(abandon);
+                    retry();
+                    return;
                 }
-            ]
-        })
+                finish(new Error(`Upstream sin datos en ${UPSTREAM_TIMEOUT_MS} ms`));
+            }, UPSTREAM_TIMEOUT_MS);
+        };
+        armDeadline();
+
+        const onClientAbort = () => attempts.forEach((attempt) => attempt.controller.abort());
+        if (signal) signal.addEventListener('abort', onClientAbort, { once: true });
+
+        function finish(err, result) {
+            if (finished) return;
+            finished = true;
+            clearTimeout(deadline);
+            clearTimeout(hedgeTimer);
+            if (signal) signal.removeEventListener('abort', onClientAbort);
+            attempts.forEach((attempt) => {
+                if (attempt !== winner || err) attempt.controller.abort();
+            });
+            if (err) {
+                reject(err);
+            } else {
+                resolve(result);
+            }
+        }
+
+        function canRetry() {
+            return UPSTREAM_RETRY_ENABLED && attempts.length < 2 && !(signal && signal.aborted);
+        }
+
+        function retry() {
+            upstreamCalls.retries += 1;
+            launch('retry');
+            armDeadline();
+        }
+
+        // Aborta un intento que ya no sirve. El upstream puede facturar el prompt
+        // (y lo que llegara a generar), asi que se anota como gasto perdido.
+        function abandon(attempt) {
+            if (attempt.done || attempt.abandoned) return;
+            attempt.abandoned = true;
+            upstreamCalls.losersAborted += 1;
+            registerLoserUsage(model, promptTokens, 0);
+            attempt.controller.abort();
+        }
+
+        function claim(attempt) {
+            if (winner) return winner === attempt;
+            winner = attempt;
+            clearTimeout(hedgeTimer);
+            recordUpstreamSample(sampleKey, performance.now() - attempt.startedAt);
+            if (attempt.kind === 'hedge') upstreamCalls.hedgeWins += 1;
+            attempts.forEach((other) => {
+                if (other !== attempt) abandon(other);
+            });
+            return true;
+        }
+
+        function launch(kind) {
+            const attempt = { kind, controller: new AbortController(), startedAt: performance.now(), done: false, abandoned: false };
+            if (signal && signal.aborted) attempt.controller.abort();
+            attempts.push(attempt);
+            pending += 1;
+            upstreamCalls.attempts += 1;
+
+            const call = stream
+                ? callOpenAIStream({
+                    model,
+                    maxTokens,
+                    prompt,
+                    images,
+                    signal: attempt.controller.signal,
+                    onActivity: armDeadline,
+                    onDelta: (text) => {
+                        if (claim(attempt)) onDelta(text);
+                    }
+                })
+                : callOpenAI({ model, maxTokens, prompt, images, signal: attempt.controller.signal });
+
+            call.then((result) => {
+                attempt.done = true;
+                pending -= 1;
+                if (stream && result.aborted) {
+                    // Perdedor abortado por nosotros: se ignora salvo lo que llego a generar.
+                    // Si el cliente se fue, termina.
+                    if (attempt.abandoned) registerLoserUsage(model, 0, estimateTokens(result.answer));
+                    if (winner === attempt || (signal && signal.aborted && pending === 0)) finish(null, result);
+                    return;
+                }
+                if (claim(attempt)) finish(null, result);
+            }, (err) => {
+                attempt.done = true;
+                pending -= 1;
+                if (finished || attempt.abandoned || (winner && winner !== attempt)) return;
+                if (winner === attempt || (signal && signal.aborted)) {
+                    finish(err);
+                    return;
+                }
+                if (isRetryableUpstreamError(err) && canRetry()) {
+                    retry();
+                    return;
+                }
+                if (pending === 0) finish(err);
+            });
+        }
+
+        launch('primary');
+        if (UPSTREAM_HEDGE_ENABLED) {
+            hedgeTimer = setTimeout(() => {
+                if (finished || winner || attempts.length >= 2) return;
+                upstreamCalls.hedgesFired += 1;
+                launch('hedge');
+            }, upstreamHedgeDelayMs(sampleKey));
+        }
     });
+}
 
-    const json = await response.json();
-    if (!response.ok) {
-        throw new Error(`OpenAI HTTP ${response.status}: ${JSON.stringify(json)}`);
+// El coste estimado de los intentos perdidos entra en el total y en el diario
+// (el presupuesto debe verlo), pero no cuenta como consulta ni como tokens servidos.
+function registerLoserUsage(model, promptTokens, completionTokens) {
+    if (!promptTokens && !completionTokens) return;
+    const cost = estimateCost(model, promptTokens, completionTokens);
+    rollDailyIfNeeded();
+    upstreamCalls.loserPromptTokens += promptTokens;
+    upstreamCalls.loserCompletionTokens += completionTokens;
+    upstreamCalls.loserEstimatedCostUSD = Number((upstreamCalls.loserEstimatedCostUSD + cost).toFixed(8));
+    usage.totalEstimatedCostUSD = Number((usage.totalEstimatedCostUSD + cost).toFixed(8));
+    usage.daily.estimatedCostUSD = Number((usage.daily.estimatedCostUSD + cost).toFixed(8));
+}
+
+function recordUpstreamSample(sampleKey, ms) {
+    let samples = upstreamCalls.samples.get(sampleKey);
+    if (!samples) {
+        samples = [];
+        upstreamCalls.samples.set(sampleKey, samples);
     }
-    return json;
+    samples.push(ms);
+    if (samples.length > UPSTREAM_HEDGE_WINDOW) samples.shift();
+}
+
+// p95 de las ultimas UPSTREAM_HEDGE_WINDOW latencias; con pocas muestras se usa el fijo.
+function upstreamHedgeDelayMs(sampleKey) {
+    const samples = upstreamCalls.samples.get(sampleKey) || [];
+    if (samples.length < UPSTREAM_HEDGE_MIN_SAMPLES) return UPSTREAM_HEDGE_DELAY_MS;
+    const sorted = samples.slice().sort((a, b) => a - b);
+    const p95 = sorted[Math.min(sorted.length - 1, Math.ceil(sorted.length * 0.95) - 1)];
+    return Math.max(UPSTREAM_HEDGE_MIN_DELAY_MS, Math.round(p95));
 }
 
 function normalizeImages(input) {
@@ -393,10 +1385,23 @@ function normalizeImages(input) {
     }
 
     const items = [];
+    const missing = [];
     for (const raw of input) {
         const type = normalizeImageType((raw && raw.type) || '');
         const name = String((raw && raw.name) || 'imagen').slice(0, 120);
 
+        // Referencia a una imagen ya subida: sin decodificar ni validar de nuevo.
+        const hasData = raw && ((typeof raw.data === 'string' && raw.data.trim()) || (typeof raw.dataUrl === 'string' && raw.dataUrl.trim()));
+        if (raw && typeof raw.hash === 'string' && !hasData) {
+            const stored = readImageStore(raw.hash);
+            if (stored) {
+                items.push({ name, type: stored.type, data: stored.data, sizeBytes: stored.sizeBytes, hash: raw.hash, stored: true });
+            } else {
+                missing.push(raw.hash);
+            }
+            continue;
+        }
+
         if (!ALLOWED_IMAGE_TYPES.includes(type)) {
             return { error: 'Formato de imagen no permitido. Solo PNG o JPEG.' };
         }
@@ -411,17 +1416,76 @@ function normalizeImages(input) {
             return { error: 'Una imagen supera el tamaño máximo permitido (3MB).' };
         }
 
+        const hash = imageHash(base64);
         items.push({
             name,
             type,
             data: base64,
-            sizeBytes
+            sizeBytes,
+            hash
         });
     }
 
+    if (missing.length) {
+        return {
+            status: 409,
+            code: 'image_unknown',
+            missing,
+            error: 'El bridge ya no tiene alguna de las imágenes referenciadas. Reenvíalas completas.'
+        };
+    }
+    items.forEach((item) => {
+        if (item.stored) {
+            imageStore.savedUploadBytes += item.data.length;
+        } else {
+            writeImageStore(item);
+        }
+    });
     return { value: items };
 }
 
+function isImageStoreEnabled() {
+    return IMAGE_STORE_MAX_BYTES > 0 && IMAGE_STORE_MAX_ENTRIES > 0;
+}
+
+function imageHash(base64) {
+    return crypto.createHash('sha256').update(base64).digest('hex');
+}
+
+function readImageStore(hash) {
+    const entry = imageStore.entries.get(hash);
+    if (entry && IMAGE_STORE_TTL_MS > 0 && Date.now() - entry.usedAt > IMAGE_STORE_TTL_MS) {
+        deleteImageStoreEntry(hash);
+    } else if (entry) {
+        imageStore.entries.delete(hash);
+        imageStore.entries.set(hash, entry);
+        entry.usedAt = Date.now();
+        imageStore.hits += 1;
+        return entry;
+    }
+    imageStore.misses += 1;
+    return null;
+}
+
+function writeImageStore(item) {
+    if (!isImageStoreEnabled() || imageStore.entries.has(item.hash)) return;
+    if (item.data.length > IMAGE_STORE_MAX_BYTES) return;
+    imageStore.entries.set(item.hash, { type: item.type, data: item.data, sizeBytes: item.sizeBytes, usedAt: Date.now() });
+    imageStore.bytes += item.data.length;
+    imageStore.stored += 1;
+    while (imageStore.entries.size > IMAGE_STORE_MAX_ENTRIES || imageStore.bytes > IMAGE_STORE_MAX_BYTES) {
+        deleteImageStoreEntry(imageStore.entries.keys().next().value);
+        imageStore.evictions += 1;
+    }
+}
+
+function deleteImageStoreEntry(hash) {
+    const entry = imageStore.entries.get(hash);
+    if (!entry) return;
+    imageStore.bytes -= entry.data.length;
+    imageStore.entries.delete(hash);
+}
+
 function normalizeImageType(type) {
     const normalized = String(type || '').toLowerCase().trim();
     if (normalized === 'image/jpg') return 'image/jpeg';
@@ -455,6 +1519,85 @@ function base64ByteLength(base64) {
     return Math.floor((normalized.length * 3) / 4) - padding;
 }
 
+function isAnswerCacheEnabled() {
+    return ANSWER_CACHE_MAX_ENTRIES > 0 && ANSWER_CACHE_TTL_MS > 0;
+}
+
+function normalizeQuestionForCache(question) {
+    return String(question || '')
+        .toLowerCase()
+        .normalize('NFD')
+        .replace(/[\u0300-\u036f]/g, '')
+        .replace(/[¿¡?!.,;:"'`()]/g, ' ')
+        .replace(/\s+/g, ' ')
+        .trim();
+}
+
+function answerCacheKey(input, model, maxTokens) {
+    // The selection is part of the key: the panel sends the same generic
+    // question for every "Consultar al asistente" click. maxTokens too: an
+    // answer cut short by a small limit must not serve a request that allows more.
+    const parts = [
+        normalizeQuestionForCache(input.question),
+        String(input.courseId || ''),
+        String(input.topicId || ''),
+        String(model || ''),
+        String(maxTokens),
+        String(input.selectedText || '').trim(),
+        String(input.surroundingContext || '').trim(),
+        memoryFingerprint(input.memory)
+    ];
+    return crypto.createHash('sha256').update(parts.join('\u0000')).digest('hex');
+}
+
+// Clave de coalescencia: lo que se envia de verdad al upstream (prompt ya
+// recortado, con memoria y contexto) mas el modelo y el limite de tokens.
+function upstreamFlightKey(model, maxTokens, prompt) {
+    return crypto.createHash('sha256').update([String(model || ''), String(maxTokens), prompt].join('\u0000')).digest('hex');
+}
+
+// La memoria de la conversacion entra en el prompt: la misma pregunta en dos
+// conversaciones distintas no puede compartir respuesta.
+function memoryFingerprint(memory) {
+    const summary = memory && memory.conversation_summary ? memory.conversation_summary : '';
+    const recent = memory && Array.isArray(memory.recent_messages) ? memory.recent_messages : [];
+    if (!summary && !recent.length) return '';
+    const normalized = JSON.stringify([summary, recent.map((item) => [item.role, item.text])]);
+    return crypto.createHash('sha256').update(normalized).digest('hex');
+}
+
+function readAnswerCache(key) {
+    const entry = answerCache.entries.get(key);
+    if (!entry) {
+        answerCache.misses += 1;
+        return null;
+    }
+    if (Date.now() - entry.storedAt > ANSWER_CACHE_TTL_MS) {
+        answerCache.entries.delete(key);
+        answerCache.misses += 1;
+        return null;
+    }
+    // Map keeps insertion order: re-inserting marks the entry as most recently used.
+    answerCache.entries.delete(key);
+    answerCache.entries.set(key, entry);
+    answerCache.hits += 1;
+    return entry;
+}
+
+function writeAnswerCache(key, value) {
+    answerCache.entries.delete(key);
+    answerCache.entries.set(key, {
+        answer: value.answer,
+        totalTokens: Number(value.totalTokens || 0),
+        estimatedCostUSD: Number(value.estimatedCostUSD || 0),
+        storedAt: Date.now()
+    });
+    while (answerCache.entries.size > ANSWER_CACHE_MAX_ENTRIES) {
+        answerCache.entries.delete(answerCache.entries.keys().next().value);
+        answerCache.evictions += 1;
+    }
+}
+
 function extractAnswer(payload) {
     const choice = payload && payload.choices && payload.choices[0];
     const msg = choice && choice.message;
@@ -462,6 +1605,17 @@ function extractAnswer(payload) {
     return text || 'No se recibió respuesta de contenido.';
 }
 
+// Solo cuando el upstream no devuelve usage.
+function estimateUsageTokens(prompt, answer) {
+    const promptTokens = estimateTokens(SYSTEM_PROMPT) + estimateTokens(prompt);
+    const completionTokens = estimateTokens(answer);
+    return {
+        prompt_tokens: promptTokens,
+        completion_tokens: completionTokens,
+        total_tokens: promptTokens + completionTokens
+    };
+}
+
 function estimateCost(model, promptTokens, completionTokens) {
     const p = PRICES_PER_1K[model] || PRICES_PER_1K['gpt-4o-mini'];
     const inCost = (Number(promptTokens || 0) / 1000) * p.in;
@@ -496,7 +1650,7 @@ function registerUsage(data) {
     };
 }
 
-function metricsPayload() {
+function metricsPayload(options = {}) {
     return {
         started_at: usage.startedAt,
         total_requests: usage.totalRequests,
@@ -517,8 +1671,302 @@ function metricsPayload() {
             estimated_cost_usd: usage.daily.estimatedCostUSD,
             images_count: usage.daily.imagesCount
         },
-        last_request: usage.lastRequest
+        last_request: usage.lastRequest,
+        answer_cache: {
+            enabled: isAnswerCacheEnabled(),
+            entries: answerCache.entries.size,
+            max_entries: ANSWER_CACHE_MAX_ENTRIES,
+            ttl_seconds: ANSWER_CACHE_TTL_MS / 1000,
+            hits: answerCache.hits,
+            misses: answerCache.misses,
+            bypassed: answerCache.bypassed,
+            hit_rate: answerCache.hits + answerCache.misses > 0
+                ? Number((answerCache.hits / (answerCache.hits + answerCache.misses)).toFixed(4))
+                : 0,
+            evictions: answerCache.evictions,
+            saved_tokens: answerCache.savedTokens,
+            saved_estimated_cost_usd: answerCache.savedEstimatedCostUSD
+        },
+        upstream_queue: {
+            max_concurrency: UPSTREAM_MAX_CONCURRENCY,
+            active: upstreamLimiter.active,
+            queue_depth: upstreamLimiter.queue.length,
+            queue_max: UPSTREAM_QUEUE_MAX,
+            queue_timeout_ms: UPSTREAM_QUEUE_TIMEOUT_MS,
+            admitted: upstreamLimiter.admitted,
+            queued: upstreamLimiter.queued,
+            rejected: upstreamLimiter.rejected,
+            timed_out: upstreamLimiter.timedOut,
+            max_queue_depth: upstreamLimiter.maxQueueDepth,
+            avg_wait_ms: upstreamLimiter.queued > 0
+                ? Number((upstreamLimiter.totalWaitMs / upstreamLimiter.queued).toFixed(1))
+                : 0,
+            max_wait_ms: upstreamLimiter.maxWaitMs
+        },
+        coalescing: {
+            in_flight: inFlight.size,
+            upstream_calls: coalescing.leaders,
+            coalesced_requests: coalescing.joined,
+            saved_tokens: coalescing.savedTokens,
+            saved_estimated_cost_usd: coalescing.savedEstimatedCostUSD
+        },
+        upstream: {
+            keep_alive: true,
+            max_sockets: UPSTREAM_MAX_SOCKETS,
+            timeout_ms: UPSTREAM_TIMEOUT_MS,
+            attempts: upstreamCalls.attempts,
+            reused_sockets: upstreamCalls.reusedSockets,
+            new_sockets: upstreamCalls.newSockets,
+            deadline_exceeded: upstreamCalls.deadlineExceeded,
+            hedging: {
+                enabled: UPSTREAM_HEDGE_ENABLED,
+                fallback_delay_ms: UPSTREAM_HEDGE_DELAY_MS,
+                delay_ms: Object.fromEntries(
+                    Array.from(upstreamCalls.samples.keys()).map((key) => [key, upstreamHedgeDelayMs(key)])
+                ),
+                hedges_fired: upstreamCalls.hedgesFired,
+                hedge_wins: upstreamCalls.hedgeWins,
+                retries: upstreamCalls.retries,
+                retry_enabled: UPSTREAM_RETRY_ENABLED,
+                losers_aborted: upstreamCalls.losersAborted,
+                loser_prompt_tokens_estimated: upstreamCalls.loserPromptTokens,
+                loser_completion_tokens_estimated: upstreamCalls.loserCompletionTokens,
+                loser_estimated_cost_usd: upstreamCalls.loserEstimatedCostUSD
+            }
+        },
+        image_store: {
+            enabled: isImageStoreEnabled(),
+            entries: imageStore.entries.size,
+            bytes: imageStore.bytes,
+            max_entries: IMAGE_STORE_MAX_ENTRIES,
+            max_bytes: IMAGE_STORE_MAX_BYTES,
+            ttl_seconds: IMAGE_STORE_TTL_MS / 1000,
+            hits: imageStore.hits,
+            misses: imageStore.misses,
+            stored: imageStore.stored,
+            evictions: imageStore.evictions,
+            saved_upload_bytes: imageStore.savedUploadBytes
+        },
+        prompt_budget: {
+            budget_tokens: PROMPT_BUDGET_TOKENS,
+            shares: PROMPT_BUDGET_SHARES,
+            requests: promptBudget.requests,
+            trimmed_requests: promptBudget.trimmedRequests,
+            avg_used_tokens: promptBudget.requests > 0
+                ? Number((promptBudget.usedTokens / promptBudget.requests).toFixed(1))
+                : 0,
+            max_used_tokens: promptBudget.maxUsedTokens,
+            avg_utilization: promptBudget.requests > 0
+                ? Number((promptBudget.usedTokens / promptBudget.requests / PROMPT_BUDGET_TOKENS).toFixed(4))
+                : 0,
+            parts: Object.fromEntries(Object.entries(promptBudget.parts).map(([part, totals]) => [part, {
+                used_tokens: totals.used,
+                trimmed_tokens: totals.trimmed
+            }])),
+            summarized_turns: promptBudget.summarizedTurns,
+            dropped_turns: promptBudget.droppedTurns
+        },
+        context_store: {
+            path: CONTEXT_STORE_PATH,
+            store: contextStore.store,
+            blocks: contextStore.blocks.size,
+            loads: contextStore.loads,
+            load_errors: contextStore.loadErrors,
+            ref_requests: contextStore.refRequests,
+            text_requests: contextStore.textRequests,
+            mismatches: contextStore.mismatches,
+            resolved_chars: contextStore.resolvedChars,
+            deduped_surrounding: contextStore.dedupedSurrounding,
+            texts: contextStore.texts.size,
+            text_hits: contextStore.textHits,
+            text_misses: contextStore.textMisses,
+            saved_upload_chars: contextStore.savedUploadChars
+        },
+        latency: latencyMetrics(Boolean(options.latencySeries))
+    };
+}
+
+function latencyTopicLabel(topicId) {
+    const topic = String(topicId || '').trim().slice(0, 120) || 'none';
+    if (latency.topics.has(topic)) return topic;
+    if (latency.topics.size >= LATENCY_MAX_TOPICS) {
+        latency.overflowTopics += 1;
+        return 'other';
+    }
+    latency.topics.add(topic);
+    return topic;
+}
+
+function recordLatency(stage, model, topic, ms) {
+    if (!Number.isFinite(ms) || ms < 0) return;
+    const key = `${stage}\u0000${model}\u0000${topic}`;
+    let series = latency.series.get(key);
+    if (!series) {
+        series = { stage, model, topic, buckets: new Array(LATENCY_BUCKETS_MS.length + 1).fill(0), count: 0, sumMs: 0 };
+        latency.series.set(key, series);
+    }
+    let index = LATENCY_BUCKETS_MS.findIndex((bound) => ms <= bound);
+    if (index === -1) index = LATENCY_BUCKETS_MS.length;
+    series.buckets[index] += 1;
+    series.count += 1;
+    series.sumMs += ms;
+}
+
+// Percentil a partir de los buckets, interpolando dentro del bucket como
+// histogram_quantile de Prometheus. El bucket +Inf devuelve el ultimo limite.
+function histogramQuantile(buckets, count, q) {
+    if (!count) return 0;
+    const rank = q * count;
+    let cumulative = 0;
+    for (let i = 0; i < buckets.length; i++) {
+        const previous = cumulative;
+        cumulative += buckets[i];
+        if (cumulative < rank || buckets[i] === 0) continue;
+        if (i === LATENCY_BUCKETS_MS.length) return LATENCY_BUCKETS_MS[i - 1];
+        const lower = i === 0 ? 0 : LATENCY_BUCKETS_MS[i - 1];
+        return lower + (LATENCY_BUCKETS_MS[i] - lower) * ((rank - previous) / buckets[i]);
+    }
+    return LATENCY_BUCKETS_MS[LATENCY_BUCKETS_MS.length - 1];
+}
+
+function latencySummary(buckets, count, sumMs) {
+    const round = (value) => Number(value.toFixed(2));
+    return {
+        count,
+        avg_ms: count ? round(sumMs / count) : 0,
+        p50_ms: round(histogramQuantile(buckets, count, 0.5)),
+        p95_ms: round(histogramQuantile(buckets, count, 0.95)),
+        p99_ms: round(histogramQuantile(buckets, count, 0.99))
+    };
+}
+
+function latencyMetrics(includeSeries) {
+    const stages = {};
+    LATENCY_STAGES.forEach((stage) => {
+        const buckets = new Array(LATENCY_BUCKETS_MS.length + 1).fill(0);
+        let count = 0;
+        let sumMs = 0;
+        latency.series.forEach((series) => {
+            if (series.stage !== stage) return;
+            series.buckets.forEach((value, i) => {
+                buckets[i] += value;
+            });
+            count += series.count;
+            sumMs += series.sumMs;
+        });
+        stages[stage] = latencySummary(buckets, count, sumMs);
+    });
+
+    const payload = { buckets_ms: LATENCY_BUCKETS_MS, stages, overflow_topics: latency.overflowTopics };
+    if (includeSeries) {
+        payload.series = Array.from(latency.series.values()).map((series) => ({
+            stage: series.stage,
+            model: series.model,
+            topic: series.topic,
+            ...latencySummary(series.buckets, series.count, series.sumMs)
+        }));
+    }
+    return payload;
+}
+
+function prometheusMetrics() {
+    const lines = [];
+    const label = (value) => String(value).replace(/\\/g, '\\\\').replace(/"/g, '\\"').replace(/\n/g, '\\n');
+    const labels = (pairs) => `{${Object.keys(pairs).map((key) => `${key}="${label(pairs[key])}"`).join(',')}}`;
+    const metric = (name, type, help, samples) => {
+        lines.push(`# HELP ${name} ${help}`);
+        lines.push(`# TYPE ${name} ${type}`);
+        samples.forEach(([suffix, pairs, value]) => lines.push(`${name}${suffix}${pairs ? labels(pairs) : ''} ${value}`));
     };
+
+    metric('assistant_bridge_requests_total', 'counter', 'Consultas atendidas por el upstream.', [['', null, usage.totalRequests]]);
+    metric('assistant_bridge_tokens_total', 'counter', 'Tokens consumidos.', [
+        ['', { kind: 'prompt' }, usage.totalPromptTokens],
+        ['', { kind: 'completion' }, usage.totalCompletionTokens]
+    ]);
+    metric('assistant_bridge_estimated_cost_usd_total', 'counter', 'Coste estimado acumulado en USD.', [
+        ['', null, usage.totalEstimatedCostUSD]
+    ]);
+    metric('assistant_bridge_image_store_requests_total', 'counter', 'Imagenes referenciadas por hash, encontradas o no.', [
+        ['', { result: 'hit' }, imageStore.hits],
+        ['', { result: 'miss' }, imageStore.misses]
+    ]);
+    metric('assistant_bridge_image_store_bytes', 'gauge', 'Bytes (base64) en el almacen de imagenes.', [['', null, imageStore.bytes]]);
+    metric('assistant_bridge_prompt_tokens_estimated_total', 'counter', 'Tokens estimados del prompt montado, por parte.', [
+        ...Object.entries(promptBudget.parts).map(([part, totals]) => ['', { part }, totals.used])
+    ]);
+    metric('assistant_bridge_prompt_trimmed_tokens_total', 'counter', 'Tokens estimados recortados por el presupuesto, por parte.', [
+        ...['question', 'context', 'memory'].map((part) => ['', { part }, promptBudget.parts[part].trimmed])
+    ]);
+    metric('assistant_bridge_prompt_memory_turns_total', 'counter', 'Turnos de memoria que no caben enteros en el presupuesto.', [
+        ['', { action: 'summarized' }, promptBudget.summarizedTurns],
+        ['', { action: 'dropped' }, promptBudget.droppedTurns]
+    ]);
+    metric('assistant_bridge_context_requests_total', 'counter', 'Consultas con contexto, por forma de envio.', [
+        ['', { mode: 'refs' }, contextStore.refRequests],
+        ['', { mode: 'text' }, contextStore.textRequests],
+        ['', { mode: 'mismatch' }, contextStore.mismatches]
+    ]);
+    metric('assistant_bridge_context_texts_total', 'counter', 'Textos de contexto referenciados por hash en lugar de reenviados.', [
+        ['', { result: 'hit' }, contextStore.textHits],
+        ['', { result: 'miss' }, contextStore.textMisses]
+    ]);
+    metric('assistant_bridge_answer_cache_requests_total', 'counter', 'Consultas resueltas o no por la cache de respuestas.', [
+        ['', { result: 'hit' }, answerCache.hits],
+        ['', { result: 'miss' }, answerCache.misses],
+        ['', { result: 'bypass' }, answerCache.bypassed]
+    ]);
+    metric('assistant_bridge_upstream_attempts_total', 'counter', 'Intentos contra el upstream, por tipo.', [
+        ['', { kind: 'primary' }, upstreamCalls.attempts - upstreamCalls.hedgesFired - upstreamCalls.retries],
+        ['', { kind: 'hedge' }, upstreamCalls.hedgesFired],
+        ['', { kind: 'retry' }, upstreamCalls.retries]
+    ]);
+    metric('assistant_bridge_upstream_losers_aborted_total', 'counter', 'Intentos abortados por perder el hedge o por timeout.', [
+        ['', null, upstreamCalls.losersAborted]
+    ]);
+    metric('assistant_bridge_upstream_loser_tokens_estimated_total', 'counter', 'Tokens estimados que el upstream puede facturar por los intentos abortados.', [
+        ['', { kind: 'prompt' }, upstreamCalls.loserPromptTokens],
+        ['', { kind: 'completion' }, upstreamCalls.loserCompletionTokens]
+    ]);
+    metric('assistant_bridge_upstream_hedge_wins_total', 'counter', 'Consultas ganadas por el intento hedge.', [
+        ['', null, upstreamCalls.hedgeWins]
+    ]);
+    metric('assistant_bridge_upstream_deadline_exceeded_total', 'counter', 'Llamadas cortadas por deadline.', [
+        ['', null, upstreamCalls.deadlineExceeded]
+    ]);
+    metric('assistant_bridge_upstream_sockets_total', 'counter', 'Respuestas del upstream segun el socket usado.', [
+        ['', { socket: 'reused' }, upstreamCalls.reusedSockets],
+        ['', { socket: 'new' }, upstreamCalls.newSockets]
+    ]);
+    metric('assistant_bridge_upstream_active', 'gauge', 'Llamadas al upstream en curso.', [['', null, upstreamLimiter.active]]);
+    metric('assistant_bridge_upstream_queue_depth', 'gauge', 'Consultas esperando hueco para el upstream.', [
+        ['', null, upstreamLimiter.queue.length]
+    ]);
+
+    const histogram = [];
+    const quantiles = [];
+    latency.series.forEach((series) => {
+        const base = { stage: series.stage, model: series.model, topic: series.topic };
+        let cumulative = 0;
+        LATENCY_BUCKETS_MS.forEach((bound, i) => {
+            cumulative += series.buckets[i];
+            histogram.push(['_bucket', { ...base, le: String(bound / 1000) }, cumulative]);
+        });
+        histogram.push(['_bucket', { ...base, le: '+Inf' }, series.count]);
+        histogram.push(['_sum', base, series.sumMs / 1000]);
+        histogram.push(['_count', base, series.count]);
+        [0.5, 0.95, 0.99].forEach((q) => {
+            quantiles.push(['', { ...base, quantile: String(q) }, histogramQuantile(series.buckets, series.count, q) / 1000]);
+        });
+    });
+    metric('assistant_bridge_stage_duration_seconds', 'histogram', 'Duracion de cada etapa de /ask.', histogram);
+    metric(
+        'assistant_bridge_stage_duration_quantile_seconds',
+        'gauge',
+        'p50/p95/p99 estimados desde los buckets del histograma.',
+        quantiles
+    );
+    return lines.join('\n') + '\n';
 }
 
 function rollDailyIfNeeded() {
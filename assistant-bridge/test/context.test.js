@@ -0,0 +1,68 @@
+// Pruebas del contexto enviado por hash entre consultas de una conversacion.
+//
+//   node --test assistant-bridge/test/
+//
+// Sin almacen de contexto el panel envia el texto seleccionado; el bridge devuelve
+// su hash y en las consultas siguientes basta con el hash.
+
+const test = require('node:test');
+const assert = require('node:assert/strict');
+const crypto = require('node:crypto');
+const helpers = require('./helpers');
+
+const { askJson, getJson } = helpers;
+
+const sha256 = (text) => crypto.createHash('sha256').update(text).digest('hex');
+
+const SELECTED = 'Un caso de uso orquesta entidades del dominio a través de puertos.';
+const SURROUNDING = 'Los adaptadores implementan los puertos y viven en la capa de infraestructura.';
+
+let stack;
+
+test.before(async () => {
+    stack = await helpers.startStack({
+        mockEnv: { MOCK_UPSTREAM_DELAY_MS: '20', MOCK_UPSTREAM_TOKEN_DELAY_MS: '5' }
+    });
+});
+
+test.after(() => stack.stop());
+
+test('context sent once is referenced by hash in the next question', async () => {
+    const before = (await getJson(`${stack.bridgeUrl}/metrics`)).prompt_budget.parts.context.used_tokens;
+    const first = await askJson(stack.bridgeUrl, '¿Qué es un caso de uso?', {
+        selectedText: SELECTED,
+        surroundingContext: SURROUNDING
+    });
+    assert.equal(first.status, 200);
+    assert.deepEqual(first.payload.contextHashes, {
+        selectedText: sha256(SELECTED),
+        surroundingContext: sha256(SURROUNDING)
+    });
+    const afterFirst = (await getJson(`${stack.bridgeUrl}/metrics`)).prompt_budget.parts.context.used_tokens;
+
+    const second = await askJson(stack.bridgeUrl, '¿Y dónde viven los adaptadores?', {
+        contextHashes: first.payload.contextHashes
+    });
+    assert.equal(second.status, 200);
+    assert.deepEqual(second.payload.contextHashes, first.payload.contextHashes);
+
+    const metrics = await getJson(`${stack.bridgeUrl}/metrics`);
+    // El prompt de la segunda consulta lleva el mismo contexto que la primera.
+    assert.equal(metrics.prompt_budget.parts.context.used_tokens - afterFirst, afterFirst - before);
+    assert.equal(metrics.context_store.text_hits, 2);
+    assert.equal(metrics.context_store.saved_upload_chars, SELECTED.length + SURROUNDING.length);
+});
+
+test('an unknown context hash asks the panel to resend the text', async () => {
+    const missing = sha256('un texto que el bridge no ha visto');
+    const { status, payload } = await askJson(stack.bridgeUrl, '¿Qué es un puerto?', {
+        contextHashes: { selectedText: missing }
+    });
+    assert.equal(status, 409);
+    assert.equal(payload.code, 'context_unknown');
+
+    const metrics = await getJson(`${stack.bridgeUrl}/metrics`);
+    assert.equal(metrics.context_store.text_misses, 1);
+    const prometheus = await (await fetch(`${stack.bridgeUrl}/metrics/prometheus`)).text();
+    assert.match(prometheus, /assistant_bridge_context_texts_total\{result="miss"\} 1/);
+});
@@ -0,0 +1,130 @@
+// Utilidades compartidas por las pruebas del bridge: arrancan mock-upstream.js y
+// server.js en puertos libres y hablan con /ask en SSE o JSON.
+
+const assert = require('node:assert/strict');
+const net = require('net');
+const path = require('path');
+const { spawn } = require('child_process');
+
+const BRIDGE_DIR = path.join(__dirname, '..');
+
+// Arranca el upstream simulado y un bridge apuntando a el. Devuelve las URLs y stop().
+async function startStack({ mockEnv = {}, bridgeEnv = {} } = {}) {
+    const mockPort = await freePort();
+    const bridgePort = await freePort();
+    const mockUrl = `http://127.0.0.1:${mockPort}`;
+    const bridgeUrl = `http://127.0.0.1:${bridgePort}`;
+
+    const children = [
+        start('mock-upstream.js', { MOCK_UPSTREAM_PORT: String(mockPort), ...mockEnv }),
+        start('server.js', {
+            ASSISTANT_BRIDGE_PORT: String(bridgePort),
+            OPENAI_BASE_URL: `${mockUrl}/v1`,
+            OPENAI_API_KEY: 'mock',
+            ASSISTANT_CONTEXT_STORE: path.join(BRIDGE_DIR, 'test', 'no-context-store.json'),
+            ...bridgeEnv
+        })
+    ];
+
+    await waitFor(`${mockUrl}/stats`);
+    await waitFor(`${bridgeUrl}/health`);
+    return { mockUrl, bridgeUrl, stop: () => children.forEach((child) => child.kill()) };
+}
+
+function start(script, env) {
+    return spawn(process.execPath, [path.join(BRIDGE_DIR, script)], {
+        env: { ...process.env, ...env },
+        stdio: ['ignore', 'ignore', 'inherit']
+    });
+}
+
+async function ask(bridgeUrl, question, { controller, abortAfterDeltas, body } = {}) {
+    const response = await fetch(`${bridgeUrl}/ask`, {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json', Accept: 'text/event-stream' },
+        body: JSON.stringify({ ...body, question, topicId: 'test', stream: true }),
+        signal: controller ? controller.signal : undefined
+    });
+    assert.equal(response.status, 200);
+    assert.match(response.headers.get('content-type'), /text\/event-stream/);
+
+    const events = [];
+    const decoder = new TextDecoder();
+    let buffer = '';
+    try {
+        for await (const chunk of response.body) {
+            buffer += decoder.decode(chunk, { stream: true });
+            let boundary = buffer.indexOf('\n\n');
+            while (boundary !== -1) {
+                events.push(parseEvent(buffer.slice(0, boundary)));
+                buffer = buffer.slice(boundary + 2);
+                boundary = buffer.indexOf('\n\n');
+            }
+            const deltas = events.filter((event) => event.type === 'delta').length;
+            if (abortAfterDeltas && deltas >= abortAfterDeltas) controller.abort();
+        }
+    } catch (err) {
+        if (err.name !== 'AbortError') throw err;
+        return { events, aborted: true };
+    }
+    return { events, aborted: false };
+}
+
+// Consulta sin streaming: devuelve { status, payload }.
+async function askJson(bridgeUrl, question, body = {}) {
+    const response = await fetch(`${bridgeUrl}/ask`, {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify({ ...body, question, topicId: 'test' })
+    });
+    return { status: response.status, payload: await response.json() };
+}
+
+function parseEvent(block) {
+    let type = 'message';
+    const data = [];
+    block.split('\n').forEach((line) => {
+        if (line.startsWith('event:')) type = line.slice(6).trim();
+        if (line.startsWith('data:')) data.push(line.slice(5).trim());
+    });
+    return { type, data: JSON.parse(data.join('\n')) };
+}
+
+async function getJson(url) {
+    const response = await fetch(url);
+    return response.json();
+}
+
+async function waitFor(url, timeoutMs = 5000) {
+    await eventually(async () => {
+        const response = await fetch(url);
+        assert.ok(response.ok);
+    }, timeoutMs);
+}
+
+async function eventually(check, timeoutMs = 3000) {
+    const deadline = Date.now() + timeoutMs;
+    for (;;) {
+        try {
+            await check();
+            return;
+        } catch (err) {
+            if (Date.now() > deadline) throw err;
+            await new Promise((resolve) => setTimeout(resolve, 50));
+        }
+    }
+}
+
+function freePort() {
+    return new Promise((resolve, reject) => {
+        const server = net.createServer();
+        server.unref();
+        server.on('error', reject);
+        server.listen(0, '127.0.0.1', () => {
+            const { port } = server.address();
+            server.close(() => resolve(port));
+        });
+    });
+}
+
+module.exports = { startStack, ask, askJson, getJson, eventually };
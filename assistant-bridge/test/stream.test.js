@@ -0,0 +1,114 @@
+// Pruebas del streaming del bridge contra mock-upstream.js (sin API key ni coste).
+//
+//   node --test assistant-bridge/test/
+//
+// Arranca el upstream simulado y el bridge en puertos libres y comprueba los
+// eventos SSE (delta, done con usage), el timeout de inactividad, la cancelacion
+// y que el presupuesto del prompt no recorte la pregunta.
+
+const test = require('node:test');
+const assert = require('node:assert/strict');
+const helpers = require('./helpers');
+
+// Respuesta de ~25 tokens a 80 ms: mas de 2 s de stream, el doble del timeout.
+const TOKEN_DELAY_MS = 80;
+const UPSTREAM_TIMEOUT_MS = 1000;
+
+let stack;
+
+test.before(async () => {
+    stack = await helpers.startStack({
+        mockEnv: {
+            MOCK_UPSTREAM_DELAY_MS: '100',
+            MOCK_UPSTREAM_TOKEN_DELAY_MS: String(TOKEN_DELAY_MS)
+        },
+        bridgeEnv: {
+            ASSISTANT_UPSTREAM_TIMEOUT_MS: String(UPSTREAM_TIMEOUT_MS)
+        }
+    });
+});
+
+test.after(() => stack.stop());
+
+const ask = (question, options) => helpers.ask(stack.bridgeUrl, question, options);
+const { getJson, eventually } = helpers;
+
+test('streams delta events and a done event with usage', async () => {
+    const { events } = await ask('¿Qué es un caso de uso?');
+
+    const deltas = events.filter((event) => event.type === 'delta');
+    const done = events.find((event) => event.type === 'done');
+    assert.ok(deltas.length > 1, 'se esperaban varios eventos delta');
+    assert.ok(done, 'falta el evento done');
+    assert.equal(events[events.length - 1], done, 'done debe ser el ultimo evento');
+    assert.equal(deltas.map((event) => event.data.text).join(''), done.data.answer);
+    assert.equal(done.data.ok, true);
+    assert.equal(done.data.cached, false);
+    assert.ok(done.data.usage.prompt_tokens > 0);
+    assert.ok(done.data.usage.completion_tokens > 0);
+    assert.equal(done.data.usage.total_tokens, done.data.usage.prompt_tokens + done.data.usage.completion_tokens);
+    assert.equal(done.data.usage.estimated, false, 'el mock envia usage: no hace falta estimarlo');
+});
+
+test('a stream longer than the upstream timeout is not cut while chunks keep arriving', async () => {
+    const startedAt = Date.now();
+    const { events } = await ask('¿Cuánto dura una respuesta larga?');
+
+    assert.ok(Date.now() - startedAt > UPSTREAM_TIMEOUT_MS, 'el stream deberia durar mas que el timeout');
+    assert.equal(events.filter((event) => event.type === 'error').length, 0);
+    assert.ok(events.find((event) => event.type === 'done'), 'falta el evento done');
+});
+
+test('the second identical question is served from the cache', async () => {
+    await ask('¿Qué es un puerto?');
+    const { events } = await ask('¿Qué es un puerto?');
+    const done = events.find((event) => event.type === 'done');
+    assert.equal(done.data.cached, true);
+    assert.equal(done.data.usage.total_tokens, 0);
+});
+
+test('requests that differ only in maxTokens do not share a cached answer', async () => {
+    await ask('¿Qué es un adaptador?', { body: { maxTokens: 200 } });
+    const { events } = await ask('¿Qué es un adaptador?', { body: { maxTokens: 800 } });
+    assert.equal(events.find((event) => event.type === 'done').data.cached, false);
+
+    const again = await ask('¿Qué es un adaptador?', { body: { maxTokens: 800 } });
+    assert.equal(again.events.find((event) => event.type === 'done').data.cached, true);
+});
+
+test('cancelling the client request cancels the upstream stream', async () => {
+    const before = await getJson(`${stack.mockUrl}/stats`);
+    const controller = new AbortController();
+    const { events, aborted } = await ask('¿Se puede cancelar?', { controller, abortAfterDeltas: 1 });
+
+    assert.equal(aborted, true);
+    assert.ok(!events.find((event) => event.type === 'done'));
+    await eventually(async () => {
+        const after = await getJson(`${stack.mockUrl}/stats`);
+        assert.equal(after.cancelled, before.cancelled + 1);
+    });
+});
+
+test('a long question is kept whole while context and memory are trimmed', async () => {
+    const question = `¿${'Por qué la capa de dominio no depende de la infraestructura? '.repeat(40)}`;
+    const before = (await getJson(`${stack.bridgeUrl}/metrics`)).prompt_budget.parts;
+    const { events } = await ask(question, {
+        body: {
+            selectedText: 'Los casos de uso orquestan el dominio. '.repeat(200),
+            memory: {
+                conversation_summary: 'Hablamos de puertos y adaptadores. '.repeat(50),
+                recent_messages: Array.from({ length: 8 }, (_, i) => ({
+                    role: i % 2 ? 'assistant' : 'user',
+                    text: 'Un turno anterior bastante largo sobre arquitectura. '.repeat(17)
+                }))
+            }
+        }
+    });
+    assert.ok(events.find((event) => event.type === 'done'), 'falta el evento done');
+
+    const after = (await getJson(`${stack.bridgeUrl}/metrics`)).prompt_budget.parts;
+    assert.ok(after.question.used_tokens - before.question.used_tokens >= Math.ceil(question.trim().length / 4));
+    assert.equal(after.question.trimmed_tokens, before.question.trimmed_tokens);
+    assert.ok(after.context.trimmed_tokens > before.context.trimmed_tokens);
+    assert.ok(after.memory.trimmed_tokens > before.memory.trimmed_tokens);
+});
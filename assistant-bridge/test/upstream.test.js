@@ -0,0 +1,104 @@
+// Pruebas de reintentos y hedging del bridge contra mock-upstream.js.
+//
+//   node --test assistant-bridge/test/
+//
+// Las directivas [mock:...] de la pregunta hacen que el upstream simulado se
+// atasque o falle solo en la primera peticion de cada prompt, asi que el
+// resultado es determinista.
+
+const test = require('node:test');
+const assert = require('node:assert/strict');
+const helpers = require('./helpers');
+
+const { askJson, getJson, eventually } = helpers;
+
+const MOCK_ENV = {
+    MOCK_UPSTREAM_DELAY_MS: '20',
+    MOCK_UPSTREAM_TOKEN_DELAY_MS: '5',
+    MOCK_UPSTREAM_SLOW_MS: '5000'
+};
+
+test('a hedge fires on a stalled attempt, wins and aborts the loser', async (t) => {
+    const stack = await helpers.startStack({
+        mockEnv: MOCK_ENV,
+        bridgeEnv: { ASSISTANT_UPSTREAM_HEDGE: '1', ASSISTANT_UPSTREAM_HEDGE_DELAY_MS: '200' }
+    });
+    t.after(() => stack.stop());
+
+    for (const stream of [false, true]) {
+        const before = await getJson(`${stack.bridgeUrl}/metrics`);
+        const startedAt = Date.now();
+        const question = `[mock:slow-first] ¿Qué es un hedge? (stream: ${stream})`;
+        if (stream) {
+            const { events } = await helpers.ask(stack.bridgeUrl, question);
+            assert.ok(events.find((event) => event.type === 'done'), 'falta el evento done');
+        } else {
+            const { status, payload } = await askJson(stack.bridgeUrl, question);
+            assert.equal(status, 200);
+            assert.equal(payload.ok, true);
+        }
+        assert.ok(Date.now() - startedAt < 2000, 'el hedge deberia responder antes que el intento atascado');
+
+        const after = await getJson(`${stack.bridgeUrl}/metrics`);
+        const hedging = after.upstream.hedging;
+        assert.equal(hedging.hedges_fired - before.upstream.hedging.hedges_fired, 1);
+        assert.equal(hedging.hedge_wins - before.upstream.hedging.hedge_wins, 1);
+        assert.equal(hedging.losers_aborted - before.upstream.hedging.losers_aborted, 1);
+        assert.equal(hedging.retries, 0);
+        assert.ok(hedging.loser_prompt_tokens_estimated > before.upstream.hedging.loser_prompt_tokens_estimated);
+        assert.ok(after.total_estimated_cost_usd > before.total_estimated_cost_usd);
+    }
+
+    // El upstream ve cerrarse la conexion del perdedor.
+    await eventually(async () => {
+        const stats = await getJson(`${stack.mockUrl}/stats`);
+        assert.equal(stats.cancelled, 2);
+    });
+
+    const prometheus = await (await fetch(`${stack.bridgeUrl}/metrics/prometheus`)).text();
+    assert.match(prometheus, /assistant_bridge_upstream_attempts_total\{kind="primary"\} 2/);
+    assert.match(prometheus, /assistant_bridge_upstream_attempts_total\{kind="hedge"\} 2/);
+    assert.doesNotMatch(prometheus, /kind="all"/);
+    assert.match(prometheus, /assistant_bridge_upstream_losers_aborted_total 2/);
+});
+
+test('retries without hedging: 5xx once, never 4xx', async (t) => {
+    const stack = await helpers.startStack({ mockEnv: MOCK_ENV });
+    t.after(() => stack.stop());
+
+    const stats0 = await getJson(`${stack.mockUrl}/stats`);
+    const recovered = await askJson(stack.bridgeUrl, '[mock:fail-first] ¿Se recupera de un 500?');
+    assert.equal(recovered.status, 200);
+    assert.equal(recovered.payload.ok, true);
+    const stats1 = await getJson(`${stack.mockUrl}/stats`);
+    assert.equal(stats1.requests - stats0.requests, 2);
+    assert.equal(stats1.failed - stats0.failed, 1);
+
+    const rejected = await askJson(stack.bridgeUrl, '[mock:400] ¿Se reintenta un 400?');
+    assert.equal(rejected.status, 502);
+    assert.equal(rejected.payload.ok, false);
+    const stats2 = await getJson(`${stack.mockUrl}/stats`);
+    assert.equal(stats2.requests - stats1.requests, 1, 'un 4xx no se reintenta');
+
+    const metrics = await getJson(`${stack.bridgeUrl}/metrics`);
+    assert.equal(metrics.upstream.hedging.enabled, false);
+    assert.equal(metrics.upstream.hedging.retries, 1);
+    assert.equal(metrics.upstream.hedging.hedges_fired, 0);
+});
+
+test('a timed-out attempt is retried before anything reaches the client', async (t) => {
+    const stack = await helpers.startStack({
+        mockEnv: MOCK_ENV,
+        bridgeEnv: { ASSISTANT_UPSTREAM_TIMEOUT_MS: '1000' }
+    });
+    t.after(() => stack.stop());
+
+    const { status, payload } = await askJson(stack.bridgeUrl, '[mock:slow-first] ¿Y si se atasca?');
+    assert.equal(status, 200);
+    assert.equal(payload.ok, true);
+
+    const metrics = await getJson(`${stack.bridgeUrl}/metrics`);
+    assert.equal(metrics.upstream.deadline_exceeded, 1);
+    assert.equal(metrics.upstream.hedging.retries, 1);
+    assert.equal(metrics.upstream.hedging.losers_aborted, 1);
+});
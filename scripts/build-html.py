@@ -3,20 +3,40 @@
 Convierte todos los .md del curso a un unico HTML autocontenido.
 No requiere dependencias externas (solo Python 3 estandar).
 Mermaid.js y highlight.js se cargan desde CDN.
+
+Uso:
+    python3 scripts/build-html.py [--md-backend line|fast]   # build (por defecto)
+    python3 scripts/build-html.py conformance                # diff line vs fast + throughput
+    python3 scripts/build-html.py serve [--port 8043]        # previsualizacion bajo demanda (LRU)
+    python3 scripts/build-html.py near-duplicates           # informe de parrafos casi duplicados
+    python3 scripts/build-html.py build --dedupe-paragraphs  # build + parrafos identicos como referencias
+    python3 scripts/build-html.py manifest-diff OLD [NEW]    # ficheros y lecciones que cambian entre builds
+    python3 scripts/build-html.py perf-collect               # colector local de beacons del navegador
+    python3 scripts/build-html.py perf-report                # percentiles por leccion de los beacons
+    python3 scripts/build-html.py serve-dist [--port 8042]   # dist/ + assistant-bridge en el mismo origen
+    python3 scripts/build-html.py mermaid-report [--strict]  # coste de layout de los diagramas Mermaid
 """
 
+import argparse
+import difflib
+import hashlib
+import html as html_lib
+import http.client
+import json
+import math
 import os
+import posixpath
+import random
 import re
 import sys
-import shutil
+import threading
+import time
+import unicodedata
+import urllib.parse
+from collections import Counter, OrderedDict, deque
+from http.server import BaseHTTPRequestHandler, SimpleHTTPRequestHandler, ThreadingHTTPServer
 from pathlib import Path
 
-COURSE_ROOT = Path(__file__).parent.parent
-OUTPUT_DIR = COURSE_ROOT / "dist"
-OUTPUT_FILE = OUTPUT_DIR / "curso-stack-my-architecture.html"
-ASSETS_SRC_DIR = COURSE_ROOT / "assets"
-ASSETS_DIST_DIR = OUTPUT_DIR / "assets"
-
 # Orden de los archivos (segun README)
 FILE_ORDER = [
     "00-informe/INFORME-CURSO.md",
@@ -99,9 +119,80 @@ FILE_ORDER = [
     "anexos/proyecto-final.md",
 ]
 
+# Assets que el shell carga desde assets/ (se copian a dist/assets en el build).
+ASSET_NAMES = [
+    "study-ux.js",
+    "study-ux.css",
+    "course-switcher.js",
+    "course-switcher.css",
+    "theme-controls.js",
+    "assistant-panel.js",
+    "assistant-panel.css",
+    "assistant-bridge.js",
+    "style-enterprise.css",
+    "style-bold.css",
+    "style-paper.css",
+]
+
 
-def md_to_html(md_text, file_id):
-    """Convierte markdown a HTML basico con soporte para Mermaid."""
+class BuildConfig:
+    """Rutas y orden de lecciones de un build; el build estatico y el servidor de previsualizacion comparten la misma."""
+
+    def __init__(self, course_root=None, output_dir=None, output_name="curso-stack-my-architecture.html", file_order=None):
+        self.course_root = Path(course_root) if course_root else Path(__file__).parent.parent
+        self.output_dir = Path(output_dir) if output_dir else self.course_root / "dist"
+        self.output_file = self.output_dir / output_name
+        self.assets_src_dir = self.course_root / "assets"
+        self.assets_dist_dir = self.output_dir / "assets"
+        self.benchmarks_dir = self.course_root / "apps" / "ios" / "ArchitectureKit" / "benchmarks"
+        self.file_order = list(file_order) if file_order is not None else list(FILE_ORDER)
+        self.topic_ids_file = self.course_root / "scripts" / "topic-ids.json"
+
+
+def file_id_for(filepath):
+    return filepath.replace("/", "-").replace(".md", "")
+
+
+def assign_topic_nums(config, lesson_paths):
+    """Id numerico corto y estable por leccion, persistido en scripts/topic-ids.json.
+
+    study-ux guarda el progreso con estos ids (bitsets), asi que reordenar
+    FILE_ORDER no pierde nada. Las lecciones nuevas reciben el siguiente id
+    libre; los ids de lecciones borradas no se reutilizan.
+    """
+    path = config.topic_ids_file
+    data = json.loads(path.read_text(encoding="utf-8")) if path.exists() else {}
+    topics = dict(data.get("topics", {}))
+    next_num = int(data.get("next", max(topics.values(), default=0) + 1))
+
+    added = [rel_path for rel_path in lesson_paths if rel_path not in topics]
+    for rel_path in added:
+        topics[rel_path] = next_num
+        next_num += 1
+
+    if added or not path.exists():
+        # Solo se escribe si hay ids nuevos: build y serve no tocan el fichero versionado.
+        ordered = dict(sorted(topics.items(), key=lambda item: item[1]))
+        tmp_path = path.with_name(path.name + ".tmp")
+        tmp_path.write_text(json.dumps({"next": next_num, "topics": ordered}, indent=2) + "\n", encoding="utf-8")
+        tmp_path.replace(path)
+    return {rel_path: topics[rel_path] for rel_path in lesson_paths}
+
+
+def load_course_files(config):
+    """Lee las lecciones de config.file_order. Devuelve [(ruta relativa, contenido)]."""
+    files_content = []
+    for rel_path in config.file_order:
+        full_path = config.course_root / rel_path
+        if full_path.exists():
+            files_content.append((rel_path, full_path.read_text(encoding="utf-8")))
+        else:
+            print(f"  [SKIP] {rel_path} (no encontrado)")
+    return files_content
+
+
+def line_md_to_html(md_text, file_id):
+    """Convierte markdown a HTML basico con soporte para Mermaid (backend de referencia)."""
     html = ""
     lines = md_text.split("\n")
     i = 0
@@ -277,8 +368,1643 @@ def inline_format(text):
     return text
 
 
+# ============================================================
+# Backend "fast": misma salida que el de referencia, con regex
+# precompiladas y acumulacion en lista en lugar de concatenar str.
+# ============================================================
+NAV_SECTIONS = {
+    "00-informe": "Informe fundacional",
+    "01-fundamentos": "Etapa 1: Junior",
+    "02-integracion": "Etapa 2: Mid",
+    "03-evolucion": "Etapa 3: Senior",
+    "04-arquitecto": "Etapa 4: Arquitecto",
+    "05-maestria": "Etapa 5: Maestria",
+    "anexos": "Anexos",
+}
+
+_HEADER_RE = re.compile(r"^(#{1,6})\s+(.+)$")
+_HR_RE = re.compile(r"^---+\s*$")
+_BULLET_RE = re.compile(r"^\s*[-*]\s+")
+_NUMBERED_RE = re.compile(r"^\s*\d+[.)]\s+")
+_ANCHOR_RE = re.compile(r"[^a-z0-9]+")
+_H1_RE = re.compile(r"^#\s+(.+)$", re.MULTILINE)
+_INLINE_RULES = [
+    (re.compile(r"`([^`]+)`"), r"<code>\1</code>"),
+    (re.compile(r"\*\*\*(.+?)\*\*\*"), r"<strong><em>\1</em></strong>"),
+    (re.compile(r"\*\*(.+?)\*\*"), r"<strong>\1</strong>"),
+    (re.compile(r"\*(.+?)\*"), r"<em>\1</em>"),
+    (re.compile(r"\[([^\]]+)\]\(([^)]+)\)"), r'<a href="\2">\1</a>'),
+    (re.compile(r"!\[([^\]]*)\]\(([^)]+)\)"), r'<img alt="\1" src="\2">'),
+]
+
+
+def fast_inline_format(text):
+    """Equivalente a inline_format con las regex ya compiladas."""
+    for pattern, replacement in _INLINE_RULES:
+        text = pattern.sub(replacement, text)
+    return text
+
+
+def fast_render_table(rows):
+    """Equivalente a render_table acumulando en lista."""
+    if len(rows) < 2:
+        return ""
+    out = ["<table>\n<thead>\n<tr>\n"]
+    for h in rows[0].strip().strip("|").split("|"):
+        out.append(f"  <th>{fast_inline_format(h.strip())}</th>\n")
+    out.append("</tr>\n</thead>\n<tbody>\n")
+    for row in rows[2:]:
+        out.append("<tr>\n")
+        for c in row.strip().strip("|").split("|"):
+            out.append(f"  <td>{fast_inline_format(c.strip())}</td>\n")
+        out.append("</tr>\n")
+    out.append("</tbody>\n</table>\n")
+    return "".join(out)
+
+
+def _tail(parts, size):
+    """Ultimos `size` caracteres de "".join(parts) sin unir toda la lista."""
+    tail = ""
+    for part in reversed(parts):
+        tail = part + tail
+        if len(tail) >= size:
+            break
+    return tail[-size:]
+
+
+def fast_md_to_html(md_text, file_id):
+    """Equivalente a line_md_to_html (salida byte a byte identica), en tiempo lineal."""
+    out = []
+    append = out.append
+    in_code = False
+    in_list = False
+    in_table = False
+    code_lang = ""
+    code_buffer = []
+    table_buffer = []
+
+    for line in md_text.split("\n"):
+        stripped = line.strip()
+
+        if in_code:
+            if stripped.startswith("```"):
+                raw_code_content = "\n".join(code_buffer)
+                if code_lang.lower() == "mermaid":
+                    append(f'<pre class="mermaid">{raw_code_content}</pre>\n')
+                else:
+                    code_content = raw_code_content.replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;")
+                    if code_lang:
+                        append(f'<pre><code class="language-{code_lang}">{code_content}</code></pre>\n')
+                    else:
+                        append(f"<pre><code>{code_content}</code></pre>\n")
+                in_code = False
+                code_lang = ""
+            else:
+                code_buffer.append(line)
+            continue
+
+        if stripped.startswith("```"):
+            if in_list:
+                append("</ul>\n")
+                in_list = False
+            code_lang = stripped[3:].strip()
+            in_code = True
+            code_buffer = []
+            continue
+
+        if "|" in line and stripped.startswith("|"):
+            if not in_table:
+                if in_list:
+                    append("</ul>\n")
+                    in_list = False
+                in_table = True
+                table_buffer = []
+            table_buffer.append(line)
+            continue
+        elif in_table:
+            append(fast_render_table(table_buffer))
+            in_table = False
+            table_buffer = []
+
+        header_match = _HEADER_RE.match(line)
+        if header_match:
+            if in_list:
+                append("</ul>\n")
+                in_list = False
+            level = len(header_match.group(1))
+            text = fast_inline_format(header_match.group(2))
+            anchor = _ANCHOR_RE.sub("-", text.lower().strip())
+            append(f'<h{level} id="{file_id}-{anchor}">{text}</h{level}>\n')
+            continue
+
+        if _HR_RE.match(line):
+            if in_list:
+                append("</ul>\n")
+                in_list = False
+            append("<hr>\n")
+            continue
+
+        bullet_match = _BULLET_RE.match(line)
+        if bullet_match:
+            if not in_list:
+                append("<ul>\n")
+                in_list = True
+            content = line[bullet_match.end():]
+            content = content.replace("[ ]", "&#9744;").replace("[x]", "&#9745;")
+            append(f"  <li>{fast_inline_format(content)}</li>\n")
+            continue
+
+        numbered_match = _NUMBERED_RE.match(line)
+        if numbered_match:
+            if not in_list:
+                append("<ol>\n")
+                in_list = True
+            append(f"  <li>{fast_inline_format(line[numbered_match.end():])}</li>\n")
+            continue
+
+        if in_list and stripped:
+            tail = _tail(out, 200)
+            if tail.rstrip().endswith("</ol>") or "<ol>" in tail:
+                append("</ol>\n")
+            else:
+                append("</ul>\n")
+            in_list = False
+
+        if not stripped:
+            continue
+
+        append(f"<p>{fast_inline_format(line)}</p>\n")
+
+    if in_list:
+        append("</ul>\n")
+    if in_table:
+        append(fast_render_table(table_buffer))
+
+    return "".join(out)
+
+
+def fast_build_nav(files_content):
+    """Equivalente a line_build_nav acumulando en lista."""
+    out = ['<nav id="sidebar">\n<h2>Indice</h2>\n<ul>\n']
+    current_section = ""
+    for filepath, content in files_content:
+        section_key = filepath.split("/")[0]
+        section_name = NAV_SECTIONS.get(section_key, section_key)
+        if section_name != current_section:
+            if current_section:
+                out.append("</ul></li>\n")
+            current_section = section_name
+            out.append(f'<li class="nav-section"><strong>{section_name}</strong>\n<ul>\n')
+        h1_match = _H1_RE.search(content)
+        title = h1_match.group(1) if h1_match else Path(filepath).stem
+        file_id = filepath.replace("/", "-").replace(".md", "")
+        out.append(f'  <li><a class="doc-nav-link" data-lesson-path="{filepath}" href="#{file_id}">{title}</a></li>\n')
+    out.append("</ul></li>\n</ul>\n</nav>\n")
+    return "".join(out)
+
+
+# ============================================================
+# Backends de Markdown: md_to_html/build_nav delegan en el activo.
+# ============================================================
+class MarkdownBackend:
+    """Interfaz de un backend de render: Markdown de leccion -> HTML y nav."""
+
+    name = ""
+
+    def render(self, md_text, file_id):
+        raise NotImplementedError
+
+    def nav(self, files_content):
+        raise NotImplementedError
+
+
+class LineMarkdownBackend(MarkdownBackend):
+    """Conversor original linea a linea; es la referencia de conformidad."""
+
+    name = "line"
+
+    def render(self, md_text, file_id):
+        return line_md_to_html(md_text, file_id)
+
+    def nav(self, files_content):
+        return line_build_nav(files_content)
+
+
+class FastMarkdownBackend(MarkdownBackend):
+    """Mismo contrato de salida que "line", optimizado."""
+
+    name = "fast"
+
+    def render(self, md_text, file_id):
+        return fast_md_to_html(md_text, file_id)
+
+    def nav(self, files_content):
+        return fast_build_nav(files_content)
+
+
+MARKDOWN_BACKENDS = {backend.name: backend for backend in (LineMarkdownBackend(), FastMarkdownBackend())}
+ACTIVE_MD_BACKEND = os.environ.get("SMA_MD_BACKEND", "line")
+
+
+def get_markdown_backend(name=None):
+    """Devuelve el backend pedido (o el activo); falla con la lista disponible."""
+    key = name or ACTIVE_MD_BACKEND
+    if key not in MARKDOWN_BACKENDS:
+        raise SystemExit(f"Backend de Markdown desconocido: {key} (disponibles: {', '.join(MARKDOWN_BACKENDS)})")
+    return MARKDOWN_BACKENDS[key]
+
+
+def md_to_html(md_text, file_id):
+    """Convierte markdown a HTML con el backend activo."""
+    return get_markdown_backend().render(md_text, file_id)
+
+
 def build_nav(files_content):
-    """Construye la barra de navegacion con anchors."""
+    """Construye la barra de navegacion con el backend activo."""
+    return get_markdown_backend().nav(files_content)
+
+
+# Lenguajes que no necesitan modulo de highlight.js propio.
+PLAIN_CODE_LANGS = {"text", "plaintext", "txt"}
+
+
+def section_requirements(lesson_html):
+    """Detecta si una leccion tiene diagramas y que lenguajes de codigo usa."""
+    has_diagrams = '<pre class="mermaid"' in lesson_html
+    has_code = "<pre><code" in lesson_html
+    langs = []
+    for lang in re.findall(r'<code class="language-([^"]+)">', lesson_html):
+        lang = lang.lower()
+        if lang not in PLAIN_CODE_LANGS and lang not in langs:
+            langs.append(lang)
+    return has_diagrams, has_code, langs
+
+
+MERMAID_PRE_RE = re.compile(r'<pre class="mermaid">(.*?)</pre>', re.DOTALL)
+
+
+MERMAID_SCRIPT_CLOSE_RE = re.compile(r"</(script)", re.IGNORECASE)
+
+
+def tag_mermaid_diagrams(lesson_html):
+    """Anade data-diagram-hash (hash del fuente) a cada diagrama: clave de la cache de SVG por tema.
+
+    El fuente va en un <script type="text/plain"> dentro del <pre>: como HTML, los
+    <br/> de las etiquetas se convertirian en elementos y textContent los perderia.
+    """
+
+    def tag(match):
+        source = match.group(1)
+        digest = hashlib.sha1(source.encode("utf-8")).hexdigest()[:12]
+        escaped = MERMAID_SCRIPT_CLOSE_RE.sub(r"<\\/\1", source)
+        return f'<pre class="mermaid" data-diagram-hash="{digest}"><script type="text/plain">{escaped}</script></pre>'
+
+    return MERMAID_PRE_RE.sub(tag, lesson_html)
+
+
+# ============================================================
+# Glosario: enlaza la primera aparicion de cada termino por leccion
+# ============================================================
+GLOSSARY_FILE = "anexos/glosario.md"
+GLOSSARY_ROW_RE = re.compile(r"^\|\s*\*\*(.+?)\*\*\s*\|\s*(.+?)\s*\|\s*$", re.MULTILINE)
+GLOSSARY_SCAN_RE = re.compile(r"(<p>|<li>)(.*?)(</p>|</li>)")
+HTML_TAG_RE = re.compile(r"(<[^>]+>)")
+# Palabras completas o un simbolo suelto: los terminos solo casan en limites de palabra.
+GLOSSARY_TOKEN_RE = re.compile(r"[^\W_]+|\S")
+
+
+class AhoCorasick:
+    """Automata Aho-Corasick: encuentra todas las claves en una sola pasada por la secuencia.
+
+    Las claves son secuencias de simbolos hashables (caracteres o tokens).
+    """
+
+    def __init__(self, keys):
+        self.keys = list(keys)
+        self.goto = [{}]
+        self.fail = [0]
+        self.out = [[]]
+        for index, key in enumerate(self.keys):
+            node = 0
+            for ch in key:
+                child = self.goto[node].get(ch)
+                if child is None:
+                    child = len(self.goto)
+                    self.goto[node][ch] = child
+                    self.goto.append({})
+                    self.fail.append(0)
+                    self.out.append([])
+                node = child
+            self.out[node].append(index)
+
+        queue = deque(self.goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for ch, child in self.goto[node].items():
+                queue.append(child)
+                fallback = self.fail[node]
+                while fallback and ch not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                self.fail[child] = self.goto[fallback].get(ch, 0) if node else 0
+                self.out[child] = self.out[child] + self.out[self.fail[child]]
+
+    def iter_matches(self, sequence):
+        """Genera (inicio, fin, indice_de_clave) para cada aparicion en `sequence`."""
+        goto, fail, out, keys = self.goto, self.fail, self.out, self.keys
+        node = 0
+        for position, ch in enumerate(sequence):
+            while node and ch not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(ch, 0)
+            for index in out[node]:
+                yield position + 1 - len(keys[index]), position + 1, index
+
+
+def slugify(text):
+    return re.sub(r"[^a-z0-9]+", "-", text.lower()).strip("-")
+
+
+def load_glossary(md_text, file_id):
+    """Lee los terminos de la tabla del glosario: [(termino, alias, anchor, definicion)]."""
+    entries = []
+    for term, definition in GLOSSARY_ROW_RE.findall(md_text):
+        aliases = [term]
+        paren = re.match(r"^(.+?)\s*\((.+)\)$", term)
+        if paren:
+            aliases += [paren.group(1), paren.group(2)]
+        plain_definition = re.sub(r"[`*]", "", definition).replace('"', "&quot;").replace("<", "&lt;")
+        entries.append((term, aliases, f"{file_id}-term-{slugify(term)}", plain_definition))
+    return entries
+
+
+def add_glossary_anchors(glossary_html, entries):
+    """Anade un id a cada fila de termino de la tabla renderizada del glosario."""
+    anchors = {term: anchor for term, _, anchor, _ in entries}
+
+    def add_id(match):
+        anchor = anchors.get(match.group(1))
+        return f'<tr id="{anchor}">{match.group(0)[4:]}' if anchor else match.group(0)
+
+    return re.sub(r"<tr>\n  <td><strong>(.+?)</strong></td>", add_id, glossary_html)
+
+
+class GlossaryLinker:
+    """Enlaza terminos del glosario en parrafos y listas (nunca en codigo, enlaces ni titulos)."""
+
+    def __init__(self, entries):
+        self.entries = entries
+        keys, self.key_entry = [], []
+        for entry_index, (_, aliases, _, _) in enumerate(entries):
+            for alias in aliases:
+                keys.append(tuple(GLOSSARY_TOKEN_RE.findall(alias.lower())))
+                self.key_entry.append(entry_index)
+        self.automaton = AhoCorasick(keys)
+        self.links = 0
+        self.seconds = 0.0
+
+    def link_lesson(self, lesson_html):
+        started = time.perf_counter()
+        linked = set()
+
+        def link_block(match):
+            return match.group(1) + self._link_fragment(match.group(2), linked) + match.group(3)
+
+        linked_html = GLOSSARY_SCAN_RE.sub(link_block, lesson_html)
+        self.seconds += time.perf_counter() - started
+        return linked_html
+
+    def _link_fragment(self, fragment, linked):
+        parts = HTML_TAG_RE.split(fragment)
+        skip_depth = 0
+        for i, part in enumerate(parts):
+            if i % 2:
+                tag = part.lower()
+                if tag.startswith(("<code", "<a ", "<a>")):
+                    skip_depth += 1
+                elif tag in ("</code>", "</a>"):
+                    skip_depth = max(0, skip_depth - 1)
+                continue
+            if part and not skip_depth:
+                parts[i] = self._link_text(part, linked)
+        return "".join(parts)
+
+    def _link_text(self, text, linked):
+        tokens = list(GLOSSARY_TOKEN_RE.finditer(text))
+        candidates = []
+        for first, last, key_index in self.automaton.iter_matches([token.group().lower() for token in tokens]):
+            start, end = tokens[first].start(), tokens[last - 1].end()
+            candidates.append((start, -(end - start), end, self.key_entry[key_index]))
+        if not candidates:
+            return text
+
+        out, cursor = [], 0
+        for start, _, end, entry_index in sorted(candidates):
+            if start < cursor or entry_index in linked:
+                continue
+            _, _, anchor, definition = self.entries[entry_index]
+            out.append(text[cursor:start])
+            out.append(f'<a class="glossary-link" href="#{anchor}" title="{definition}">{text[start:end]}</a>')
+            cursor = end
+            linked.add(entry_index)
+            self.links += 1
+        out.append(text[cursor:])
+        return "".join(out)
+
+
+# ============================================================
+# Enlaces entre lecciones (.md -> #anchor del documento)
+# ============================================================
+LESSON_LINK_RE = re.compile(r'<a href="([^"#:?]+\.md)(#[^"]*)?">')
+HEADING_ID_RE = re.compile(r'<h[1-6] id="([^"]+)">(.*?)</h[1-6]>')
+
+
+def anchor_key(text):
+    """Clave comparable entre el slug de GitHub de un titulo (#introduccion, #1-domain)
+    y el id que genera md_to_html (introducci-n): sin tildes ni puntuacion."""
+    text = unicodedata.normalize("NFKD", urllib.parse.unquote(text)).encode("ascii", "ignore").decode("ascii")
+    return _ANCHOR_RE.sub("-", text.lower()).strip("-")
+
+
+class LessonLinkIndex:
+    """Ruta de leccion -> file_id, y por leccion clave de titulo -> id del titulo."""
+
+    def __init__(self, sections, course_root=None):
+        self.course_root = course_root
+        self.lessons = {}
+        for filepath, lesson_html in sections:
+            headings = {}
+            for heading_id, heading_html in HEADING_ID_RE.findall(lesson_html or ""):
+                headings.setdefault(anchor_key(HTML_TAG_RE.sub("", heading_html)), heading_id)
+            self.lessons[filepath] = (file_id_for(filepath), headings)
+        self.unresolved = []
+        self.rewritten = 0
+
+    def rewrite(self, filepath, lesson_html):
+        """Cambia los href relativos a .md por el hash de la leccion (o del titulo)."""
+
+        def replace(match):
+            href, fragment = match.group(1), (match.group(2) or "")[1:]
+            target = posixpath.normpath(posixpath.join(posixpath.dirname(filepath), urllib.parse.unquote(href)))
+            lesson = self.lessons.get(target)
+            if lesson is None:
+                exists = self.course_root is not None and (self.course_root / target).exists()
+                self.unresolved.append({
+                    "file": filepath,
+                    "href": match.group(1) + (match.group(2) or ""),
+                    "reason": "leccion fuera del build" if exists else "fichero inexistente",
+                })
+                return match.group(0)
+            file_id, headings = lesson
+            anchor = file_id
+            if fragment:
+                anchor = headings.get(anchor_key(fragment))
+                if anchor is None:
+                    self.unresolved.append({
+                        "file": filepath,
+                        "href": match.group(1) + "#" + fragment,
+                        "reason": "titulo no encontrado",
+                    })
+                    anchor = file_id
+            self.rewritten += 1
+            return f'<a href="#{anchor}">'
+
+        return LESSON_LINK_RE.sub(replace, lesson_html)
+
+
+# ============================================================
+# Panel de rendimiento: benchmarks de ArchitectureKit
+# ============================================================
+PERF_BASELINE_NAME = "performance-baseline.json"
+PERF_LAST_RUN_NAME = "performance-last-run.json"
+# Una ejecucion JSON por linea, solo se anade al final (check-performance-baseline.sh).
+PERF_HISTORY_NAME = "performance-history.jsonl"
+PERF_DASHBOARD_PATH = "anexos/panel-rendimiento.md"
+PERF_DASHBOARD_TITLE = "Panel de rendimiento de ArchitectureKit"
+PERF_METRICS = [
+    # (clave en la ejecucion, clave del limite, etiqueta, unidad, decimales)
+    ("cold_ms", "cold_ms_max", "Carga en frio", "ms", 2),
+    ("warm_ms", "warm_ms_max", "Carga en caliente", "ms", 2),
+    ("warm_to_cold_ratio", "warm_to_cold_ratio_max", "Ratio caliente/frio", "", 4),
+]
+PERF_CHART_WIDTH = 640
+PERF_CHART_HEIGHT = 220
+PERF_CHART_PAD = 44
+
+
+def load_performance_runs(config):
+    """Lee baseline e historico de benchmarks. Devuelve (baseline, runs) o (None, [])."""
+    baseline_file = config.benchmarks_dir / PERF_BASELINE_NAME
+    history_file = config.benchmarks_dir / PERF_HISTORY_NAME
+    last_run_file = config.benchmarks_dir / PERF_LAST_RUN_NAME
+    if not baseline_file.exists():
+        return None, []
+    baseline = json.loads(baseline_file.read_text(encoding="utf-8"))
+
+    runs = []
+    if history_file.exists():
+        for line_no, line in enumerate(history_file.read_text(encoding="utf-8").splitlines(), 1):
+            if not line.strip():
+                continue
+            try:
+                runs.append(json.loads(line))
+            except ValueError:
+                print(f"  [WARN] {history_file.name}:{line_no} no es JSON valido, se ignora")
+
+    # La ultima ejecucion puede no estar aun en el historico (p. ej. ejecuciones antiguas).
+    if last_run_file.exists():
+        last_run = json.loads(last_run_file.read_text(encoding="utf-8"))
+        metric_keys = [key for key, _, _, _, _ in PERF_METRICS]
+        if not runs or [runs[-1].get(k) for k in metric_keys] != [last_run.get(k) for k in metric_keys]:
+            runs.append(last_run)
+    return baseline, runs
+
+
+def _svg_text(value):
+    return str(value).replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;").replace('"', "&quot;")
+
+
+def render_trend_svg(label, values, limit, unit, decimals, run_labels):
+    """Grafico SVG de tendencia (sin JS) con la linea del limite."""
+    width, height, pad = PERF_CHART_WIDTH, PERF_CHART_HEIGHT, PERF_CHART_PAD
+    top = max(values + [limit]) * 1.15 or 1.0
+    plot_w = width - 2 * pad
+    plot_h = height - 2 * pad
+
+    def x_at(index):
+        if len(values) == 1:
+            return pad + plot_w / 2
+        return pad + plot_w * index / (len(values) - 1)
+
+    def y_at(value):
+        return pad + plot_h * (1 - value / top)
+
+    def fmt(value):
+        return f"{value:.{decimals}f}{(' ' + unit) if unit else ''}"
+
+    out = [
+        f'<svg class="perf-chart" viewBox="0 0 {width} {height}" role="img" '
+        f'aria-label="{_svg_text(label)}: {len(values)} ejecuciones, limite {fmt(limit)}">',
+        f'<line class="perf-axis" x1="{pad}" y1="{height - pad}" x2="{width - pad}" y2="{height - pad}"/>',
+        f'<line class="perf-axis" x1="{pad}" y1="{pad}" x2="{pad}" y2="{height - pad}"/>',
+        f'<text class="perf-tick" x="{pad - 6}" y="{height - pad}" text-anchor="end">0</text>',
+        f'<text class="perf-tick" x="{pad - 6}" y="{pad + 4}" text-anchor="end">{top:.{decimals if top < 10 else 0}f}</text>',
+        f'<line class="perf-limit" x1="{pad}" y1="{y_at(limit):.1f}" x2="{width - pad}" y2="{y_at(limit):.1f}"/>',
+        f'<text class="perf-limit-label" x="{width - pad}" y="{y_at(limit) - 6:.1f}" text-anchor="end">max {fmt(limit)}</text>',
+    ]
+    points = " ".join(f"{x_at(i):.1f},{y_at(v):.1f}" for i, v in enumerate(values))
+    if len(values) > 1:
+        out.append(f'<polyline class="perf-line" points="{points}"/>')
+    for i, value in enumerate(values):
+        state = "over" if value > limit else "ok"
+        out.append(
+            f'<circle class="perf-point perf-point-{state}" cx="{x_at(i):.1f}" cy="{y_at(value):.1f}" r="4">'
+            f"<title>{_svg_text(run_labels[i])}: {fmt(value)}</title></circle>"
+        )
+    out.append(f'<text class="perf-tick" x="{pad}" y="{height - pad + 18}">{_svg_text(run_labels[0])}</text>')
+    if len(values) > 1:
+        out.append(
+            f'<text class="perf-tick" x="{width - pad}" y="{height - pad + 18}" text-anchor="end">'
+            f"{_svg_text(run_labels[-1])}</text>"
+        )
+    out.append("</svg>")
+    return "".join(out)
+
+
+def build_performance_dashboard(file_id, baseline, runs):
+    """HTML de la leccion generada con el estado y la tendencia de los benchmarks."""
+    out = [f'<h1 id="{file_id}-panel">{PERF_DASHBOARD_TITLE}</h1>\n']
+    out.append(
+        "<p>Seccion generada en el build a partir de <code>apps/ios/ArchitectureKit/benchmarks/</code>. "
+        "Compara cada ejecucion de <code>ArchitectureBenchmarks</code> con los limites de "
+        "<code>performance-baseline.json</code>.</p>\n"
+    )
+    if not runs:
+        out.append("<p>Todavia no hay ejecuciones registradas.</p>\n")
+        return "".join(out)
+
+    last = runs[-1]
+    run_labels = [run.get("recorded_at") or f"#{i + 1}" for i, run in enumerate(runs)]
+    out.append(
+        f"<p>Ejecuciones registradas: <strong>{len(runs)}</strong>. "
+        f"Ultima: <strong>{_svg_text(run_labels[-1])}</strong>.</p>\n"
+    )
+    out.append("<table>\n<thead><tr><th>Metrica</th><th>Ultima</th><th>Limite</th><th>Estado</th></tr></thead>\n<tbody>\n")
+    charts = []
+    for key, limit_key, label, unit, decimals in PERF_METRICS:
+        if limit_key not in baseline:
+            continue
+        limit = float(baseline[limit_key])
+        values = [float(run.get(key, 0)) for run in runs]
+        suffix = f" {unit}" if unit else ""
+        status = "❌ Por encima" if values[-1] > limit else "✅ Dentro"
+        out.append(
+            f"<tr><td>{label}</td><td>{values[-1]:.{decimals}f}{suffix}</td>"
+            f"<td>{limit:.{decimals}f}{suffix}</td><td>{status}</td></tr>\n"
+        )
+        charts.append(
+            f'<h2 id="{file_id}-{slugify(label)}">{label}</h2>\n'
+            f'<figure class="perf-figure">{render_trend_svg(label, values, limit, unit, decimals, run_labels)}</figure>\n'
+        )
+    out.append("</tbody>\n</table>\n")
+    if float(last.get("warm_ms", 0)) >= float(last.get("cold_ms", 0)):
+        out.append("<p>⚠️ La ultima carga en caliente no es mas rapida que la carga en frio.</p>\n")
+    out.extend(charts)
+    return "".join(out)
+
+
+# Bloques repetidos por debajo de este tamano no compensan la referencia.
+DEDUPE_MIN_BYTES = 160
+DEDUPE_BLOCK_RE = re.compile(
+    r'<pre><code(?: class="language-[^"]*")?>.*?</code></pre>\n|<table>\n.*?</table>\n',
+    re.DOTALL,
+)
+# Con --dedupe-paragraphs tambien los parrafos identicos (ver `near-duplicates`).
+DEDUPE_BLOCK_PARAGRAPH_RE = re.compile(DEDUPE_BLOCK_RE.pattern + r"|<p>[^\n]*</p>\n", re.DOTALL)
+
+
+def dedupe_blocks(body_html, paragraphs=False):
+    """Sustituye bloques de codigo y tablas repetidos por referencias a un almacen compartido.
+
+    Cada bloque distinto se emite una sola vez como <template> y el cliente lo
+    materializa al acercarse al viewport. Devuelve (html, almacen, estadisticas).
+    """
+    block_re = DEDUPE_BLOCK_PARAGRAPH_RE if paragraphs else DEDUPE_BLOCK_RE
+    counts = {}
+    for match in block_re.finditer(body_html):
+        block = match.group(0)
+        if len(block.encode("utf-8")) >= DEDUPE_MIN_BYTES:
+            counts[block] = counts.get(block, 0) + 1
+
+    repeated = {
+        block: hashlib.sha1(block.encode("utf-8")).hexdigest()[:12]
+        for block, count in counts.items()
+        if count > 1
+    }
+    stats = {"distinct_blocks": len(repeated), "references": 0, "blocks_saved": 0, "bytes_saved": 0}
+    if not repeated:
+        return body_html, "", stats
+
+    def replace(match):
+        block_id = repeated.get(match.group(0))
+        if not block_id:
+            return match.group(0)
+        stats["references"] += 1
+        return f'<div class="sma-block-ref" data-block-ref="{block_id}"></div>\n'
+
+    deduped = block_re.sub(replace, body_html)
+
+    store = '<div id="sma-block-store" hidden>\n'
+    for block, block_id in repeated.items():
+        store += f'<template data-block-id="{block_id}">{block}</template>\n'
+    store += "</div>\n"
+
+    stats["blocks_saved"] = stats["references"] - stats["distinct_blocks"]
+    stats["bytes_saved"] = len(body_html.encode("utf-8")) - len(deduped.encode("utf-8")) - len(store.encode("utf-8"))
+    return deduped, store, stats
+
+
+# ============================================================
+# Almacen de contexto del asistente (bloque -> texto)
+# ============================================================
+# Cada parrafo, item de lista, bloque de codigo y fila de tabla lleva
+# data-ctx="<hash del texto>". El panel del asistente envia solo esos ids y
+# offsets de caracteres; el bridge resuelve el texto con context-store.json.
+CONTEXT_STORE_NAME = "context-store.json"
+CONTEXT_STORE_VERSION = 1
+CONTEXT_BLOCK_RE = re.compile(r"<(p|li|tr)>(.*?)</\1>|<pre>(<code(?: class=\"language-[^\"]*\")?>.*?</code>)</pre>", re.DOTALL)
+CONTEXT_TAG_RE = re.compile(r"<[^>]+>")
+
+
+def context_block_text(inner_html):
+    """Texto del bloque tal como lo devuelve textContent en el navegador."""
+    return html_lib.unescape(CONTEXT_TAG_RE.sub("", inner_html))
+
+
+def tag_context_blocks(fragment, store):
+    """Anade data-ctx a los bloques de `fragment` y guarda su texto en `store`.
+
+    El id depende solo del texto: es estable entre builds y los bloques
+    identicos comparten entrada.
+    """
+
+    def tag(match):
+        tag_name = match.group(1) or "pre"
+        inner = match.group(2) if match.group(1) else match.group(3)
+        text = context_block_text(inner)
+        if not text.strip():
+            return match.group(0)
+        block_id = hashlib.sha1(text.encode("utf-8")).hexdigest()[:12]
+        store[block_id] = text
+        return f'<{tag_name} data-ctx="{block_id}">{inner}</{tag_name}>'
+
+    return CONTEXT_BLOCK_RE.sub(tag, fragment)
+
+
+def build_context_store(blocks):
+    """JSON del almacen y su version (hash del contenido) para la meta sma-context-store."""
+    ordered = dict(sorted(blocks.items()))
+    version = content_hash(json.dumps(ordered, ensure_ascii=False, sort_keys=True))[:16]
+    payload = {"version": CONTEXT_STORE_VERSION, "store": version, "blocks": ordered}
+    return json.dumps(payload, ensure_ascii=False, separators=(",", ":")) + "\n", version
+
+
+# ============================================================
+# Purga de CSS no usado
+# ============================================================
+# Clases/ids que aparecen en tiempo de ejecucion sin estar literalmente en el
+# HTML ni en los assets (highlight.js, Mermaid, ids generados por contador).
+PURGE_ALLOWLIST_PREFIXES = ("hljs", "language-", "mermaid", "sma-mermaid-", "topic-")
+PURGE_ALWAYS_KEEP = {"html", "body", "svg"}
+# Clases que los generadores del builder solo emiten con ciertos datos: la linea
+# de tendencia del panel de rendimiento necesita 2+ ejecuciones y el estado de
+# cada punto depende de si supera el limite. Un build sin esos datos no debe
+# purgar sus reglas. Anade aqui cualquier clase nueva que dependa de los datos.
+PURGE_DYNAMIC_CLASSES = {"perf-line", "perf-point-ok", "perf-point-over"}
+PURGE_HTML_TAG_RE = re.compile(r"<([a-zA-Z][a-zA-Z0-9-]*)")
+PURGE_HTML_ATTR_RE = re.compile(r'\s(class|id)="([^"]*)"')
+PURGE_JS_STRING_RE = re.compile(r"""'(?:[^'\\\n]|\\.)*'|"(?:[^"\\\n]|\\.)*"|`(?:[^`\\]|\\.)*`""", re.DOTALL)
+PURGE_JS_WORD_RE = re.compile(r"[A-Za-z_][\w-]*")
+PURGE_SELECTOR_STRIP_RE = re.compile(r"\[[^\]]*\]|::?[\w-]+(?:\((?:[^()]|\([^()]*\))*\))?")
+PURGE_SELECTOR_TOKEN_RE = re.compile(r"([.#]?)(-?[A-Za-z_][\w-]*|\*)")
+# Cadenas y comentarios CSS primero: una llave o un /* dentro de content: "..."
+# no abre bloque ni comentario.
+CSS_SCAN_RE = re.compile(r""""(?:[^"\\\n]|\\.)*"|'(?:[^'\\\n]|\\.)*'|/\*.*?\*/|[{}]""", re.DOTALL)
+STYLE_TAG_RE = re.compile(r"(<style>)(.*?)(</style>)", re.DOTALL)
+SCRIPT_TAG_RE = re.compile(r"<script>(.*?)</script>", re.DOTALL)
+
+
+def collect_used_selectors(html, scripts):
+    """Elementos, clases e ids presentes en el HTML generado o creados por el JS.
+
+    Del JS se toma cualquier palabra de sus literales de cadena (classList.add('x'),
+    className, innerHTML con class="...", createElement('button')): es conservador,
+    pero nunca borra una clase que el cliente crea. Comentarios e identificadores
+    no cuentan.
+    """
+    used = {
+        "tags": set(PURGE_ALWAYS_KEEP),
+        "names": set(PURGE_DYNAMIC_CLASSES),
+        "prefixes": PURGE_ALLOWLIST_PREFIXES,
+    }
+    for tag in PURGE_HTML_TAG_RE.findall(html):
+        used["tags"].add(tag.lower())
+    for _, value in PURGE_HTML_ATTR_RE.findall(html):
+        used["names"].update(value.split())
+    for source in scripts:
+        for literal in PURGE_JS_STRING_RE.findall(source):
+            words = PURGE_JS_WORD_RE.findall(literal)
+            used["names"].update(words)
+            used["tags"].update(word.lower() for word in words)
+    return used
+
+
+def selector_is_used(selector, used):
+    """Un selector se conserva si todos sus elementos, clases e ids pueden existir."""
+    for prefix, name in PURGE_SELECTOR_TOKEN_RE.findall(PURGE_SELECTOR_STRIP_RE.sub(" ", selector)):
+        if name == "*":
+            continue
+        if prefix:
+            if name not in used["names"] and not name.startswith(used["prefixes"]):
+                return False
+        elif name.lower() not in used["tags"]:
+            return False
+    return True
+
+
+def strip_css_comments(css):
+    return CSS_SCAN_RE.sub(lambda m: "" if m.group().startswith("/*") else m.group(), css)
+
+
+def _css_blocks(css):
+    """Divide CSS en (prelude, cuerpo) de primer nivel respetando llaves anidadas.
+
+    Las llaves dentro de cadenas o comentarios no cuentan.
+    """
+    blocks = []
+    depth, start, brace = 0, 0, None
+    for match in CSS_SCAN_RE.finditer(css):
+        char = match.group()
+        if char == "{":
+            if depth == 0:
+                brace = match.start()
+            depth += 1
+        elif char == "}":
+            depth -= 1
+            if depth == 0:
+                blocks.append((css[start:brace].strip(), css[brace + 1:match.start()]))
+                start = match.end()
+    return blocks
+
+
+def purge_css(css, used, removed=None):
+    """Devuelve el CSS sin las reglas cuyos selectores no casan con nada usado.
+
+    Los selectores descartados se anaden a `removed` si se pasa una lista.
+    """
+    css = strip_css_comments(css)
+    removed = removed if removed is not None else []
+    out = []
+    for prelude, body in _css_blocks(css):
+        if prelude.startswith("@media") or prelude.startswith("@supports"):
+            inner = purge_css(body, used, removed)
+            if inner.strip():
+                out.append(f"{prelude} {{\n{inner}}}\n")
+        elif prelude.startswith("@"):
+            out.append(f"{prelude} {{{body}}}\n")
+        else:
+            selectors = [sel.strip() for sel in prelude.split(",") if sel.strip()]
+            kept = [sel for sel in selectors if selector_is_used(sel, used)]
+            removed.extend(sel for sel in selectors if sel not in kept)
+            if kept:
+                out.append(f"{', '.join(kept)} {{{body}}}\n")
+    return "".join(out)
+
+
+def purge_unused_css(html, assets):
+    """Purga el <style> del HTML y las hojas de `assets` ({nombre: texto}) en su sitio.
+
+    Devuelve (html, informe) con {hoja: {"before", "comments", "after", "removed": [selectores]}};
+    los bytes eliminados incluyen los comentarios, que se descartan al reescribir las reglas.
+    """
+    scripts = SCRIPT_TAG_RE.findall(html)
+    scripts += [text for name, text in sorted(assets.items()) if name.endswith(".js")]
+    used = collect_used_selectors(html, scripts)
+    report = {}
+
+    def purge_sheet(name, before):
+        removed = []
+        after = purge_css(before, used, removed)
+        report[name] = {
+            "before": len(before.encode("utf-8")),
+            "comments": len(before.encode("utf-8")) - len(strip_css_comments(before).encode("utf-8")),
+            "after": len(after.encode("utf-8")),
+            "removed": removed,
+        }
+        return after
+
+    html = STYLE_TAG_RE.sub(lambda m: m.group(1) + "\n" + purge_sheet("<style>", m.group(2)) + m.group(3), html, count=1)
+    for name in sorted(assets):
+        if name.endswith(".css"):
+            assets[name] = purge_sheet(name, assets[name])
+    return html, report
+
+
+# ============================================================
+# Manifiesto de dist/ (despliegues incrementales)
+# ============================================================
+# dist/manifest.json guarda hash y tamano de cada fichero generado y el hash de
+# cada leccion renderizada. Comparando dos manifiestos se sabe exactamente que
+# subir o invalidar en el host del curso.
+MANIFEST_NAME = "manifest.json"
+MANIFEST_VERSION = 1
+
+
+def content_hash(data):
+    if isinstance(data, str):
+        data = data.encode("utf-8")
+    return hashlib.sha256(data).hexdigest()
+
+
+class DistWriter:
+    """Escribe en dist/ solo los ficheros cuyos bytes cambian y anota su hash.
+
+    Un fichero identico no se toca (conserva su mtime), asi que rsync y las
+    sincronizaciones por fecha tampoco lo vuelven a subir.
+    """
+
+    def __init__(self, output_dir):
+        self.output_dir = Path(output_dir)
+        self.files = {}
+        self.written = []
+        self.unchanged = []
+
+    def write(self, path, data):
+        if isinstance(data, str):
+            data = data.encode("utf-8")
+        path = Path(path)
+        rel_path = path.relative_to(self.output_dir).as_posix()
+        self.files[rel_path] = {"sha256": content_hash(data), "size": len(data)}
+        try:
+            same = path.stat().st_size == len(data) and path.read_bytes() == data
+        except FileNotFoundError:
+            same = False
+        if same:
+            self.unchanged.append(rel_path)
+            return False
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(path.name + ".tmp")
+        tmp_path.write_bytes(data)
+        os.replace(tmp_path, path)
+        self.written.append(rel_path)
+        return True
+
+
+def build_manifest(files, sections):
+    """Manifiesto {"files": {ruta: {sha256, size}}, "sections": {leccion: {id, sha256}}}."""
+    return {
+        "version": MANIFEST_VERSION,
+        "files": dict(sorted(files.items())),
+        "sections": {
+            filepath: {"id": file_id_for(filepath), "sha256": content_hash(section_html)}
+            for filepath, section_html in sections
+        },
+    }
+
+
+def load_manifest(path):
+    path = Path(path)
+    if not path.exists():
+        return None
+    manifest = json.loads(path.read_text(encoding="utf-8"))
+    if manifest.get("version") != MANIFEST_VERSION:
+        raise ValueError(f"{path}: version de manifiesto no soportada ({manifest.get('version')})")
+    return manifest
+
+
+def manifest_diff(old, new):
+    """Ficheros y lecciones anadidos, eliminados o modificados entre dos manifiestos."""
+    diff = {}
+    for kind in ("files", "sections"):
+        before, after = (old or {}).get(kind, {}), new.get(kind, {})
+        diff[kind] = {
+            "added": sorted(set(after) - set(before)),
+            "removed": sorted(set(before) - set(after)),
+            "changed": sorted(key for key in set(before) & set(after) if before[key]["sha256"] != after[key]["sha256"]),
+        }
+    return diff
+
+
+def diff_is_empty(diff):
+    return not any(paths for kind in diff.values() for paths in kind.values())
+
+
+def run_manifest_diff(config, old_path, new_path=None, as_json=False):
+    """Imprime el delta entre dos manifiestos. Codigo de salida como diff(1): 0 igual, 1 distinto."""
+    new_path = Path(new_path) if new_path else config.output_dir / MANIFEST_NAME
+    try:
+        old, new = load_manifest(old_path), load_manifest(new_path)
+    except ValueError as exc:
+        print(f"  Error: {exc}", file=sys.stderr)
+        return 2
+    for path, manifest in ((old_path, old), (new_path, new)):
+        if manifest is None:
+            print(f"  Error: no existe {path}", file=sys.stderr)
+            return 2
+
+    diff = manifest_diff(old, new)
+    if as_json:
+        print(json.dumps(diff, ensure_ascii=False, indent=2))
+    else:
+        labels = (("files", "Ficheros"), ("sections", "Lecciones"))
+        marks = (("added", "+", "nuevos"), ("removed", "-", "eliminados"), ("changed", "~", "modificados"))
+        for kind, label in labels:
+            counts = ", ".join(f"{len(diff[kind][change])} {name}" for change, _, name in marks)
+            print(f"  {label}: {counts}")
+            for change, mark, _ in marks:
+                for key in diff[kind][change]:
+                    suffix = f" (#{new['sections'].get(key, old['sections'].get(key))['id']})" if kind == "sections" else ""
+                    print(f"    {mark} {key}{suffix}")
+    return 0 if diff_is_empty(diff) else 1
+
+
+# ============================================================
+# Complejidad de diagramas Mermaid
+# ============================================================
+# El layout de flowchart, class y state lo hace dagre: crece algo mas que lineal
+# con nodos + aristas y cada subgraph anade nodos frontera. Cada etiqueta es
+# ademas una medida de texto en el DOM. Se estima el coste desde el fuente para
+# avisar al autor antes de que el diagrama pese en la carga de la leccion.
+MERMAID_REPORT_NAME = "mermaid-complexity.json"
+MERMAID_THRESHOLDS = {"nodes": 30, "edges": 40, "subgraphs": 6, "label_chars": 80, "layout_cost": 400}
+MERMAID_KINDS = {
+    "graph": "flowchart",
+    "flowchart": "flowchart",
+    "sequenceDiagram": "sequence",
+    "classDiagram": "class",
+    "classDiagram-v2": "class",
+    "stateDiagram": "state",
+    "stateDiagram-v2": "state",
+}
+MERMAID_LABEL_COST = 2
+MERMAID_SUBGRAPH_BORDER_NODES = 2
+MERMAID_QUOTED_RE = re.compile(r'"[^"]*"')
+MERMAID_MASK_RE = re.compile(r"\x00(\d+)\x00")
+MERMAID_TAG_RE = re.compile(r"<[^>]+>")
+MERMAID_BREAK_RE = re.compile(r"<br\s*/?>|\\n", re.IGNORECASE)
+FLOW_SKIP_PREFIXES = ("style ", "classDef ", "class ", "linkStyle ", "click ", "direction ")
+FLOW_SHAPE_RE = re.compile(
+    r"(?P<id>\w+)\s*(?:\(\(\(|\(\(|\(\[|\[\[|\[\(|\[/|\[\\|\{\{|[\[({]|>(?=[^\]]*\]))"
+    r"(?P<label>[^\[\](){}]*?)(?:\)\)\)|\)\)|\]\)|\]\]|\)\]|/\]|\\\]|\}\}|[\])}])"
+)
+FLOW_TEXT_LINK_RE = re.compile(r"(?<![-=.])(?:--|==|-\.)\s+(?P<text>[^\s>|-][^>|]*?)\s+(?:-{2,}|={2,}|\.-)[>xo]?")
+FLOW_LINK_RE = re.compile(r"\s*(?:<?(?:-{2,}|={2,}|-\.+-)(?:>|[xo](?=[\s|]|$))?|~~~)\s*(?:\|(?P<label>[^|]*)\|)?\s*")
+FLOW_SUBGRAPH_RE = re.compile(r"^subgraph\s+(?P<id>\w+)?\s*(?:\[(?P<title>[^\]]*)\])?(?P<rest>.*)$")
+SEQ_PARTICIPANT_RE = re.compile(r"^(?:participant|actor)\s+(?P<id>\S+)(?:\s+as\s+(?P<label>.+))?$")
+SEQ_MESSAGE_RE = re.compile(r"^(?P<a>[^\s:<>-]+)\s*(?:<<)?-{1,2}(?:>>|>|x|\))\s*[+-]?\s*(?P<b>[^\s:]+)\s*:\s*(?P<text>.*)$")
+SEQ_NOTE_RE = re.compile(r"^note\s+(?:left of|right of|over)\s+[^:]+:\s*(?P<text>.*)$", re.IGNORECASE)
+SEQ_GROUP_PREFIXES = ("loop", "alt", "opt", "par", "critical", "break", "rect", "box")
+CLASS_DECL_RE = re.compile(r"^class\s+(?P<id>\w+)(?:~[^~]*~)?(?:\[(?P<label>[^\]]*)\])?\s*(?P<open>\{)?\s*$")
+CLASS_RELATION_RE = re.compile(
+    r"^(?P<a>\w+)(?:\s*\x00\d+\x00)?\s*(?:<\||\*|o|<)?(?:--|\.\.)(?:\|>|\*|o|>)?\s*(?:\x00\d+\x00\s*)?(?P<b>\w+)"
+    r"\s*(?::\s*(?P<text>.*))?$"
+)
+CLASS_MEMBER_RE = re.compile(r"^(?P<id>\w+)\s*:\s*(?P<text>.+)$")
+STATE_TRANSITION_RE = re.compile(r"^(?P<a>\[\*\]|[\w.]+)\s*-->\s*(?P<b>\[\*\]|[\w.]+)\s*(?::\s*(?P<text>.*))?$")
+STATE_DECL_RE = re.compile(r"^state\s+(?:(?P<label>\x00\d+\x00)\s+as\s+)?(?P<id>[\w.]+)\s*(?:<<\w+>>)?\s*(?P<open>\{)?\s*$")
+STATE_DESC_RE = re.compile(r"^(?P<id>[\w.]+)\s*:\s*(?P<text>.+)$")
+
+
+def mermaid_blocks(md_text):
+    """(linea, fuente) de cada bloque ```mermaid, con el mismo criterio de fences que el builder."""
+    blocks = []
+    lang = None
+    start = 0
+    buffer = []
+    for line_no, line in enumerate(md_text.split("\n"), 1):
+        if not line.strip().startswith("```"):
+            if lang is not None:
+                buffer.append(line)
+            continue
+        if lang is None:
+            lang, start, buffer = line.strip()[3:].strip().lower(), line_no, []
+            continue
+        if lang == "mermaid":
+            blocks.append((start, "\n".join(buffer)))
+        lang = None
+    return blocks
+
+
+class MermaidStats:
+    """Nodos, aristas, grupos (subgraph/namespace/estado compuesto/bloque) y etiquetas de un diagrama."""
+
+    def __init__(self, kind):
+        self.kind = kind
+        self.nodes = {}
+        self.edges = 0
+        self.groups = []
+        self.stack = []
+        self.max_depth = 0
+        self.labels = []
+        self.statements = 0
+
+    def node(self, node_id, label=None):
+        if node_id not in self.nodes:
+            self.nodes[node_id] = self.stack[-1] if self.stack else None
+        if label:
+            self.label(node_id, label)
+
+    def label(self, owner, text):
+        # El ancho de la caja lo marca la linea mas larga de la etiqueta.
+        lines = [
+            " ".join(MERMAID_TAG_RE.sub(" ", html_lib.unescape(line)).split())
+            for line in MERMAID_BREAK_RE.split(text.strip().strip('"'))
+        ]
+        lines = [line for line in lines if line]
+        if lines:
+            self.labels.append((owner, sum(map(len, lines)), max(map(len, lines))))
+
+    def open_group(self, group_id, title=None):
+        self.groups.append(group_id)
+        self.stack.append(group_id)
+        self.max_depth = max(self.max_depth, len(self.stack))
+        if title:
+            self.label(group_id, title)
+
+    def close_group(self):
+        if self.stack:
+            self.stack.pop()
+
+
+def mermaid_statements(source):
+    """Sentencias del diagrama sin comentarios, con las cadenas entre comillas enmascaradas."""
+    quoted = []
+
+    def mask(match):
+        quoted.append(match.group(0))
+        return f"\x00{len(quoted) - 1}\x00"
+
+    statements = []
+    for line in source.split("\n"):
+        line = line.strip()
+        if not line or line.startswith("%%"):
+            continue
+        for part in MERMAID_QUOTED_RE.sub(mask, line).split(";"):
+            if part.strip():
+                statements.append(part.strip())
+    return statements, lambda text: MERMAID_MASK_RE.sub(lambda m: quoted[int(m.group(1))], text or "")
+
+
+def parse_flowchart(stats, statements, unmask):
+    for stmt in statements:
+        if stmt == "end":
+            stats.close_group()
+            continue
+        if stmt.startswith(FLOW_SKIP_PREFIXES):
+            continue
+        sub = FLOW_SUBGRAPH_RE.match(stmt)
+        if sub:
+            group_id = sub.group("id") or unmask(sub.group("rest")).strip().strip('"') or f"subgraph-{len(stats.groups) + 1}"
+            title = sub.group("title") or (sub.group("rest") if sub.group("id") is None else "")
+            stats.open_group(group_id, unmask(title))
+            continue
+        stats.statements += 1
+        shapes = {}
+
+        def shape(match):
+            shapes.setdefault(match.group("id"), unmask(match.group("label")))
+            return match.group("id")
+
+        stmt = FLOW_SHAPE_RE.sub(shape, stmt)
+        stmt = re.sub(r":::\w+", "", stmt)
+        stmt = FLOW_TEXT_LINK_RE.sub(lambda m: f" --> |{m.group('text')}| ", stmt)
+        segments, edge_labels, pos = [], [], 0
+        for link in FLOW_LINK_RE.finditer(stmt):
+            segments.append(stmt[pos:link.start()])
+            if link.group("label"):
+                edge_labels.append(unmask(link.group("label")))
+            pos = link.end()
+        segments.append(stmt[pos:])
+        groups = [[m.group(0) for m in (re.match(r"\w+", part.strip()) for part in seg.split("&")) if m] for seg in segments]
+        groups = [group for group in groups if group]
+        for group in groups:
+            for node_id in group:
+                stats.node(node_id, shapes.get(node_id))
+        stats.edges += sum(len(a) * len(b) for a, b in zip(groups, groups[1:]))
+        for text in edge_labels:
+            stats.label("arista", text)
+    for group_id in stats.groups:
+        stats.nodes.pop(group_id, None)
+
+
+def parse_sequence(stats, statements, unmask):
+    for stmt in statements:
+        lowered = stmt.lower()
+        if lowered == "end":
+            stats.close_group()
+            continue
+        if lowered.split(" ", 1)[0] in SEQ_GROUP_PREFIXES:
+            title = stmt.split(" ", 1)[1] if " " in stmt else ""
+            stats.open_group(f"{lowered.split(' ', 1)[0]}-{len(stats.groups) + 1}", unmask(title))
+            continue
+        participant = SEQ_PARTICIPANT_RE.match(stmt)
+        if participant:
+            stats.node(participant.group("id"), unmask(participant.group("label")))
+            continue
+        message = SEQ_MESSAGE_RE.match(stmt)
+        if message:
+            stats.statements += 1
+            stats.node(message.group("a"))
+            stats.node(message.group("b"))
+            stats.edges += 1
+            stats.label(message.group("a"), unmask(message.group("text")))
+            continue
+        note = SEQ_NOTE_RE.match(stmt)
+        if note:
+            stats.statements += 1
+            stats.label("nota", unmask(note.group("text")))
+
+
+def parse_class(stats, statements, unmask):
+    current = None
+    for stmt in statements:
+        if current is not None:
+            if stmt.startswith("}"):
+                current = None
+            else:
+                stats.label(current, unmask(stmt))
+            continue
+        if stmt.startswith("namespace "):
+            stats.open_group(stmt.split()[1].rstrip("{"))
+            continue
+        if stmt == "}":
+            stats.close_group()
+            continue
+        decl = CLASS_DECL_RE.match(stmt)
+        if decl:
+            stats.statements += 1
+            stats.node(decl.group("id"), unmask(decl.group("label")))
+            current = decl.group("id") if decl.group("open") else None
+            continue
+        relation = CLASS_RELATION_RE.match(stmt)
+        if relation:
+            stats.statements += 1
+            stats.node(relation.group("a"))
+            stats.node(relation.group("b"))
+            stats.edges += 1
+            stats.label("arista", unmask(relation.group("text")))
+            continue
+        member = CLASS_MEMBER_RE.match(stmt)
+        if member:
+            stats.node(member.group("id"))
+            stats.label(member.group("id"), unmask(member.group("text")))
+
+
+def parse_state(stats, statements, unmask):
+    in_note = False
+    for stmt in statements:
+        lowered = stmt.lower()
+        if in_note:
+            in_note = lowered != "end note"
+            continue
+        if lowered.startswith("note "):
+            in_note = ":" not in stmt
+            continue
+        if stmt == "}":
+            stats.close_group()
+            continue
+        if stmt == "--" or lowered.startswith(("direction ", "classdef ", "class ", "style ")):
+            continue
+        decl = STATE_DECL_RE.match(stmt)
+        if decl:
+            if decl.group("open"):
+                stats.open_group(decl.group("id"), unmask(decl.group("label")))
+            else:
+                stats.statements += 1
+                stats.node(decl.group("id"), unmask(decl.group("label")))
+            continue
+        transition = STATE_TRANSITION_RE.match(stmt)
+        if transition:
+            stats.statements += 1
+            stats.node(transition.group("a"))
+            stats.node(transition.group("b"))
+            stats.edges += 1
+            stats.label("arista", unmask(transition.group("text")))
+            continue
+        desc = STATE_DESC_RE.match(stmt)
+        if desc:
+            stats.node(desc.group("id"), unmask(desc.group("text")))
+    for group_id in stats.groups:
+        stats.nodes.pop(group_id, None)
+
+
+MERMAID_PARSERS = {
+    "flowchart": parse_flowchart,
+    "sequence": parse_sequence,
+    "class": parse_class,
+    "state": parse_state,
+}
+
+
+def mermaid_layout_cost(kind, nodes, edges, groups, labels):
+    """Coste relativo del layout (unidades arbitrarias, comparables entre diagramas)."""
+    if kind == "sequence":
+        # Layout lineal: una columna por participante y una fila por mensaje o nota.
+        work = nodes + edges + groups
+    else:
+        work = nodes + MERMAID_SUBGRAPH_BORDER_NODES * groups + edges
+        work *= math.log2(work + 1)
+    return round(work + MERMAID_LABEL_COST * labels, 1)
+
+
+def mermaid_suggestions(stats, metrics, flags, thresholds):
+    suggestions = []
+    if not flags:
+        return suggestions
+    if stats.kind == "sequence":
+        if {"nodes", "edges", "layout_cost"} & set(flags):
+            suggestions.append(
+                f"Separar en varios sequenceDiagram por fases ({metrics['edges']} mensajes, "
+                f"como maximo {thresholds['edges']} por diagrama)"
+            )
+    elif stats.groups and {"nodes", "edges", "subgraphs", "layout_cost"} & set(flags):
+        sizes = Counter(group for group in stats.nodes.values() if group)
+        top_level = [group for group in stats.groups if group in sizes] or stats.groups
+        largest = sorted(top_level, key=lambda group: -sizes.get(group, 0))[:3]
+        blocks = ", ".join(f"{group} ({sizes.get(group, 0)} nodos)" for group in largest)
+        suggestions.append(
+            f"Dividir por subgraph: un diagrama por bloque (p. ej. {blocks}) "
+            f"y uno de resumen con los subgraphs como nodos"
+        )
+    elif {"nodes", "edges", "layout_cost"} & set(flags):
+        parts = max(2, math.ceil(metrics["nodes"] / max(1, thresholds["nodes"])))
+        suggestions.append(
+            f"Dividir en {parts} diagramas de como maximo {thresholds['nodes']} nodos "
+            f"enlazados por los nodos frontera"
+        )
+    if "label_chars" in flags:
+        long_labels = [owner for owner, _, width in stats.labels if width > thresholds["label_chars"]]
+        owners = ", ".join(dict.fromkeys(long_labels))
+        suggestions.append(
+            f"Acortar etiquetas con lineas de mas de {thresholds['label_chars']} caracteres "
+            f"({owners}) o partirlas con <br/>; el detalle cabe en el texto de la leccion"
+        )
+    return suggestions
+
+
+def analyze_mermaid(source, thresholds=None):
+    """Metricas, avisos y sugerencias de un diagrama Mermaid."""
+    thresholds = thresholds or MERMAID_THRESHOLDS
+    statements, unmask = mermaid_statements(source)
+    header = statements[0].split()[0] if statements else ""
+    kind = MERMAID_KINDS.get(header, header or "desconocido")
+    stats = MermaidStats(kind)
+    parser = MERMAID_PARSERS.get(kind)
+    if parser:
+        parser(stats, statements[1:], unmask)
+    label_lengths = [length for _, length, _ in stats.labels]
+    metrics = {
+        "kind": kind,
+        "hash": hashlib.sha1(source.encode("utf-8")).hexdigest()[:12],
+        "nodes": len(stats.nodes),
+        "edges": stats.edges,
+        "subgraphs": len(stats.groups),
+        "max_depth": stats.max_depth,
+        "labels": len(label_lengths),
+        "label_chars": sum(label_lengths),
+        "max_label_chars": max((width for _, _, width in stats.labels), default=0),
+        "statements": stats.statements if parser else max(0, len(statements) - 1),
+    }
+    metrics["layout_cost"] = (
+        mermaid_layout_cost(kind, metrics["nodes"], metrics["edges"], metrics["subgraphs"], metrics["labels"])
+        if parser
+        else float(metrics["statements"])
+    )
+    flags = []
+    if parser:
+        checks = {**metrics, "label_chars": metrics["max_label_chars"]}
+        flags = [name for name, limit in thresholds.items() if checks[name] > limit]
+    metrics["flags"] = flags
+    metrics["suggestions"] = mermaid_suggestions(stats, metrics, flags, thresholds)
+    return metrics
+
+
+def analyze_mermaid_files(files_content, thresholds=None):
+    """Informe por leccion de la complejidad de sus diagramas."""
+    thresholds = {**MERMAID_THRESHOLDS, **(thresholds or {})}
+    lessons = []
+    for filepath, content in files_content:
+        items = []
+        for index, (line, source) in enumerate(mermaid_blocks(content), 1):
+            items.append({"index": index, "line": line, **analyze_mermaid(source, thresholds)})
+        if items:
+            lessons.append(
+                {
+                    "file": filepath,
+                    "diagrams": len(items),
+                    "flagged": sum(1 for item in items if item["flags"]),
+                    "layout_cost": round(sum(item["layout_cost"] for item in items), 1),
+                    "items": items,
+                }
+            )
+    return {
+        "version": 1,
+        "thresholds": thresholds,
+        "diagrams": sum(lesson["diagrams"] for lesson in lessons),
+        "lessons_with_diagrams": len(lessons),
+        "flagged": sum(lesson["flagged"] for lesson in lessons),
+        "kinds": dict(Counter(item["kind"] for lesson in lessons for item in lesson["items"]).most_common()),
+        "lessons": lessons,
+    }
+
+
+def flagged_mermaid_diagrams(report):
+    flagged = [(lesson["file"], item) for lesson in report["lessons"] for item in lesson["items"] if item["flags"]]
+    return sorted(flagged, key=lambda pair: -pair[1]["layout_cost"])
+
+
+def print_mermaid_summary(report, top=10):
+    print(
+        f"  Diagramas Mermaid: {report['diagrams']} en {report['lessons_with_diagrams']} lecciones, "
+        f"{report['flagged']} sobre umbral"
+    )
+    for filepath, item in flagged_mermaid_diagrams(report)[:top]:
+        print(
+            f"    {filepath}:{item['line']} {item['kind']} coste {item['layout_cost']:.0f} "
+            f"({item['nodes']} nodos, {item['edges']} aristas, {item['subgraphs']} subgraphs; "
+            f"excede {', '.join(item['flags'])})"
+        )
+        for suggestion in item["suggestions"]:
+            print(f"      -> {suggestion}")
+
+
+def run_mermaid_report(config, output=None, thresholds=None, strict=False, top=10):
+    report = analyze_mermaid_files(load_course_files(config), thresholds)
+    output = Path(output) if output else config.output_dir / MERMAID_REPORT_NAME
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(report, ensure_ascii=False, indent=2) + "\n", encoding="utf-8")
+    print_mermaid_summary(report, top)
+    print(f"  Informe: {output}")
+    return 1 if strict and report["flagged"] else 0
+
+
+# ============================================================
+# Parrafos casi duplicados (MinHash + LSH)
+# ============================================================
+NEAR_DUP_SHINGLE_WORDS = 5
+NEAR_DUP_BANDS = 16
+NEAR_DUP_ROWS = 8
+NEAR_DUP_THRESHOLD = 0.8
+NEAR_DUP_MIN_WORDS = 20
+NEAR_DUP_WORD_RE = re.compile(r"[^\W_]+")
+NEAR_DUP_SKIP_DIRS = {"dist", "node_modules"}
+
+
+def course_markdown_files(config):
+    """Todos los .md del repositorio del curso (esten o no en FILE_ORDER)."""
+    paths = []
+    for path in sorted(config.course_root.rglob("*.md")):
+        rel_parts = path.relative_to(config.course_root).parts
+        if any(part.startswith(".") or part in NEAR_DUP_SKIP_DIRS for part in rel_parts[:-1]):
+            continue
+        if config.output_dir in path.parents:
+            continue
+        paths.append("/".join(rel_parts))
+    return paths
+
+
+def markdown_paragraphs(md_text):
+    """Bloques de prosa separados por lineas en blanco. Devuelve [(linea inicial, texto)].
+
+    Los bloques de codigo se ignoran: los repetidos ya los cubre dedupe_blocks.
+    """
+    paragraphs = []
+    current, start = [], 0
+    in_code = False
+    for line_no, line in enumerate(md_text.split("\n"), 1):
+        if line.strip().startswith("```"):
+            in_code = not in_code
+            if current:
+                paragraphs.append((start, "\n".join(current)))
+                current = []
+            continue
+        if in_code:
+            continue
+        if not line.strip() or _HEADER_RE.match(line) or _HR_RE.match(line):
+            if current:
+                paragraphs.append((start, "\n".join(current)))
+                current = []
+            continue
+        if not current:
+            start = line_no
+        current.append(line)
+    if current:
+        paragraphs.append((start, "\n".join(current)))
+    return paragraphs
+
+
+def word_shingles(words, size):
+    """Conjunto de shingles de `size` palabras, como enteros de 64 bits."""
+    if len(words) < size:
+        size = len(words)
+    return {
+        int.from_bytes(hashlib.blake2b(" ".join(words[i:i + size]).encode("utf-8"), digest_size=8).digest(), "big")
+        for i in range(len(words) - size + 1)
+    }
+
+
+class MinHasher:
+    """Firmas MinHash reproducibles por semilla.
+
+    Los shingles ya son hashes uniformes de 64 bits, asi que cada "permutacion"
+    es un XOR con una mascara aleatoria: min(map(mask.__xor__, ...)) corre en C
+    y es ~20x mas rapido que (a*x + b) mod p en Python puro.
+    """
+
+    def __init__(self, num_perm, seed=1):
+        rng = random.Random(seed)
+        self.masks = [rng.getrandbits(64) for _ in range(num_perm)]
+
+    def signature(self, shingles):
+        values = list(shingles)
+        return [min(map(mask.__xor__, values)) for mask in self.masks]
+
+
+def lsh_candidate_pairs(signatures, bands, rows):
+    """Pares que coinciden en al menos una banda: solo se comparan los que comparten cubo."""
+    pairs = set()
+    for band in range(bands):
+        buckets = {}
+        lo, hi = band * rows, (band + 1) * rows
+        for index, signature in enumerate(signatures):
+            buckets.setdefault(tuple(signature[lo:hi]), []).append(index)
+        for members in buckets.values():
+            if len(members) < 2:
+                continue
+            for i in range(len(members)):
+                for j in range(i + 1, len(members)):
+                    pairs.add((members[i], members[j]))
+    return pairs
+
+
+def find_near_duplicates(docs, threshold=NEAR_DUP_THRESHOLD, shingle_words=NEAR_DUP_SHINGLE_WORDS,
+                         bands=NEAR_DUP_BANDS, rows=NEAR_DUP_ROWS, min_words=NEAR_DUP_MIN_WORDS):
+    """Agrupa parrafos casi duplicados de docs = [(ruta, markdown)].
+
+    MinHash + LSH propone candidatos en tiempo subcuadratico; cada candidato se
+    confirma con la similitud de Jaccard exacta de sus shingles antes de unir
+    clusters. Devuelve el informe como dict serializable a JSON.
+    """
+    started = time.perf_counter()
+    paragraphs = []
+    for rel_path, md_text in docs:
+        for line_no, text in markdown_paragraphs(md_text):
+            words = NEAR_DUP_WORD_RE.findall(text.lower())
+            if len(words) < min_words:
+                continue
+            paragraphs.append({
+                "file": rel_path,
+                "line": line_no,
+                "text": text,
+                "shingles": word_shingles(words, shingle_words),
+                "normalized": " ".join(words),
+            })
+
+    hasher = MinHasher(bands * rows)
+    signatures = [hasher.signature(p["shingles"]) for p in paragraphs]
+    candidates = lsh_candidate_pairs(signatures, bands, rows)
+
+    parent = list(range(len(paragraphs)))
+
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    pair_similarity = {}
+    for i, j in candidates:
+        a, b = paragraphs[i]["shingles"], paragraphs[j]["shingles"]
+        similarity = len(a & b) / len(a | b)
+        if similarity >= threshold:
+            pair_similarity[(i, j)] = similarity
+            parent[find(i)] = find(j)
+
+    groups = {}
+    for i, j in pair_similarity:
+        groups.setdefault(find(i), set()).update((i, j))
+
+    clusters = []
+    for members in groups.values():
+        members = sorted(members, key=lambda k: (paragraphs[k]["file"], paragraphs[k]["line"]))
+        sizes = [len(paragraphs[k]["text"].encode("utf-8")) for k in members]
+        similarities = [s for (i, j), s in pair_similarity.items() if i in members and j in members]
+        clusters.append({
+            "size": len(members),
+            "exact": len({paragraphs[k]["normalized"] for k in members}) == 1,
+            "min_similarity": round(min(similarities), 3),
+            "bytes": sum(sizes),
+            # Lo que sobra si se conservara solo el parrafo mas largo del cluster.
+            "redundant_bytes": sum(sizes) - max(sizes),
+            "members": [
+                {
+                    "file": paragraphs[k]["file"],
+                    "line": paragraphs[k]["line"],
+                    "bytes": size,
+                    "preview": paragraphs[k]["text"][:120].replace("\n", " "),
+                }
+                for k, size in zip(members, sizes)
+            ],
+        })
+    clusters.sort(key=lambda c: c["redundant_bytes"], reverse=True)
+    for index, cluster in enumerate(clusters, 1):
+        cluster["id"] = index
+
+    return {
+        "params": {
+            "threshold": threshold,
+            "shingle_words": shingle_words,
+            "bands": bands,
+            "rows": rows,
+            "min_words": min_words,
+        },
+        "files": len(docs),
+        "paragraphs": len(paragraphs),
+        "candidate_pairs": len(candidates),
+        "confirmed_pairs": len(pair_similarity),
+        "clusters_total": len(clusters),
+        "exact_clusters": sum(1 for c in clusters if c["exact"]),
+        "redundant_bytes": sum(c["redundant_bytes"] for c in clusters),
+        "seconds": round(time.perf_counter() - started, 3),
+        "clusters": clusters,
+    }
+
+
+def run_near_duplicates(config, output, threshold, shingle_words, bands, rows, min_words, top=10):
+    paths = course_markdown_files(config)
+    docs = [(p, (config.course_root / p).read_text(encoding="utf-8")) for p in paths]
+    report = find_near_duplicates(docs, threshold, shingle_words, bands, rows, min_words)
+    output = Path(output) if output else config.output_dir / "near-duplicates.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(report, ensure_ascii=False, indent=2) + "\n", encoding="utf-8")
+
+    print(
+        f"  {report['files']} archivos, {report['paragraphs']} parrafos, "
+        f"{report['candidate_pairs']} candidatos LSH, {report['confirmed_pairs']} pares >= {threshold} "
+        f"({report['seconds'] * 1000:.0f} ms)"
+    )
+    print(
+        f"  {report['clusters_total']} clusters ({report['exact_clusters']} exactos), "
+        f"{report['redundant_bytes'] / 1024:.1f} KB redundantes"
+    )
+    for cluster in report["clusters"][:top]:
+        files = ", ".join(sorted({m["file"] for m in cluster["members"]}))
+        print(f"    #{cluster['id']} x{cluster['size']} {cluster['redundant_bytes']} B: {files}")
+    print(f"  Informe: {output}")
+    return 0
+
+
+def line_build_nav(files_content):
+    """Construye la barra de navegacion con anchors (backend de referencia)."""
     nav = '<nav id="sidebar">\n<h2>Indice</h2>\n<ul>\n'
 
     sections = {
@@ -312,39 +2038,298 @@ def build_nav(files_content):
     return nav
 
 
-def build_html():
-    """Construye el HTML completo."""
-    files_content = []
-    for rel_path in FILE_ORDER:
-        full_path = COURSE_ROOT / rel_path
-        if full_path.exists():
-            content = full_path.read_text(encoding="utf-8")
-            files_content.append((rel_path, content))
+def build_glossary(files_content):
+    """Carga el glosario de la lista de lecciones. Devuelve (entries, linker o None)."""
+    for filepath, content in files_content:
+        if filepath == GLOSSARY_FILE:
+            entries = load_glossary(content, file_id_for(filepath))
+            return entries, GlossaryLinker(entries) if entries else None
+    return [], None
+
+
+def render_lesson_section(filepath, content, glossary_entries=(), glossary_linker=None, perf=None, topic_num=None):
+    """Renderiza una leccion como <section class="lesson"> del shell. perf = (baseline, runs) del panel."""
+    file_id = file_id_for(filepath)
+    if filepath == PERF_DASHBOARD_PATH:
+        lesson_html = build_performance_dashboard(file_id, *perf)
+    else:
+        lesson_html = md_to_html(content, file_id)
+    if glossary_linker:
+        if filepath == GLOSSARY_FILE:
+            lesson_html = add_glossary_anchors(lesson_html, glossary_entries)
         else:
-            print(f"  [SKIP] {rel_path} (no encontrado)")
+            lesson_html = glossary_linker.link_lesson(lesson_html)
+    lesson_html = tag_mermaid_diagrams(lesson_html)
+    has_diagrams, has_code, code_langs = section_requirements(lesson_html)
+    topic_num_attr = f' data-topic-num="{topic_num}"' if topic_num else ""
+    return (
+        f'<section id="{file_id}" class="lesson" data-topic-id="{file_id}"{topic_num_attr} data-lesson-path="{filepath}" '
+        f'data-has-diagrams="{str(has_diagrams).lower()}" data-has-code="{str(has_code).lower()}" '
+        f'data-code-langs="{" ".join(code_langs)}">\n'
+        f'<div class="lesson-path">{filepath}</div>\n'
+        f"{lesson_html}"
+        "</section>\n"
+    )
+
+
+def with_perf_dashboard(files_content, perf_baseline):
+    # Leccion generada: solo aporta el titulo al indice, el cuerpo sale de los JSON.
+    if perf_baseline is None:
+        return files_content
+    return files_content + [(PERF_DASHBOARD_PATH, f"# {PERF_DASHBOARD_TITLE}\n")]
+
+
+def build_html(config=None, dedupe_paragraphs=False, purge_css_rules=True, perf_collector=""):
+    """Construye el HTML completo."""
+    config = config or BuildConfig()
+    perf_baseline, perf_runs = load_performance_runs(config)
+    files_content = with_perf_dashboard(load_course_files(config), perf_baseline)
 
     print(f"  Procesando {len(files_content)} archivos...")
 
     nav = build_nav(files_content)
+    glossary_entries, glossary_linker = build_glossary(files_content)
+    topic_nums = assign_topic_nums(config, [filepath for filepath, _ in files_content])
+
+    sections = [
+        (
+            filepath,
+            render_lesson_section(
+                filepath, content, glossary_entries, glossary_linker, (perf_baseline, perf_runs), topic_nums[filepath]
+            ),
+        )
+        for filepath, content in files_content
+    ]
+    link_index = LessonLinkIndex(sections, config.course_root)
+    sections = [(filepath, link_index.rewrite(filepath, section_html)) for filepath, section_html in sections]
+    body_html = "".join(section_html for _, section_html in sections)
+    body_html, block_store, dedupe_stats = dedupe_blocks(body_html, paragraphs=dedupe_paragraphs)
+    # Despues de deduplicar: las referencias del almacen de bloques casan con el HTML sin etiquetar.
+    context_blocks = {}
+    body_html = tag_context_blocks(body_html, context_blocks)
+    block_store = tag_context_blocks(block_store, context_blocks)
+    context_store_json, context_store_version = build_context_store(context_blocks)
+
+    html = render_shell(nav, body_html, block_store, context_store_version, html_lib.escape(perf_collector))
+    assets = load_assets(config)
+    purge_report = {}
+    if purge_css_rules:
+        html, purge_report = purge_unused_css(html, assets)
+
+    manifest_path = config.output_dir / MANIFEST_NAME
+    try:
+        previous_manifest = load_manifest(manifest_path)
+    except ValueError:
+        previous_manifest = None
+    writer = DistWriter(config.output_dir)
+    writer.write(config.output_file, html)
+    for name, text in assets.items():
+        writer.write(config.assets_dist_dir / name, text)
+    links_report = config.output_dir / "unresolved-links.json"
+    writer.write(links_report, json.dumps(link_index.unresolved, ensure_ascii=False, indent=2) + "\n")
+    writer.write(config.output_dir / CONTEXT_STORE_NAME, context_store_json)
+    mermaid_report = analyze_mermaid_files(files_content)
+    mermaid_report_path = config.output_dir / MERMAID_REPORT_NAME
+    writer.write(mermaid_report_path, json.dumps(mermaid_report, ensure_ascii=False, indent=2) + "\n")
+    manifest = build_manifest(writer.files, sections)
+    DistWriter(config.output_dir).write(manifest_path, json.dumps(manifest, ensure_ascii=False, indent=2) + "\n")
+
+    print(f"  HTML generado: {config.output_file}")
+    print(f"  Tamano: {config.output_file.stat().st_size / 1024:.0f} KB")
+    print(f"  Ficheros escritos: {len(writer.written)}, sin cambios: {len(writer.unchanged)}")
+    if previous_manifest is not None:
+        delta = manifest_diff(previous_manifest, manifest)
+        changed_files = sum(len(paths) for paths in delta["files"].values())
+        changed_sections = sum(len(paths) for paths in delta["sections"].values())
+        print(f"  Cambios respecto al build anterior: {changed_files} ficheros, {changed_sections} lecciones")
+    if glossary_linker:
+        print(
+            f"  Glosario: {len(glossary_entries)} terminos, {glossary_linker.links} enlaces "
+            f"({glossary_linker.seconds * 1000:.0f} ms)"
+        )
+    if perf_baseline is not None:
+        print(f"  Panel de rendimiento: {len(perf_runs)} ejecuciones")
+    print(
+        f"  Contexto del asistente: {len(context_blocks)} bloques, "
+        f"{len(context_store_json.encode('utf-8')) / 1024:.0f} KB (version {context_store_version})"
+    )
+    print(f"  Enlaces entre lecciones: {link_index.rewritten} reescritos, {len(link_index.unresolved)} sin resolver")
+    for item in link_index.unresolved[:10]:
+        print(f"    {item['file']}: {item['href']} ({item['reason']})")
+    if link_index.unresolved:
+        print(f"    Informe completo: {links_report}")
+    print_mermaid_summary(mermaid_report, top=5)
+    if mermaid_report["flagged"]:
+        print(f"    Informe completo: {mermaid_report_path}")
+    print(
+        f"  Bloques deduplicados: {dedupe_stats['distinct_blocks']} distintos, "
+        f"{dedupe_stats['blocks_saved']} copias evitadas, "
+        f"{dedupe_stats['bytes_saved'] / 1024:.1f} KB ahorrados"
+    )
+    if purge_report:
+        removed_bytes = sum(r["before"] - r["after"] for r in purge_report.values())
+        comment_bytes = sum(r["comments"] for r in purge_report.values())
+        removed_rules = sum(len(r["removed"]) for r in purge_report.values())
+        print(
+            f"  CSS purgado: {removed_bytes / 1024:.1f} KB menos ({removed_rules} selectores sin uso, "
+            f"{comment_bytes / 1024:.1f} KB de comentarios)"
+        )
+        for name, r in purge_report.items():
+            if r["removed"]:
+                print(f"    {name}: {r['before']} -> {r['after']} B, sin uso: {', '.join(r['removed'])}")
+
+
+def load_assets(config):
+    """{nombre: texto} de los assets que se publican en dist/assets."""
+    assets = {}
+    for asset_name in ASSET_NAMES:
+        src = config.assets_src_dir / asset_name
+        if src.exists():
+            assets[asset_name] = src.read_text(encoding="utf-8")
+    return assets
 
-    body_html = ""
-    for filepath, content in files_content:
-        file_id = filepath.replace("/", "-").replace(".md", "")
-        body_html += f'<section id="{file_id}" class="lesson" data-topic-id="{file_id}" data-lesson-path="{filepath}">\n'
-        body_html += f'<div class="lesson-path">{filepath}</div>\n'
-        body_html += md_to_html(content, file_id)
-        body_html += "</section>\n"
 
+def render_shell(nav, body_html, block_store="", context_store_version="", perf_collector=""):
+    """Shell HTML del curso (head, estilos, scripts) con el indice y el cuerpo inyectados."""
     html_template = """<!DOCTYPE html>
 <html lang="es">
 <head>
 <meta charset="UTF-8">
 <meta name="viewport" content="width=device-width, initial-scale=1.0">
 <meta name="course-id" content="stack-my-architecture-ios">
+<meta name="sma-context-store" content="{context_store}">
+<meta name="sma-perf-collector" content="{perf_collector}">
 <title>Stack: My Architecture iOS</title>
 <link rel="stylesheet" href="assets/study-ux.css">
 <link rel="stylesheet" href="assets/course-switcher.css">
 <link rel="stylesheet" href="assets/assistant-panel.css">
+<link rel="stylesheet" id="sma-style" href="assets/style-enterprise.css" data-visual-style="enterprise" onload="this.dataset.settled='1'" onerror="this.dataset.settled='1'">
+<script>
+// Antes del primer pintado: el <link> de arriba es del parser y bloquea el pintado en
+// todos los navegadores; si hay otro estilo guardado solo se cambia su href. Aplica
+// tambien el tema guardado. Las hojas de los demas estilos se piden al cambiar de estilo.
+(function () {{
+    const VISUAL_STYLES = ['enterprise', 'bold', 'paper'];
+
+    function loadVisualStyle(style, onReady) {{
+        if (!VISUAL_STYLES.includes(style)) style = 'enterprise';
+        let link = document.querySelector(`link[data-visual-style="${{style}}"]`);
+        if (!link) {{
+            // Cambio de estilo: se espera a la hoja (onReady) antes de aplicar data-style.
+            link = document.createElement('link');
+            link.rel = 'stylesheet';
+            link.href = `assets/style-${{style}}.css`;
+            link.dataset.visualStyle = style;
+            const markSettled = () => {{ link.dataset.settled = '1'; }};
+            link.addEventListener('load', markSettled);
+            link.addEventListener('error', markSettled);
+            document.head.appendChild(link);
+        }}
+        if (onReady) {{
+            if (link.dataset.settled === '1') {{
+                onReady(style);
+            }} else {{
+                const done = () => onReady(style);
+                link.addEventListener('load', done, {{ once: true }});
+                link.addEventListener('error', done, {{ once: true }});
+            }}
+        }}
+        return style;
+    }}
+
+    window.loadVisualStyle = loadVisualStyle;
+
+    let style = null;
+    let theme = null;
+    try {{
+        style = localStorage.getItem('course-style');
+        theme = localStorage.getItem('course-theme');
+    }} catch (_err) {{}}
+    if (!VISUAL_STYLES.includes(style)) style = 'enterprise';
+    if (style !== 'enterprise') {{
+        const link = document.getElementById('sma-style');
+        delete link.dataset.settled;
+        link.dataset.visualStyle = style;
+        link.href = `assets/style-${{style}}.css`;
+    }}
+    const root = document.documentElement;
+    root.setAttribute('data-style', style);
+    root.setAttribute('data-theme', theme || (window.matchMedia('(prefers-color-scheme: dark)').matches ? 'dark' : 'light'));
+}})();
+</script>
+<script>
+// Medidas de rendimiento en campo: cada fase (Mermaid, highlight.js, bloques de
+// codigo, study-ux, cambio de leccion) queda como performance.measure 'sma:<fase>'.
+// Si hay colector (meta sma-perf-collector o localStorage 'sma:perf:collector'),
+// se envian en lotes con sendBeacon; ver `build-html.py perf-collect`.
+(function () {{
+    const FLUSH_SIZE = 40;
+    const FLUSH_DELAY_MS = 10000;
+    let collector = '';
+    try {{
+        collector = localStorage.getItem('sma:perf:collector') || '';
+    }} catch (_err) {{}}
+    if (!collector) {{
+        const meta = document.querySelector('meta[name="sma-perf-collector"]');
+        collector = meta ? meta.content.trim() : '';
+    }}
+    const canSend = Boolean(collector && navigator.sendBeacon);
+    const queue = [];
+    let flushTimer = null;
+
+    function flush() {{
+        clearTimeout(flushTimer);
+        flushTimer = null;
+        if (!canSend || !queue.length) return;
+        const course = document.querySelector('meta[name="course-id"]');
+        const nav = performance.getEntriesByType ? performance.getEntriesByType('navigation')[0] : null;
+        const payload = JSON.stringify({{
+            course: course ? course.content : null,
+            page: location.pathname.split('/').pop(),
+            navigation: nav ? nav.type : null,
+            entries: queue.splice(0)
+        }});
+        // text/plain evita el preflight CORS: sendBeacon no puede hacerlo.
+        navigator.sendBeacon(collector, new Blob([payload], {{ type: 'text/plain' }}));
+    }}
+
+    function measure(phase, section, start, end) {{
+        end = end === undefined ? performance.now() : end;
+        try {{
+            performance.measure(`sma:${{phase}}`, {{ start, end, detail: {{ section: section || null }} }});
+        }} catch (_err) {{}}
+        if (!canSend) return;
+        queue.push({{
+            phase,
+            section: section || null,
+            start: Math.round(start * 10) / 10,
+            duration: Math.round((end - start) * 100) / 100
+        }});
+        if (queue.length >= FLUSH_SIZE) flush();
+        else if (!flushTimer) flushTimer = setTimeout(flush, FLUSH_DELAY_MS);
+    }}
+
+    // Mide fn(); si devuelve una promesa, hasta que se resuelve.
+    function time(phase, section, fn) {{
+        const start = performance.now();
+        const result = fn();
+        if (result && typeof result.then === 'function') {{
+            return result.then(value => {{
+                measure(phase, section, start);
+                return value;
+            }});
+        }}
+        measure(phase, section, start);
+        return result;
+    }}
+
+    document.addEventListener('visibilitychange', () => {{
+        if (document.visibilityState === 'hidden') flush();
+    }});
+    window.addEventListener('pagehide', flush);
+    window.SMAPerf = {{ measure, time, flush, collector: canSend ? collector : null }};
+}})();
+</script>
 <script defer src="assets/study-ux.js"></script>
 <script defer src="assets/course-switcher.js"></script>
 <script defer src="assets/theme-controls.js"></script>
@@ -356,13 +2341,10 @@ def build_html():
 <link rel="preconnect" href="https://fonts.gstatic.com" crossorigin>
 <link href="https://fonts.googleapis.com/css2?family=Inter:wght@400;450;500;600;700&display=swap" rel="stylesheet">
 
-<!-- Mermaid.js para diagramas -->
-<script src="https://cdn.jsdelivr.net/npm/mermaid@10/dist/mermaid.min.js"></script>
-
-<!-- Highlight.js para syntax highlighting -->
+<!-- Mermaid.js y highlight.js se cargan bajo demanda por seccion (ver prepareSection) -->
+<link rel="preconnect" href="https://cdn.jsdelivr.net" crossorigin>
+<link rel="preconnect" href="https://cdnjs.cloudflare.com" crossorigin>
 <link id="hljs-theme" rel="stylesheet" href="https://cdnjs.cloudflare.com/ajax/libs/highlight.js/11.9.0/styles/monokai.min.css">
-<script src="https://cdnjs.cloudflare.com/ajax/libs/highlight.js/11.9.0/highlight.min.js"></script>
-<script src="https://cdnjs.cloudflare.com/ajax/libs/highlight.js/11.9.0/languages/swift.min.js"></script>
 
 <style>
 /* ============================================
@@ -376,180 +2358,8 @@ def build_html():
     --visual-style: 'enterprise';
 }}
 
-/* ============================================
-   STYLE: ENTERPRISE (Default)
-   Profesional, limpio, corporativo
-   ============================================ */
-[data-style="enterprise"] {{
-    /* Paleta de colores */
-    --bg: #ffffff;
-    --bg-elevated: #fafbfc;
-    --bg-surface: #f6f8fa;
-    
-    --text: #1a1a2e;
-    --text-secondary: #4a4a5a;
-    --text-muted: #6a6a7a;
-    
-    --accent: #2563eb;
-    --accent-light: #3b82f6;
-    --accent-dark: #1d4ed8;
-    --accent-soft: rgba(37, 99, 235, 0.1);
-    
-    --success: #10b981;
-    --success-soft: rgba(16, 185, 129, 0.1);
-    --warning: #f59e0b;
-    --warning-soft: rgba(245, 158, 11, 0.1);
-    --danger: #ef4444;
-    --danger-soft: rgba(239, 68, 68, 0.1);
-    --info: #06b6d4;
-    --info-soft: rgba(6, 182, 212, 0.1);
-    
-    --sidebar-bg: #f8fafc;
-    --code-bg: #f1f5f9;
-    --border: #e2e8f0;
-    --border-light: #f1f5f9;
-    
-    --shadow-sm: 0 1px 2px rgba(0,0,0,0.05);
-    --shadow: 0 4px 6px -1px rgba(0,0,0,0.1);
-    --shadow-lg: 0 10px 15px -3px rgba(0,0,0,0.1);
-    
-    --font-weight-body: 500;
-    --font-weight-heading: 700;
-    --heading-letter-spacing: -0.02em;
-    --border-radius: 8px;
-}}
-
-/* ============================================
-   STYLE: ENTERPRISE - Dark Mode overrides
-   Profesional, azul corporativo
-   ============================================ */
-[data-theme="dark"][data-style="enterprise"] {{
-    --bg: #0c1821;
-    --bg-elevated: #152a3d;
-    --bg-surface: #1e3a5f;
-    
-    --text: #e8f4ff;
-    --text-secondary: #a8c5e0;
-    --text-muted: #6b8fb0;
-    
-    --accent: #60a5fa;
-    --accent-light: #93c5fd;
-    --accent-dark: #3b82f6;
-    --accent-soft: rgba(96, 165, 250, 0.15);
-    
-    --sidebar-bg: #0f2335;
-    --code-bg: #152a3d;
-    --border: #2a4a6d;
-    --border-light: #1e3a5f;
-}}
-
-/* ============================================
-   STYLE: BOLD
-   Alto contraste, impactante, moderno
-   ============================================ */
-[data-style="bold"] {{
-    --bg: #0a0a0f;
-    --bg-elevated: #141419;
-    --bg-surface: #1e1e24;
-    
-    --text: #ffffff;
-    --text-secondary: #d0d0e0;
-    --text-muted: #a0a0b0;
-    
-    --accent: #ff6b35;
-    --accent-light: #ff8c5a;
-    --accent-dark: #e55a2b;
-    --accent-soft: rgba(255, 107, 53, 0.15);
-    
-    --success: #00d9a3;
-    --success-soft: rgba(0, 217, 163, 0.15);
-    --warning: #ffc107;
-    --warning-soft: rgba(255, 193, 7, 0.15);
-    --danger: #ff4757;
-    --danger-soft: rgba(255, 71, 87, 0.15);
-    --info: #00d4ff;
-    --info-soft: rgba(0, 212, 255, 0.15);
-    
-    --sidebar-bg: #0f0f14;
-    --code-bg: #1a1a22;
-    --border: #3a3a45;
-    --border-light: #2a2a35;
-    
-    --shadow-sm: 0 1px 2px rgba(0,0,0,0.3);
-    --shadow: 0 4px 6px -1px rgba(0,0,0,0.4);
-    --shadow-lg: 0 10px 15px -3px rgba(0,0,0,0.5);
-    
-    --font-weight-body: 500;
-    --font-weight-heading: 800;
-    --heading-letter-spacing: -0.03em;
-    --border-radius: 12px;
-}}
-
-/* ============================================
-   STYLE: PAPER
-   Cálido, orgánico, académico
-   ============================================ */
-[data-style="paper"] {{
-    --bg: #fdfbf7;
-    --bg-elevated: #f5f1e8;
-    --bg-surface: #f0ebe0;
-    
-    --text: #2c241b;
-    --text-secondary: #5a5045;
-    --text-muted: #8a8075;
-    
-    --accent: #8b4513;
-    --accent-light: #a0522d;
-    --accent-dark: #654321;
-    --accent-soft: rgba(139, 69, 19, 0.08);
-    
-    --success: #2e7d32;
-    --success-soft: rgba(46, 125, 50, 0.1);
-    --warning: #ed6c02;
-    --warning-soft: rgba(237, 108, 2, 0.1);
-    --danger: #c62828;
-    --danger-soft: rgba(198, 40, 40, 0.1);
-    --info: #1565c0;
-    --info-soft: rgba(21, 101, 192, 0.1);
-    
-    --sidebar-bg: #f7f3ec;
-    --code-bg: #f5f0e6;
-    --border: #e0d5c5;
-    --border-light: #ebe5d8;
-    
-    --shadow-sm: 0 1px 3px rgba(44, 36, 27, 0.08);
-    --shadow: 0 4px 8px rgba(44, 36, 27, 0.12);
-    --shadow-lg: 0 8px 16px rgba(44, 36, 27, 0.15);
-    
-    --font-weight-body: 400;
-    --font-weight-heading: 600;
-    --heading-letter-spacing: -0.01em;
-    --border-radius: 4px;
-}}
-
-/* ============================================
-   STYLE: PAPER - Dark Mode overrides
-   Marrón cálido, estilo parchment
-   ============================================ */
-[data-theme="dark"][data-style="paper"] {{
-    --bg: #2d2419;
-    --bg-elevated: #3d3124;
-    --bg-surface: #4a3d2e;
-    
-    --text: #f5e6d3;
-    --text-secondary: #d4c4b0;
-    --text-muted: #a89080;
-    
-    --accent: #c4956a;
-    --accent-light: #d4a87a;
-    --accent-dark: #a87b5a;
-    --accent-soft: rgba(196, 149, 106, 0.15);
-    
-    --sidebar-bg: #3d3124;
-    --code-bg: #4a3d2e;
-    --border: #5a4d3e;
-    --border-light: #4a3d2e;
-}}
+/* Las variables de cada estilo visual (enterprise, bold, paper) viven en
+   assets/style-<estilo>.css y solo se descarga la del estilo activo. */
 
 /* ============================================
    COMMON VARIABLES (No cambian entre estilos)
@@ -926,6 +2736,60 @@ a:hover {{
     text-underline-offset: 2px;
 }}
 
+a.glossary-link {{
+    color: inherit;
+    font-weight: inherit;
+    text-decoration: underline dotted var(--accent);
+    text-underline-offset: 3px;
+}}
+
+tr:target {{
+    background: var(--accent-soft);
+}}
+
+/* Panel de rendimiento (SVG generado en el build) */
+.perf-figure {{
+    margin: 1rem 0 1.5rem;
+}}
+
+.perf-chart {{
+    width: 100%;
+    max-width: 640px;
+    height: auto;
+    font-family: inherit;
+}}
+
+.perf-axis {{
+    stroke: var(--border);
+    stroke-width: 1;
+}}
+
+.perf-tick,
+.perf-limit-label {{
+    fill: var(--text-muted);
+    font-size: 11px;
+}}
+
+.perf-limit {{
+    stroke: var(--danger);
+    stroke-width: 1.5;
+    stroke-dasharray: 6 4;
+}}
+
+.perf-line {{
+    fill: none;
+    stroke: var(--accent);
+    stroke-width: 2;
+}}
+
+.perf-point-ok {{
+    fill: var(--accent);
+}}
+
+.perf-point-over {{
+    fill: var(--danger);
+}}
+
 /* ============================================
    BADGE DE RUTA DE LECCIÓN
    ============================================ */
@@ -1178,6 +3042,7 @@ blockquote p {{
 {body_html}
 </main>
 
+{block_store}
 <button id="back-to-top" onclick="window.scrollTo({{top:0, behavior:'smooth'}})">&#8593;</button>
 
 <script>
@@ -1197,7 +3062,8 @@ function getPreferredCodeTheme() {{
 }}
 
 function applyStyle(style) {{
-    document.documentElement.setAttribute('data-style', style);
+    // El atributo cambia cuando la hoja del estilo ya esta cargada: sin parpadeo.
+    style = loadVisualStyle(style, ready => document.documentElement.setAttribute('data-style', ready));
     localStorage.setItem('course-style', style);
     
     const btn = document.getElementById('style-cycle-btn');
@@ -1245,9 +3111,11 @@ function applyCodeTheme(theme) {{
     hljsLink.href = `https://cdnjs.cloudflare.com/ajax/libs/highlight.js/11.9.0/styles/${{themeMap[theme] || 'monokai.min.css'}}`;
     
     // Re-highlight all code blocks
-    document.querySelectorAll('pre code').forEach(block => {{
-        hljs.highlightElement(block);
-    }});
+    if (typeof hljs !== 'undefined') {{
+        document.querySelectorAll('pre code').forEach(block => {{
+            hljs.highlightElement(block);
+        }});
+    }}
     enhanceCodeBlocks();
 }}
 
@@ -1287,6 +3155,10 @@ function copyCodeToClipboard(text) {{
 }}
 
 function enhanceCodeBlocks() {{
+    SMAPerf.time('enhance-code', null, enhanceCodeBlocksNow);
+}}
+
+function enhanceCodeBlocksNow() {{
     document.querySelectorAll('pre code').forEach(code => {{
         const pre = code.closest('pre');
         if (!pre || pre.classList.contains('mermaid')) return;
@@ -1358,34 +3230,224 @@ function currentMermaidTheme() {{
     return theme === 'dark' ? 'dark' : 'default';
 }}
 
+// Cache de SVG por tema de Mermaid y hash del fuente (data-diagram-hash): cambiar de
+// tema solo re-renderiza los diagramas cercanos al viewport; el resto se actualiza
+// al volver a acercarse y, si ya se renderizo ese tema, solo se intercambia el SVG.
+const mermaidSvgCache = {{}};
+const visibleDiagrams = new Set();
+let mermaidQueue = Promise.resolve();
+let mermaidInitializedTheme = null;
+let mermaidRenderSeq = 0;
+
+function mermaidSvgFor(theme, hash) {{
+    return mermaidSvgCache[theme] ? mermaidSvgCache[theme].get(hash) : undefined;
+}}
+
+function showDiagramSvg(el, theme, svg) {{
+    el.innerHTML = svg;
+    el.dataset.renderedTheme = theme;
+    el.setAttribute('data-processed', 'true');
+}}
+
+// Fuente exacto del build (<script type="text/plain"> dentro del <pre>); se guarda
+// en data-original-mermaid porque el SVG sustituye al contenido del <pre>.
+function mermaidSource(el) {{
+    if (el.dataset.originalMermaid === undefined) {{
+        const script = el.querySelector('script[type="text/plain"]');
+        el.dataset.originalMermaid = script ? script.textContent.replace(/<\\\\\\/script/gi, '<\\/script') : '';
+    }}
+    return el.dataset.originalMermaid;
+}}
+
+function renderDiagram(el) {{
+    const theme = currentMermaidTheme();
+    if (el.dataset.renderedTheme === theme) return Promise.resolve();
+    const source = mermaidSource(el);
+    const hash = el.dataset.diagramHash || source;
+
+    const cached = mermaidSvgFor(theme, hash);
+    if (cached !== undefined) {{
+        showDiagramSvg(el, theme, cached);
+        return Promise.resolve();
+    }}
+
+    // mermaid.initialize es global: los renders se serializan para no mezclar temas.
+    mermaidQueue = mermaidQueue.then(() => {{
+        if (el.dataset.renderedTheme === currentMermaidTheme()) return;
+        const renderTheme = currentMermaidTheme();
+        const hit = mermaidSvgFor(renderTheme, hash);
+        if (hit !== undefined) {{
+            showDiagramSvg(el, renderTheme, hit);
+            return;
+        }}
+        if (mermaidInitializedTheme !== renderTheme) {{
+            mermaid.initialize({{ startOnLoad: false, theme: renderTheme, securityLevel: 'loose' }});
+            mermaidInitializedTheme = renderTheme;
+        }}
+        const section = el.closest('section.lesson');
+        const render = () => mermaid.render(`sma-mermaid-${{++mermaidRenderSeq}}`, source);
+        return SMAPerf.time('mermaid-diagram', section && section.id, render).then(result => {{
+            if (!mermaidSvgCache[renderTheme]) mermaidSvgCache[renderTheme] = new Map();
+            mermaidSvgCache[renderTheme].set(hash, result.svg);
+            if (currentMermaidTheme() !== renderTheme) return;
+            showDiagramSvg(el, renderTheme, result.svg);
+            if (result.bindFunctions) result.bindFunctions(el);
+        }});
+    }}).catch(err => {{
+        console.warn('Mermaid: no se pudo renderizar el diagrama', err);
+    }});
+    return mermaidQueue;
+}}
+
+const diagramObserver = new IntersectionObserver(entries => {{
+    entries.forEach(entry => {{
+        if (entry.isIntersecting) {{
+            visibleDiagrams.add(entry.target);
+            renderDiagram(entry.target);
+        }} else {{
+            visibleDiagrams.delete(entry.target);
+        }}
+    }});
+}}, {{ rootMargin: '600px 0px' }});
+
 function renderMermaid() {{
-    if (typeof mermaid === 'undefined') {{
-        console.warn('Mermaid no cargado. Revisa conexión a internet/CDN.');
-        return;
+    // Solo los diagramas cerca del viewport; el resto toma el tema vigente al acercarse.
+    if (typeof mermaid === 'undefined') return;
+    SMAPerf.time('render-mermaid', null, () => Promise.all(Array.from(visibleDiagrams, el => renderDiagram(el))));
+}}
+
+// Carga diferida de Mermaid y highlight.js: cada seccion declara en data-has-diagrams,
+// data-has-code y data-code-langs lo que necesita, y se prepara al hacerse visible.
+const MERMAID_SRC = 'https://cdn.jsdelivr.net/npm/mermaid@10/dist/mermaid.min.js';
+const HLJS_BASE = 'https://cdnjs.cloudflare.com/ajax/libs/highlight.js/11.9.0/';
+const scriptLoads = {{}};
+
+function loadScriptOnce(src) {{
+    if (!scriptLoads[src]) {{
+        scriptLoads[src] = new Promise(resolve => {{
+            const script = document.createElement('script');
+            script.src = src;
+            script.async = true;
+            script.onload = () => resolve(true);
+            script.onerror = () => resolve(false);
+            document.head.appendChild(script);
+        }});
     }}
+    return scriptLoads[src];
+}}
 
-    mermaid.initialize({{
-        startOnLoad: false,
-        theme: currentMermaidTheme(),
-        securityLevel: 'loose'
+function ensureMermaid() {{
+    return loadScriptOnce(MERMAID_SRC).then(ok => {{
+        if (!ok || typeof mermaid === 'undefined') {{
+            console.warn('Mermaid no cargado. Revisa conexión a internet/CDN.');
+            return false;
+        }}
+        return true;
     }});
+}}
 
-    document.querySelectorAll('pre.mermaid').forEach(el => {{
-        el.removeAttribute('data-processed');
+function ensureHighlight(langs) {{
+    return loadScriptOnce(HLJS_BASE + 'highlight.min.js').then(ok => {{
+        if (!ok || typeof hljs === 'undefined') return false;
+        const missing = langs.filter(lang => !hljs.getLanguage(lang));
+        return Promise.all(missing.map(lang => loadScriptOnce(`${{HLJS_BASE}}languages/${{lang}}.min.js`))).then(() => true);
     }});
+}}
 
-    mermaid.run({{ querySelector: 'pre.mermaid' }});
+function highlightSection(section) {{
+    const langs = (section.dataset.codeLangs || '').split(' ').filter(Boolean);
+    return SMAPerf.time('highlight-load', section.id, () => ensureHighlight(langs)).then(ok => {{
+        if (!ok) return;
+        SMAPerf.time('highlight', section.id, () => {{
+            section.querySelectorAll('pre code:not([data-highlighted])').forEach(block => {{
+                hljs.highlightElement(block);
+            }});
+        }});
+    }});
 }}
 
-// Init Mermaid
-renderMermaid();
+function renderSectionDiagrams(section) {{
+    return SMAPerf.time('mermaid-load', section.id, ensureMermaid).then(ok => {{
+        if (!ok) return;
+        section.querySelectorAll('pre.mermaid').forEach(el => {{
+            mermaidSource(el);
+            diagramObserver.observe(el);
+        }});
+    }});
+}}
+
+// Solo en `build-html.py serve`: la seccion llega vacia y se pide al servidor al mostrarla
+function loadPreviewSection(section) {{
+    const src = section.dataset.previewSrc;
+    delete section.dataset.previewSrc;
+    SMAPerf.time('lesson-fetch', section.id, () => fetch(src))
+        .then(res => {{
+            if (!res.ok) throw new Error(`HTTP ${{res.status}}`);
+            return res.text();
+        }})
+        .then(html => {{
+            const tpl = document.createElement('template');
+            tpl.innerHTML = html.trim();
+            const rendered = tpl.content.firstElementChild;
+            if (!rendered) return;
+            Array.from(rendered.attributes).forEach(attr => section.setAttribute(attr.name, attr.value));
+            section.prepend(...rendered.childNodes);
+            enhanceCodeBlocks();
+            section.querySelectorAll('.sma-block-ref').forEach(ref => blockRefObserver.observe(ref));
+            prepareSection(section);
+        }})
+        .catch(err => {{
+            section.dataset.previewSrc = src;
+            console.warn('No se pudo cargar la leccion', src, err);
+        }});
+}}
+
+function prepareSection(section) {{
+    if (section.dataset.previewSrc) {{
+        loadPreviewSection(section);
+        return;
+    }}
+    if (section.dataset.libsPrepared === '1') return;
+    section.dataset.libsPrepared = '1';
+    if (section.dataset.hasCode === 'true') highlightSection(section);
+    if (section.dataset.hasDiagrams === 'true') renderSectionDiagrams(section);
+}}
+
+const sectionLibsObserver = new IntersectionObserver(entries => {{
+    entries.forEach(entry => {{
+        if (!entry.isIntersecting) return;
+        sectionLibsObserver.unobserve(entry.target);
+        prepareSection(entry.target);
+    }});
+}}, {{ rootMargin: '400px 0px' }});
+
+document.querySelectorAll('section.lesson').forEach(section => sectionLibsObserver.observe(section));
 
-// Init Highlight.js
-document.querySelectorAll('pre code').forEach(block => {{
-    hljs.highlightElement(block);
-}});
 enhanceCodeBlocks();
 
+// Bloques deduplicados: se materializan desde #sma-block-store al acercarse al viewport
+function materializeBlockRef(ref) {{
+    const tpl = document.querySelector(`#sma-block-store template[data-block-id="${{ref.dataset.blockRef}}"]`);
+    if (!tpl) return;
+    const fragment = tpl.content.cloneNode(true);
+    const section = ref.closest('section.lesson');
+    ref.replaceWith(fragment);
+    if (section && section.dataset.libsPrepared === '1' && section.dataset.hasCode === 'true') {{
+        highlightSection(section);
+    }}
+    enhanceCodeBlocks();
+}}
+
+const blockRefObserver = new IntersectionObserver(entries => {{
+    entries.forEach(entry => {{
+        if (!entry.isIntersecting) return;
+        blockRefObserver.unobserve(entry.target);
+        materializeBlockRef(entry.target);
+    }});
+}}, {{ rootMargin: '800px 0px' }});
+
+document.querySelectorAll('.sma-block-ref').forEach(ref => blockRefObserver.observe(ref));
+
 // Back to top button
 window.addEventListener('scroll', () => {{
     const btn = document.getElementById('back-to-top');
@@ -1432,31 +3494,828 @@ document.querySelectorAll('#sidebar a').forEach(link => {{
     # plain string, unescape doubled braces from previous formatting, then inject
     # dynamic sections explicitly.
     html = html_template.replace("{{", "{").replace("}}", "}")
-    html = html.replace("{nav}", nav).replace("{body_html}", body_html)
-
-    OUTPUT_DIR.mkdir(exist_ok=True)
-    OUTPUT_FILE.write_text(html, encoding="utf-8")
-
-    ASSETS_DIST_DIR.mkdir(parents=True, exist_ok=True)
-    for asset_name in [
-        "study-ux.js",
-        "study-ux.css",
-        "course-switcher.js",
-        "course-switcher.css",
-        "theme-controls.js",
-        "assistant-panel.js",
-        "assistant-panel.css",
-        "assistant-bridge.js",
-    ]:
-        src = ASSETS_SRC_DIR / asset_name
-        if src.exists():
-            shutil.copy2(src, ASSETS_DIST_DIR / asset_name)
+    html = html.replace("{nav}", nav).replace("{body_html}", body_html).replace("{block_store}", block_store)
+    html = html.replace("{context_store}", context_store_version).replace("{perf_collector}", perf_collector)
+    return html
+
 
-    print(f"  HTML generado: {OUTPUT_FILE}")
-    print(f"  Tamano: {OUTPUT_FILE.stat().st_size / 1024:.0f} KB")
+# ============================================================
+# Harness diferencial de conformidad entre backends
+# ============================================================
+FUZZ_WORDS = [
+    "actor", "Sendable", "UseCase", "repositorio", "cache", "dominio", "`LoginUseCase`",
+    "**clave**", "*enfasis*", "***fuerte***", "[enlace](../glosario.md)", "![img](a.png)",
+    "a|b", "<T>", "&", "x * y", "`async`", "[ ]", "[x]", "->", "1.", "#", "---",
+]
 
 
-if __name__ == "__main__":
+def fuzz_markdown(rng, lines=60):
+    """Genera un documento Markdown aleatorio con las construcciones que soporta el conversor."""
+    def words(n):
+        return " ".join(rng.choice(FUZZ_WORDS) for _ in range(rng.randint(1, n)))
+
+    out = []
+    while len(out) < lines:
+        kind = rng.randint(0, 11)
+        if kind == 0:
+            out.append(f"{'#' * rng.randint(1, 6)} {words(4)}")
+        elif kind == 1:
+            lang = rng.choice(["", "swift", "mermaid", "bash", "text"])
+            out.append(f"```{lang}")
+            out.extend(words(6) for _ in range(rng.randint(0, 4)))
+            if rng.random() < 0.9:
+                out.append("```")
+        elif kind == 2:
+            cols = rng.randint(1, 4)
+            out.append("| " + " | ".join(words(2) for _ in range(cols)) + " |")
+            out.append("|" + "---|" * cols)
+            out.extend("| " + " | ".join(words(3) for _ in range(cols)) + " |" for _ in range(rng.randint(0, 3)))
+        elif kind == 3:
+            out.extend(f"{rng.choice(['-', '*', '  -'])} {words(5)}" for _ in range(rng.randint(1, 4)))
+        elif kind == 4:
+            out.extend(f"{i + 1}{rng.choice(['.', ')'])} {words(5)}" for i in range(rng.randint(1, 4)))
+        elif kind == 5:
+            out.append("-" * rng.randint(3, 6))
+        elif kind == 6:
+            out.append("")
+        else:
+            out.append(words(10))
+    return "\n".join(out)
+
+
+def normalize_html(html):
+    """Normaliza espacios entre etiquetas para comparar salidas de backends distintos."""
+    html = re.sub(r">\s+<", "><", html.strip())
+    return re.sub(r"[ \t]+", " ", html)
+
+
+def measure_throughput(backend, docs, repeat=3):
+    """Renderiza el corpus `repeat` veces y devuelve docs/s y MB/s del mejor intento."""
+    total_bytes = sum(len(text.encode("utf-8")) for _, text in docs)
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for doc_id, text in docs:
+            backend.render(text, doc_id)
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    best = max(best, 1e-9)
+    return {"seconds": round(best, 4), "docs_per_s": round(len(docs) / best, 1), "mb_per_s": round(total_bytes / best / 1e6, 2)}
+
+
+def run_conformance(reference_name, candidate_name, fuzz_docs, seed, max_diffs, config=None):
+    """Compara dos backends sobre el curso y un corpus fuzz; devuelve el numero de discrepancias."""
+    reference = get_markdown_backend(reference_name)
+    candidate = get_markdown_backend(candidate_name)
+
+    nav_files = load_course_files(config or BuildConfig())
+    course_docs = [(file_id_for(rel_path), content) for rel_path, content in nav_files]
+
+    rng = random.Random(seed)
+    fuzz_corpus = [(f"fuzz-{i}", fuzz_markdown(rng)) for i in range(fuzz_docs)]
+
+    mismatches = []
+    for corpus_name, docs in (("curso", course_docs), ("fuzz", fuzz_corpus)):
+        for doc_id, text in docs:
+            expected = normalize_html(reference.render(text, doc_id))
+            actual = normalize_html(candidate.render(text, doc_id))
+            if expected != actual:
+                mismatches.append((corpus_name, doc_id, expected, actual))
+
+    if normalize_html(reference.nav(nav_files)) != normalize_html(candidate.nav(nav_files)):
+        mismatches.append(("nav", "build_nav", normalize_html(reference.nav(nav_files)), normalize_html(candidate.nav(nav_files))))
+
+    print(f"  Conformidad {reference.name} vs {candidate.name}: {len(course_docs)} lecciones, {len(fuzz_corpus)} docs fuzz (seed {seed})")
+    for corpus_name, doc_id, expected, actual in mismatches[:max_diffs]:
+        print(f"  [DIFF] {corpus_name}: {doc_id}")
+        diff = difflib.unified_diff(
+            expected.replace("><", ">\n<").split("\n"),
+            actual.replace("><", ">\n<").split("\n"),
+            reference.name,
+            candidate.name,
+            lineterm="",
+            n=1,
+        )
+        for line in list(diff)[:40]:
+            print(f"    {line}")
+    print(f"  Discrepancias: {len(mismatches)}")
+
+    for backend in (reference, candidate):
+        for corpus_name, docs in (("curso", course_docs), ("fuzz", fuzz_corpus)):
+            stats = measure_throughput(backend, docs)
+            print(
+                f"  Throughput {backend.name:>6} [{corpus_name}]: {stats['docs_per_s']} docs/s, "
+                f"{stats['mb_per_s']} MB/s ({stats['seconds']}s)"
+            )
+    return len(mismatches)
+
+
+# ============================================================
+# Beacons de rendimiento del navegador (colector y percentiles)
+# ============================================================
+# La pagina registra performance.measure por fase y seccion (window.SMAPerf) y,
+# si tiene colector configurado, los envia en lotes con sendBeacon.
+PERF_BEACONS_NAME = "perf-beacons.jsonl"
+PERF_REPORT_NAME = "perf-report.json"
+PERF_COLLECT_MAX_BYTES = 256 * 1024
+PERF_PERCENTILES = (50, 75, 95, 99)
+
+
+def make_perf_collector_handler(output, lock):
+    class PerfCollectorHandler(BaseHTTPRequestHandler):
+        def _reply(self, status, body=b""):
+            self.send_response(status)
+            self.send_header("Access-Control-Allow-Origin", "*")
+            self.send_header("Access-Control-Allow-Methods", "POST, OPTIONS")
+            self.send_header("Access-Control-Allow-Headers", "Content-Type")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_OPTIONS(self):
+            self._reply(204)
+
+        def do_POST(self):
+            length = int(self.headers.get("Content-Length") or 0)
+            if self.path.split("?", 1)[0] != "/beacon" or not 0 < length <= PERF_COLLECT_MAX_BYTES:
+                self._reply(400 if self.path.startswith("/beacon") else 404)
+                return
+            try:
+                beacon = json.loads(self.rfile.read(length).decode("utf-8"))
+                entries = beacon["entries"]
+                if not isinstance(entries, list):
+                    raise ValueError("entries no es una lista")
+            except (ValueError, KeyError, TypeError, UnicodeDecodeError):
+                self._reply(400)
+                return
+            beacon["received_at"] = round(time.time(), 3)
+            with lock:
+                with output.open("a", encoding="utf-8") as handle:
+                    handle.write(json.dumps(beacon, ensure_ascii=False, separators=(",", ":")) + "\n")
+            print(f"  beacon: {len(entries)} medidas ({beacon.get('page') or '-'})")
+            self._reply(204)
+
+        def log_message(self, format, *args):
+            pass
+
+    return PerfCollectorHandler
+
+
+def serve_perf_collector(config, host, port, output=None):
+    output = Path(output) if output else config.output_dir / PERF_BEACONS_NAME
+    output.parent.mkdir(parents=True, exist_ok=True)
+    server = ThreadingHTTPServer((host, port), make_perf_collector_handler(output, threading.Lock()))
+    print(f"  Colector en http://{host}:{port}/beacon -> {output}")
+    print(f"  Activalo con `build --perf-collector http://{host}:{port}/beacon` o en la consola del navegador:")
+    print(f"    localStorage.setItem('sma:perf:collector', 'http://{host}:{port}/beacon')")
+    print("  Pulsa Ctrl+C para detener el servidor.")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    return 0
+
+
+def percentile(sorted_values, q):
+    """Percentil q (0-100) con interpolacion lineal entre rangos."""
+    if not sorted_values:
+        return 0.0
+    rank = (len(sorted_values) - 1) * q / 100
+    low = int(rank)
+    high = min(low + 1, len(sorted_values) - 1)
+    return sorted_values[low] + (sorted_values[high] - sorted_values[low]) * (rank - low)
+
+
+def duration_stats(values):
+    ordered = sorted(values)
+    stats = {"count": len(ordered), "mean": round(sum(ordered) / len(ordered), 2), "max": round(ordered[-1], 2)}
+    for q in PERF_PERCENTILES:
+        stats[f"p{q}"] = round(percentile(ordered, q), 2)
+    return stats
+
+
+def aggregate_perf_beacons(lines, lesson_paths):
+    """Agrupa las medidas por fase y por (leccion, fase). Devuelve el informe."""
+    by_phase = {}
+    by_lesson = {}
+    beacons = invalid = 0
+    for line in lines:
+        if not line.strip():
+            continue
+        try:
+            entries = json.loads(line)["entries"]
+            if not isinstance(entries, list):
+                raise ValueError("entries no es una lista")
+        except (ValueError, KeyError, TypeError):
+            invalid += 1
+            continue
+        beacons += 1
+        for entry in entries:
+            if not isinstance(entry, dict):
+                continue
+            phase, duration = entry.get("phase"), entry.get("duration")
+            # bool es subclase de int (true/false no son duraciones) y json admite NaN/Infinity.
+            numeric = isinstance(duration, (int, float)) and not isinstance(duration, bool)
+            if not isinstance(phase, str) or not numeric or not math.isfinite(duration) or duration < 0:
+                continue
+            by_phase.setdefault(phase, []).append(duration)
+            if entry.get("section"):
+                by_lesson.setdefault(str(entry["section"]), {}).setdefault(phase, []).append(duration)
+
+    return {
+        "beacons": beacons,
+        "invalid_lines": invalid,
+        "measures": sum(len(values) for values in by_phase.values()),
+        "phases": {phase: duration_stats(values) for phase, values in sorted(by_phase.items())},
+        "lessons": {
+            section: {
+                "path": lesson_paths.get(section),
+                "phases": {phase: duration_stats(values) for phase, values in sorted(phases.items())},
+            }
+            for section, phases in sorted(by_lesson.items())
+        },
+    }
+
+
+def run_perf_report(config, input_path=None, output=None, top=5):
+    input_path = Path(input_path) if input_path else config.output_dir / PERF_BEACONS_NAME
+    if not input_path.exists():
+        print(f"  No hay beacons en {input_path}. Arranca `build-html.py perf-collect` y navega el curso.")
+        return 1
+    lesson_paths = {file_id_for(p): p for p in config.file_order}
+    lesson_paths[file_id_for(PERF_DASHBOARD_PATH)] = PERF_DASHBOARD_PATH
+    with input_path.open(encoding="utf-8") as handle:
+        report = aggregate_perf_beacons(handle, lesson_paths)
+    output = Path(output) if output else config.output_dir / PERF_REPORT_NAME
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(report, ensure_ascii=False, indent=2) + "\n", encoding="utf-8")
+
+    print(f"  {report['beacons']} beacons, {report['measures']} medidas, {report['invalid_lines']} lineas invalidas")
+    for phase, stats in report["phases"].items():
+        print(f"    {phase}: n={stats['count']} p50={stats['p50']} ms p95={stats['p95']} ms max={stats['max']} ms")
+        slowest = sorted(
+            ((lesson["phases"][phase]["p95"], section) for section, lesson in report["lessons"].items() if phase in lesson["phases"]),
+            reverse=True,
+        )[:top]
+        for p95, section in slowest:
+            print(f"      {p95:>9.2f} ms  {report['lessons'][section]['path'] or section}")
+    print(f"  Informe: {output}")
+    return 0
+
+
+# ============================================================
+# Servidor unico: dist/ + proxy inverso al assistant-bridge
+# ============================================================
+# Sirve el build y reenvia las rutas del bridge por el mismo puerto, asi el panel
+# usa URLs relativas y el navegador no hace preflight CORS ni abre otro pool de
+# conexiones. Hacia el bridge se reutiliza una conexion keep-alive por hilo.
+SAME_ORIGIN_META = '<meta name="sma-assistant-proxy" content="same-origin">'
+SAME_ORIGIN_ROUTES = ("/ask", "/assistant/query", "/health", "/metrics", "/config")
+HOP_BY_HOP_HEADERS = {
+    "connection", "keep-alive", "proxy-authenticate", "proxy-authorization", "proxy-connection",
+    "te", "trailer", "transfer-encoding", "upgrade", "host", "content-length",
+}
+PROXY_STREAM_CHUNK = 16 * 1024
+# Respuestas que nunca llevan cuerpo (RFC 9110): ni Content-Length de cuerpo ni chunked.
+PROXY_NO_BODY_STATUSES = {204, 304}
+
+
+class BridgeConnections:
+    """Pool de conexiones keep-alive al bridge compartido por los hilos del servidor.
+
+    Una conexion vuelve al pool cuando su respuesta se ha leido entera. Si el
+    bridge cerro una conexion ociosa, se descartan todas las del pool (han
+    expirado igual) y la peticion se repite una vez con una conexion nueva.
+    """
+
+    def __init__(self, bridge_url, max_idle=8, timeout=120):
+        parsed = urllib.parse.urlsplit(bridge_url)
+        if parsed.scheme != "http" or not parsed.hostname:
+            raise ValueError(f"URL del bridge no valida (se espera http://host:puerto): {bridge_url}")
+        self.url = f"http://{parsed.netloc}"
+        self.host = parsed.hostname
+        self.port = parsed.port or 80
+        self.max_idle = max(1, max_idle)
+        self.timeout = timeout
+        self.idle = deque()
+        self.lock = threading.Lock()
+        self.opened = 0
+        self.reused = 0
+
+    def request(self, method, path, body, headers):
+        """Devuelve (conexion, respuesta); la conexion se entrega luego a release()."""
+        for attempt in range(2):
+            with self.lock:
+                conn = self.idle.pop() if self.idle and attempt == 0 else None
+                if conn is None:
+                    self.opened += 1
+            fresh = conn is None
+            if fresh:
+                conn = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+            try:
+                conn.request(method, path, body=body, headers=headers)
+                response = conn.getresponse()
+            except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError):
+                conn.close()
+                if fresh:
+                    raise
+                with self.lock:
+                    stale, self.idle = self.idle, deque()
+                for idle_conn in stale:
+                    idle_conn.close()
+                continue
+            except OSError:
+                conn.close()
+                raise
+            if not fresh:
+                with self.lock:
+                    self.reused += 1
+            return conn, response
+        raise ConnectionError("el bridge cerro la conexion")
+
+    def release(self, conn, response, reusable=True):
+        if not reusable or not response.isclosed() or response.will_close:
+            conn.close()
+            return
+        with self.lock:
+            if len(self.idle) < self.max_idle:
+                self.idle.append(conn)
+                return
+        conn.close()
+
+    def stats(self):
+        with self.lock:
+            return {"opened": self.opened, "reused": self.reused, "idle": len(self.idle)}
+
+
+def is_same_origin_route(path):
+    return any(path == route or path.startswith(route + "/") for route in SAME_ORIGIN_ROUTES)
+
+
+def inject_same_origin_meta(html_bytes):
+    marker = b"<head>"
+    index = html_bytes.find(marker)
+    if index < 0:
+        return html_bytes
+    index += len(marker)
+    return html_bytes[:index] + b"\n" + SAME_ORIGIN_META.encode("utf-8") + html_bytes[index:]
+
+
+def make_same_origin_handler(config, bridge):
+    class SameOriginHandler(SimpleHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, directory=str(config.output_dir), **kwargs)
+
+        def do_GET(self):
+            path = self.path.split("?", 1)[0]
+            if is_same_origin_route(path):
+                self.proxy()
+            elif path == "/":
+                self.send_response(302)
+                self.send_header("Location", f"/{config.output_file.name}")
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+            elif path.endswith(".html"):
+                self.send_html(path)
+            elif self.command == "HEAD":
+                super().do_HEAD()
+            else:
+                super().do_GET()
+
+        # HEAD sigue las mismas rutas que GET; cada rama omite el cuerpo.
+        do_HEAD = do_GET
+
+        def do_POST(self):
+            if is_same_origin_route(self.path.split("?", 1)[0]):
+                self.proxy()
+            else:
+                self.send_error(404)
+
+        def do_OPTIONS(self):
+            if is_same_origin_route(self.path.split("?", 1)[0]):
+                self.proxy()
+            else:
+                self.send_error(404)
+
+        def send_html(self, path):
+            # El HTML cambia con cada build y lleva la marca del modo mismo origen.
+            target = Path(self.translate_path(path))
+            if not target.is_file():
+                self.send_error(404)
+                return
+            body = inject_same_origin_meta(target.read_bytes())
+            self.send_response(200)
+            self.send_header("Content-Type", "text/html; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.send_header("Cache-Control", "no-cache")
+            self.end_headers()
+            if self.command != "HEAD":
+                self.wfile.write(body)
+
+        def proxy(self):
+            length = int(self.headers.get("Content-Length") or 0)
+            body = self.rfile.read(length) if length else None
+            headers = {k: v for k, v in self.headers.items() if k.lower() not in HOP_BY_HOP_HEADERS}
+            if body is not None:
+                headers["Content-Length"] = str(len(body))
+            try:
+                conn, response = bridge.request(self.command, self.path, body, headers)
+            except OSError as exc:
+                self.send_error(502, f"Bridge no disponible en {bridge.url}: {exc}")
+                return
+
+            completed = False
+            try:
+                self.send_response(response.status, response.reason)
+                for name, value in response.getheaders():
+                    if name.lower() not in HOP_BY_HOP_HEADERS:
+                        self.send_header(name, value)
+                length = response.getheader("Content-Length")
+                if self.command == "HEAD" or response.status in PROXY_NO_BODY_STATUSES or response.status < 200:
+                    # Sin cuerpo: el Content-Length de HEAD/304 describe el recurso y se conserva.
+                    if length is not None and response.status != 204 and response.status >= 200:
+                        self.send_header("Content-Length", length)
+                    self.end_headers()
+                    response.read()
+                elif length is not None:
+                    self.send_header("Content-Length", length)
+                    self.end_headers()
+                    self.wfile.write(response.read())
+                else:
+                    # Respuestas en streaming (SSE): se reenvian tal como llegan.
+                    self.send_header("Transfer-Encoding", "chunked")
+                    self.end_headers()
+                    while True:
+                        chunk = response.read1(PROXY_STREAM_CHUNK)
+                        if not chunk:
+                            break
+                        self.wfile.write(b"%X\r\n%s\r\n" % (len(chunk), chunk))
+                        self.wfile.flush()
+                    self.wfile.write(b"0\r\n\r\n")
+                completed = True
+            except (BrokenPipeError, ConnectionResetError):
+                # El navegador cancelo; al cerrar la conexion el bridge aborta la peticion.
+                self.close_connection = True
+            finally:
+                bridge.release(conn, response, reusable=completed)
+
+        def handle(self):
+            try:
+                super().handle()
+            except ConnectionResetError:
+                pass
+
+        def log_message(self, format, *args):
+            pass
+
+    return SameOriginHandler
+
+
+def serve_same_origin(config, host, port, bridge_url):
+    html_file = config.output_file
+    if not html_file.is_file():
+        print(f"ERROR: No existe {html_file}. Ejecuta antes el build.", file=sys.stderr)
+        return 1
+    try:
+        bridge = BridgeConnections(bridge_url)
+    except ValueError as exc:
+        print(f"ERROR: {exc}", file=sys.stderr)
+        return 2
+    server = ThreadingHTTPServer((host, port), make_same_origin_handler(config, bridge))
+    print(f"  Curso en http://{host}:{port}/{html_file.name}")
+    print(f"  Proxy de {', '.join(SAME_ORIGIN_ROUTES)} -> {bridge.url} (keep-alive)")
+    print("  Pulsa Ctrl+C para detener el servidor.")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        stats = bridge.stats()
+        print(f"  Conexiones al bridge: {stats['opened']} abiertas, {stats['reused']} reutilizadas")
+    return 0
+
+
+# ============================================================
+# Servidor de previsualizacion bajo demanda
+# ============================================================
+PREVIEW_LESSON_PREFIX = "/__lesson/"
+
+
+class LessonCache:
+    """LRU de secciones renderizadas.
+
+    Una entrada vale mientras no cambien mtime/tamano del .md ni sus dependencias
+    (backend, glosario). Si cambia el mtime pero no el hash del contenido, se
+    revalida sin volver a renderizar.
+    """
+
+    def __init__(self, max_entries=32):
+        self.max_entries = max(1, max_entries)
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.revalidated = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key, stat_sig, deps, read_content, render):
+        """Devuelve (html, estado) con estado hit | revalidated | miss."""
+        entry = self.entries.get(key)
+        if entry and entry["deps"] == deps and entry["stat"] == stat_sig:
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry["html"], "hit"
+
+        content = read_content()
+        digest = hashlib.sha1(content.encode("utf-8")).hexdigest()
+        if entry and entry["deps"] == deps and entry["hash"] == digest:
+            entry["stat"] = stat_sig
+            self.entries.move_to_end(key)
+            self.revalidated += 1
+            return entry["html"], "revalidated"
+
+        html = render(content)
+        self.entries[key] = {"stat": stat_sig, "hash": digest, "deps": deps, "html": html}
+        self.entries.move_to_end(key)
+        self.misses += 1
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+        return html, "miss"
+
+    def stats(self):
+        return {
+            "entries": len(self.entries),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "revalidated": self.revalidated,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+
+class CoursePreview:
+    """Sirve el shell del build estatico con cada leccion renderizada la primera vez que se pide."""
+
+    def __init__(self, config, cache_size=32):
+        self.config = config
+        self.cache = LessonCache(cache_size)
+        self.lock = threading.Lock()
+        self._nav = (None, "")
+        self._glossary = (None, [], None)
+
+    def _stat_sig(self, rel_path):
+        stat = (self.config.course_root / rel_path).stat()
+        return stat.st_mtime_ns, stat.st_size
+
+    def _read(self, rel_path):
+        return (self.config.course_root / rel_path).read_text(encoding="utf-8")
+
+    def lesson_paths(self):
+        paths = [p for p in self.config.file_order if (self.config.course_root / p).exists()]
+        if (self.config.benchmarks_dir / PERF_BASELINE_NAME).exists():
+            paths.append(PERF_DASHBOARD_PATH)
+        return paths
+
+    def _glossary_state(self):
+        """(hash, entries, linker) del glosario, recargado solo si cambia el fichero."""
+        if GLOSSARY_FILE not in self.config.file_order or not (self.config.course_root / GLOSSARY_FILE).exists():
+            return None, [], None
+        sig = self._stat_sig(GLOSSARY_FILE)
+        if self._glossary[0] is None or self._glossary[0][0] != sig:
+            content = self._read(GLOSSARY_FILE)
+            entries, linker = build_glossary([(GLOSSARY_FILE, content)])
+            digest = hashlib.sha1(content.encode("utf-8")).hexdigest()
+            self._glossary = ((sig, digest), entries, linker)
+        (_, digest), entries, linker = self._glossary
+        return digest, entries, linker
+
+    def render_index(self):
+        with self.lock:
+            paths = self.lesson_paths()
+            sig = tuple((p, self._stat_sig(p)) for p in paths if p != PERF_DASHBOARD_PATH)
+            if self._nav[0] != sig:
+                files_content = [(p, self._read(p)) for p in paths if p != PERF_DASHBOARD_PATH]
+                if PERF_DASHBOARD_PATH in paths:
+                    files_content = with_perf_dashboard(files_content, True)
+                self._nav = (sig, build_nav(files_content))
+            nav = self._nav[1]
+            topic_nums = assign_topic_nums(self.config, paths)
+
+        # Secciones vacias: el shell pide cada leccion a /__lesson/<id> al mostrarla.
+        body_html = "".join(
+            f'<section id="{file_id_for(p)}" class="lesson" data-topic-id="{file_id_for(p)}" '
+            f'data-topic-num="{topic_nums[p]}" data-lesson-path="{p}" '
+            f'data-preview-src="{PREVIEW_LESSON_PREFIX}{file_id_for(p)}"></section>\n'
+            for p in paths
+        )
+        return render_shell(nav, body_html)
+
+    def render_lesson(self, file_id):
+        """Devuelve (html de la seccion, estado de cache) o (None, None) si no existe."""
+        rel_path = next((p for p in self.lesson_paths() if file_id_for(p) == file_id), None)
+        if rel_path is None:
+            return None, None
+        if rel_path == PERF_DASHBOARD_PATH:
+            perf = load_performance_runs(self.config)
+            with self.lock:
+                _, entries, linker = self._glossary_state()
+                topic_num = assign_topic_nums(self.config, [rel_path])[rel_path]
+            return render_lesson_section(rel_path, "", entries, linker, perf, topic_num), "generated"
+
+        with self.lock:
+            glossary_digest, entries, linker = self._glossary_state()
+            topic_num = assign_topic_nums(self.config, [rel_path])[rel_path]
+            deps = (ACTIVE_MD_BACKEND, glossary_digest, topic_num)
+            return self.cache.get(
+                rel_path,
+                self._stat_sig(rel_path),
+                deps,
+                lambda: self._read(rel_path),
+                lambda content: LessonLinkIndex((p, "") for p in self.lesson_paths()).rewrite(
+                    rel_path, render_lesson_section(rel_path, content, entries, linker, topic_num=topic_num)
+                ),
+            )
+
+    def asset_path(self, name):
+        path = (self.config.assets_src_dir / name).resolve()
+        if path.parent != self.config.assets_src_dir.resolve() or not path.is_file():
+            return None
+        return path
+
+
+def make_preview_handler(preview):
+    content_types = {".js": "application/javascript", ".css": "text/css", ".html": "text/html"}
+
+    class PreviewHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            started = time.perf_counter()
+            path = self.path.split("?", 1)[0]
+            cache_state = "-"
+            if path in ("/", "/index.html", f"/{preview.config.output_file.name}"):
+                status, body, ctype = 200, preview.render_index().encode("utf-8"), "text/html"
+            elif path.startswith(PREVIEW_LESSON_PREFIX):
+                html, cache_state = preview.render_lesson(path[len(PREVIEW_LESSON_PREFIX):])
+                if html is None:
+                    status, body, ctype = 404, b"Leccion no encontrada", "text/plain"
+                else:
+                    status, body, ctype = 200, html.encode("utf-8"), "text/html"
+            elif path == "/__stats":
+                status, ctype = 200, "application/json"
+                body = json.dumps({"lesson_cache": preview.cache.stats()}).encode("utf-8")
+            elif path.startswith("/assets/") and preview.asset_path(path[len("/assets/"):]):
+                asset = preview.asset_path(path[len("/assets/"):])
+                status, body = 200, asset.read_bytes()
+                ctype = content_types.get(asset.suffix, "application/octet-stream")
+            else:
+                status, body, ctype = 404, b"Not found", "text/plain"
+
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            self.send_response(status)
+            self.send_header("Content-Type", f"{ctype}; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.send_header("Cache-Control", "no-store")
+            self.send_header("X-Render-Ms", f"{elapsed_ms:.1f}")
+            self.send_header("X-Lesson-Cache", cache_state)
+            self.end_headers()
+            self.wfile.write(body)
+            print(f"  {status} {path} ({elapsed_ms:.1f} ms, cache {cache_state})")
+
+        def log_message(self, format, *args):
+            pass
+
+    return PreviewHandler
+
+
+def serve_preview(config, host, port, cache_size):
+    preview = CoursePreview(config, cache_size)
+    server = ThreadingHTTPServer((host, port), make_preview_handler(preview))
+    print(f"  Previsualizacion en http://{host}:{port}/ (LRU de {cache_size} lecciones, backend {ACTIVE_MD_BACKEND})")
+    print("  Pulsa Ctrl+C para detener el servidor.")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    return 0
+
+
+def main(argv=None):
+    global ACTIVE_MD_BACKEND
+
+    parser = argparse.ArgumentParser(description="Genera el HTML del curso y utilidades del builder.")
+    parser.add_argument("--md-backend", default=ACTIVE_MD_BACKEND, help="backend de Markdown para el build")
+    subparsers = parser.add_subparsers(dest="command")
+    build = subparsers.add_parser("build", help="construye dist/ (por defecto)")
+    build.add_argument(
+        "--dedupe-paragraphs",
+        action="store_true",
+        help="sustituye tambien los parrafos identicos por referencias al almacen de bloques",
+    )
+    build.add_argument("--no-purge-css", action="store_true", help="no elimina los selectores CSS sin uso")
+    build.add_argument(
+        "--perf-collector", default="", metavar="URL", help="URL del colector de beacons de rendimiento (perf-collect)"
+    )
+    conformance = subparsers.add_parser("conformance", help="compara la salida HTML de dos backends")
+    conformance.add_argument("--reference", default="line")
+    conformance.add_argument("--candidate", default="fast")
+    conformance.add_argument("--fuzz-docs", type=int, default=300)
+    conformance.add_argument("--seed", type=int, default=1234)
+    conformance.add_argument("--max-diffs", type=int, default=5)
+    serve = subparsers.add_parser("serve", help="servidor de previsualizacion que renderiza cada leccion bajo demanda")
+    serve.add_argument("--host", default="127.0.0.1")
+    serve.add_argument("--port", type=int, default=8043)
+    serve.add_argument("--cache-size", type=int, default=32, help="lecciones renderizadas que se mantienen en memoria")
+    near_dups = subparsers.add_parser("near-duplicates", help="informe JSON de parrafos casi duplicados (MinHash + LSH)")
+    near_dups.add_argument("--output", help="ruta del informe (por defecto dist/near-duplicates.json)")
+    near_dups.add_argument("--threshold", type=float, default=NEAR_DUP_THRESHOLD, help="similitud de Jaccard minima")
+    near_dups.add_argument("--shingle-words", type=int, default=NEAR_DUP_SHINGLE_WORDS)
+    near_dups.add_argument("--bands", type=int, default=NEAR_DUP_BANDS)
+    near_dups.add_argument("--rows", type=int, default=NEAR_DUP_ROWS)
+    near_dups.add_argument("--min-words", type=int, default=NEAR_DUP_MIN_WORDS)
+    manifest_diff_cmd = subparsers.add_parser(
+        "manifest-diff", help="lista ficheros y lecciones que cambian entre dos manifiestos de dist/"
+    )
+    manifest_diff_cmd.add_argument("old", help="manifiesto de referencia (p. ej. el del ultimo despliegue)")
+    manifest_diff_cmd.add_argument("new", nargs="?", help=f"manifiesto nuevo (por defecto dist/{MANIFEST_NAME})")
+    manifest_diff_cmd.add_argument("--json", action="store_true", help="imprime el delta como JSON")
+    perf_collect = subparsers.add_parser("perf-collect", help="colector local de beacons de rendimiento del navegador")
+    perf_collect.add_argument("--host", default="127.0.0.1")
+    perf_collect.add_argument("--port", type=int, default=8044)
+    perf_collect.add_argument("--output", help=f"fichero JSONL (por defecto dist/{PERF_BEACONS_NAME})")
+    perf_report = subparsers.add_parser("perf-report", help="percentiles por leccion y fase de los beacons recogidos")
+    perf_report.add_argument("--input", help=f"fichero JSONL (por defecto dist/{PERF_BEACONS_NAME})")
+    perf_report.add_argument("--output", help=f"informe JSON (por defecto dist/{PERF_REPORT_NAME})")
+    perf_report.add_argument("--top", type=int, default=5, help="lecciones mas lentas a mostrar por fase")
+    serve_dist = subparsers.add_parser(
+        "serve-dist", help="sirve dist/ y hace de proxy al assistant-bridge en el mismo puerto"
+    )
+    serve_dist.add_argument("--host", default="127.0.0.1")
+    serve_dist.add_argument("--port", type=int, default=8042)
+    serve_dist.add_argument(
+        "--bridge",
+        default=os.environ.get("ASSISTANT_BRIDGE_URL", "http://127.0.0.1:8787"),
+        help="URL del assistant-bridge (por defecto $ASSISTANT_BRIDGE_URL o http://127.0.0.1:8787)",
+    )
+    mermaid_report = subparsers.add_parser(
+        "mermaid-report", help="informe por leccion de la complejidad de los diagramas Mermaid"
+    )
+    mermaid_report.add_argument("--output", help=f"informe JSON (por defecto dist/{MERMAID_REPORT_NAME})")
+    for name, limit in MERMAID_THRESHOLDS.items():
+        mermaid_report.add_argument(
+            f"--max-{name.replace('_', '-')}", type=float if name == "layout_cost" else int, default=limit
+        )
+    mermaid_report.add_argument("--top", type=int, default=10, help="diagramas sobre umbral a mostrar")
+    mermaid_report.add_argument("--strict", action="store_true", help="sale con codigo 1 si algun diagrama excede")
+    args = parser.parse_args(argv)
+
+    ACTIVE_MD_BACKEND = get_markdown_backend(args.md_backend).name
+
+    if args.command == "conformance":
+        print("Comparando backends de Markdown...")
+        return 1 if run_conformance(args.reference, args.candidate, args.fuzz_docs, args.seed, args.max_diffs) else 0
+
+    if args.command == "serve":
+        return serve_preview(BuildConfig(), args.host, args.port, args.cache_size)
+
+    if args.command == "near-duplicates":
+        print("Buscando parrafos casi duplicados...")
+        return run_near_duplicates(
+            BuildConfig(), args.output, args.threshold, args.shingle_words, args.bands, args.rows, args.min_words
+        )
+
+    if args.command == "manifest-diff":
+        return run_manifest_diff(BuildConfig(), args.old, args.new, args.json)
+
+    if args.command == "perf-collect":
+        return serve_perf_collector(BuildConfig(), args.host, args.port, args.output)
+
+    if args.command == "perf-report":
+        print("Agregando beacons de rendimiento...")
+        return run_perf_report(BuildConfig(), args.input, args.output, args.top)
+
+    if args.command == "mermaid-report":
+        print("Analizando diagramas Mermaid...")
+        thresholds = {name: getattr(args, f"max_{name}") for name in MERMAID_THRESHOLDS}
+        return run_mermaid_report(BuildConfig(), args.output, thresholds, args.strict, args.top)
+
+    if args.command == "serve-dist":
+        return serve_same_origin(BuildConfig(), args.host, args.port, args.bridge)
+
     print("Construyendo HTML del curso...")
-    build_html()
+    build_html(
+        dedupe_paragraphs=getattr(args, "dedupe_paragraphs", False),
+        purge_css_rules=not getattr(args, "no_purge_css", False),
+        perf_collector=getattr(args, "perf_collector", ""),
+    )
     print("Listo.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -48,6 +48,5 @@ echo ""
 # Abrir en navegador (macOS)
 open "http://localhost:$PORT/curso-stack-my-architecture.html" 2>/dev/null &
 
-# Servir
-cd "$DIST_DIR"
-python3 -m http.server $PORT
+# Servir dist/ y, en el mismo origen, el proxy al assistant-bridge (si esta arrancado)
+python3 "$SCRIPT_DIR/build-html.py" serve-dist --port $PORT
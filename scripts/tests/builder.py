@@ -0,0 +1,10 @@
+"""Carga scripts/build-html.py como modulo: el nombre con guion no se puede importar."""
+
+import importlib.util
+from pathlib import Path
+
+SCRIPT_PATH = Path(__file__).resolve().parent.parent / "build-html.py"
+
+_spec = importlib.util.spec_from_file_location("build_html", SCRIPT_PATH)
+build_html = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(build_html)
@@ -0,0 +1,65 @@
+"""
+Tests de la purga de CSS de scripts/build-html.py.
+
+    python3 -m unittest discover -s scripts/tests
+"""
+
+import unittest
+
+from builder import build_html as b
+
+
+def used(html="", scripts=()):
+    return b.collect_used_selectors(html, list(scripts))
+
+
+class CollectUsedSelectorsTests(unittest.TestCase):
+    def test_html_tags_classes_and_ids(self):
+        selectors = used('<section id="intro" class="lesson active"><p>x</p></section>')
+        self.assertTrue({"section", "p"} <= selectors["tags"])
+        self.assertTrue({"intro", "lesson", "active"} <= selectors["names"])
+
+    def test_js_counts_string_literals_only(self):
+        selectors = used(scripts=["// layout and paint\nel.classList.add('sma-code-copy-btn'); var zen = 1;"])
+        self.assertIn("sma-code-copy-btn", selectors["names"])
+        self.assertNotIn("layout", selectors["names"])
+        self.assertNotIn("zen", selectors["names"])
+
+    def test_dynamic_classes_are_always_kept(self):
+        selectors = used()
+        self.assertTrue(b.PURGE_DYNAMIC_CLASSES <= selectors["names"])
+        self.assertTrue(b.selector_is_used(".perf-point-over", selectors))
+
+
+class PurgeCssTests(unittest.TestCase):
+    def test_drops_unused_rules_and_reports_them(self):
+        css = ".used { color: red; }\n.unused, .used b { color: blue; }\nhr.lesson-separator { border: 0; }\n"
+        removed = []
+        out = b.purge_css(css, used('<div class="used"><b>x</b></div>'), removed)
+        self.assertIn(".used {", out)
+        self.assertIn(".used b {", out)
+        self.assertNotIn(".unused", out)
+        self.assertEqual(removed, [".unused", "hr.lesson-separator"])
+
+    def test_media_blocks_are_purged_inside_and_dropped_when_empty(self):
+        css = "@media (max-width: 600px) { .used { a: b; } .gone { a: b; } }\n@media print { .gone { a: b; } }\n"
+        out = b.purge_css(css, used('<i class="used"></i>'))
+        self.assertIn("@media (max-width: 600px)", out)
+        self.assertNotIn("@media print", out)
+        self.assertNotIn(".gone", out)
+
+    def test_braces_and_comment_markers_inside_strings(self):
+        css = '.a::before { content: "}"; }\n/* .x { } */\n.b { content: \'/* {\'; }\n.c { color: red; }\n'
+        blocks = b._css_blocks(b.strip_css_comments(css))
+        self.assertEqual([prelude for prelude, _ in blocks], [".a::before", ".b", ".c"])
+        out = b.purge_css(css, used('<i class="a b"></i>'))
+        self.assertIn(".b { content: '/* {'; }", out)
+        self.assertNotIn(".c", out)
+
+    def test_comments_are_stripped_but_strings_kept(self):
+        css = '/* cabecera */\n.a { content: "/* no es comentario */"; }\n'
+        self.assertEqual(b.strip_css_comments(css), '\n.a { content: "/* no es comentario */"; }\n')
+
+
+if __name__ == "__main__":
+    unittest.main()
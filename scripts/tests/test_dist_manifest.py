@@ -0,0 +1,100 @@
+"""
+Tests de la escritura incremental de dist/ y del manifiesto de scripts/build-html.py.
+
+    python3 -m unittest discover -s scripts/tests
+"""
+
+import contextlib
+import io
+import json
+import os
+import shutil
+import tempfile
+import unittest
+from pathlib import Path
+
+from builder import build_html as b
+
+
+class DistWriterTests(unittest.TestCase):
+    def setUp(self):
+        self.out = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, self.out)
+
+    def test_unchanged_file_is_not_rewritten(self):
+        target = self.out / "assets" / "app.js"
+        self.assertTrue(b.DistWriter(self.out).write(target, "console.log(1);\n"))
+        os.utime(target, ns=(1_000_000_000, 1_000_000_000))
+
+        writer = b.DistWriter(self.out)
+        self.assertFalse(writer.write(target, b"console.log(1);\n"))
+        self.assertEqual(target.stat().st_mtime_ns, 1_000_000_000)
+        self.assertEqual((writer.written, writer.unchanged), ([], ["assets/app.js"]))
+
+        self.assertTrue(writer.write(target, "console.log(2);\n"))
+        self.assertEqual(target.read_text(encoding="utf-8"), "console.log(2);\n")
+        self.assertEqual(writer.written, ["assets/app.js"])
+        self.assertEqual(sorted(p.name for p in target.parent.iterdir()), ["app.js"])
+
+    def test_records_hash_and_size_of_every_file(self):
+        writer = b.DistWriter(self.out)
+        writer.write(self.out / "index.html", "hola")
+        self.assertEqual(writer.files, {"index.html": {"sha256": b.content_hash(b"hola"), "size": 4}})
+        self.assertEqual(b.content_hash("hola"), b.content_hash(b"hola"))
+
+
+class ManifestTests(unittest.TestCase):
+    def manifest(self, files, sections):
+        return b.build_manifest({path: {"sha256": b.content_hash(data), "size": len(data)} for path, data in files.items()}, sections)
+
+    def test_build_manifest(self):
+        manifest = self.manifest({"b.css": "b", "a.js": "a"}, [("01-fundamentos/a.md", "<section>a</section>")])
+        self.assertEqual(manifest["version"], b.MANIFEST_VERSION)
+        self.assertEqual(list(manifest["files"]), ["a.js", "b.css"])
+        self.assertEqual(
+            manifest["sections"],
+            {"01-fundamentos/a.md": {"id": "01-fundamentos-a", "sha256": b.content_hash("<section>a</section>")}},
+        )
+
+    def test_manifest_diff(self):
+        old = self.manifest({"a.js": "a", "b.css": "b", "gone.txt": "x"}, [("a.md", "A"), ("b.md", "B")])
+        new = self.manifest({"a.js": "a", "b.css": "B", "new.svg": "s"}, [("a.md", "A2"), ("b.md", "B"), ("c.md", "C")])
+        diff = b.manifest_diff(old, new)
+        self.assertEqual(diff["files"], {"added": ["new.svg"], "removed": ["gone.txt"], "changed": ["b.css"]})
+        self.assertEqual(diff["sections"], {"added": ["c.md"], "removed": [], "changed": ["a.md"]})
+        self.assertFalse(b.diff_is_empty(diff))
+        self.assertTrue(b.diff_is_empty(b.manifest_diff(new, new)))
+
+    def test_first_build_has_everything_added(self):
+        new = self.manifest({"a.js": "a"}, [("a.md", "A")])
+        diff = b.manifest_diff(None, new)
+        self.assertEqual(diff["files"]["added"], ["a.js"])
+        self.assertEqual(diff["sections"]["added"], ["a.md"])
+
+    def test_run_manifest_diff_exit_codes(self):
+        tmp = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, tmp)
+        old, new, bad = tmp / "old.json", tmp / "new.json", tmp / "bad.json"
+        old.write_text(json.dumps(self.manifest({"a.js": "a"}, [("a.md", "A")])), encoding="utf-8")
+        new.write_text(json.dumps(self.manifest({"a.js": "a2"}, [("a.md", "A")])), encoding="utf-8")
+        bad.write_text(json.dumps({"version": 99}), encoding="utf-8")
+        config = b.BuildConfig(course_root=tmp, file_order=[])
+
+        def run(*args, **kwargs):
+            stdout = io.StringIO()
+            with contextlib.redirect_stdout(stdout), contextlib.redirect_stderr(io.StringIO()):
+                code = b.run_manifest_diff(config, *args, **kwargs)
+            return code, stdout.getvalue()
+
+        self.assertEqual(run(old, old)[0], 0)
+        code, output = run(old, new)
+        self.assertEqual(code, 1)
+        self.assertIn("~ a.js", output)
+        code, output = run(old, new, as_json=True)
+        self.assertEqual(json.loads(output)["files"]["changed"], ["a.js"])
+        self.assertEqual(run(old, bad)[0], 2)
+        self.assertEqual(run(tmp / "missing.json", new)[0], 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
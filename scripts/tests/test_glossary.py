@@ -0,0 +1,87 @@
+"""
+Tests del enlazado automatico del glosario (Aho-Corasick) de scripts/build-html.py.
+
+    python3 -m unittest discover -s scripts/tests
+"""
+
+import re
+import unittest
+
+from builder import build_html as b
+
+GLOSSARY_MD = """# Glosario
+
+| Termino | Definicion |
+|---|---|
+| **Caso de uso (Use Case)** | Orquesta el `dominio`. |
+| **Caso** | Situacion "concreta" <de prueba>. |
+| **Actor** | Aisla estado mutable. |
+| **C++** | Lenguaje. |
+"""
+
+
+def linker():
+    return b.GlossaryLinker(b.load_glossary(GLOSSARY_MD, "anexos-glosario"))
+
+
+def linked_terms(html):
+    return re.findall(r'<a class="glossary-link" href="#([^"]+)"', html)
+
+
+class AhoCorasickTests(unittest.TestCase):
+    def test_finds_every_overlapping_key(self):
+        automaton = b.AhoCorasick(["he", "she", "his", "hers"])
+        matches = sorted((start, end, automaton.keys[index]) for start, end, index in automaton.iter_matches("ushers"))
+        self.assertEqual(matches, [(1, 4, "she"), (2, 4, "he"), (2, 6, "hers")])
+
+    def test_token_keys(self):
+        automaton = b.AhoCorasick([("caso", "de", "uso"), ("uso",)])
+        tokens = ["un", "caso", "de", "uso", "y", "otro", "uso"]
+        self.assertEqual(sorted(automaton.iter_matches(tokens)), [(1, 4, 0), (3, 4, 1), (6, 7, 1)])
+
+
+class LoadGlossaryTests(unittest.TestCase):
+    def test_entries_aliases_and_escaped_definitions(self):
+        entries = b.load_glossary(GLOSSARY_MD, "anexos-glosario")
+        self.assertEqual([term for term, _, _, _ in entries], ["Caso de uso (Use Case)", "Caso", "Actor", "C++"])
+        term, aliases, anchor, definition = entries[0]
+        self.assertEqual(aliases, ["Caso de uso (Use Case)", "Caso de uso", "Use Case"])
+        self.assertEqual(anchor, "anexos-glosario-term-caso-de-uso-use-case")
+        self.assertEqual(definition, "Orquesta el dominio.")
+        self.assertEqual(entries[1][3], "Situacion &quot;concreta&quot; &lt;de prueba>.")
+
+    def test_anchors_are_added_to_the_rendered_table(self):
+        entries = b.load_glossary(GLOSSARY_MD, "anexos-glosario")
+        html = b.add_glossary_anchors(b.line_md_to_html(GLOSSARY_MD, "anexos-glosario"), entries)
+        self.assertIn('<tr id="anexos-glosario-term-actor">\n  <td><strong>Actor</strong></td>', html)
+
+
+class GlossaryLinkerTests(unittest.TestCase):
+    def test_matches_only_whole_words(self):
+        html = linker().link_lesson("<p>Los actores y los casos no son terminos; el Actor si.</p>")
+        self.assertEqual(linked_terms(html), ["anexos-glosario-term-actor"])
+        self.assertIn(">Actor</a> si.", html)
+
+    def test_prefers_the_longest_term_and_links_each_term_once(self):
+        html = linker().link_lesson("<p>Un caso de uso es un caso.</p><li>Otro caso de uso, otro Use Case.</li>")
+        self.assertEqual(linked_terms(html), ["anexos-glosario-term-caso-de-uso-use-case", "anexos-glosario-term-caso"])
+        self.assertIn(">caso de uso</a> es un", html)
+
+    def test_symbols_are_part_of_the_term(self):
+        html = linker().link_lesson("<p>C y C++ no son lo mismo.</p>")
+        self.assertIn('title="Lenguaje.">C++</a>', html)
+        self.assertEqual(linked_terms(html), ["anexos-glosario-term-c"])
+
+    def test_skips_code_links_and_headings(self):
+        source = (
+            '<h2 id="actor">Actor</h2>\n'
+            "<p><code>actor</code> y <a href=\"#x\">un actor</a>.</p>\n"
+            "<pre><code>caso de uso</code></pre>"
+        )
+        glossary = linker()
+        self.assertEqual(glossary.link_lesson(source), source)
+        self.assertEqual(glossary.links, 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,101 @@
+"""
+Tests de la reescritura de enlaces .md entre lecciones de scripts/build-html.py.
+
+    python3 -m unittest discover -s scripts/tests
+"""
+
+import contextlib
+import io
+import json
+import shutil
+import tempfile
+import unittest
+from pathlib import Path
+
+from builder import build_html as b
+
+LESSON_A = """# Introducción
+
+Ver [la capa de dominio](../02-integracion/b.md#1-domain-layer), [la lección](../02-integracion/b.md),
+[el inicio](#introducción), [fuera](../03-evolucion/c.md), [nada](../02-integracion/nada.md)
+y [un titulo roto](../02-integracion/b.md#no-existe).
+"""
+
+LESSON_B = """# Integración
+
+## 1. Domain layer
+
+Vuelve a la [introducción](../01-fundamentos/a.md#introducción) o a [la web](https://example.com/x.md).
+"""
+
+
+def render_sections(lessons):
+    return [(path, b.line_md_to_html(content, b.file_id_for(path))) for path, content in lessons]
+
+
+class AnchorKeyTests(unittest.TestCase):
+    def test_github_slugs_and_generated_ids_share_a_key(self):
+        self.assertEqual(b.anchor_key("introducci%C3%B3n"), b.anchor_key("Introducción"))
+        self.assertEqual(b.anchor_key("1-domain-layer"), b.anchor_key("1. Domain layer"))
+
+
+class LessonLinkIndexTests(unittest.TestCase):
+    def setUp(self):
+        self.root = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, self.root)
+        (self.root / "03-evolucion").mkdir()
+        (self.root / "03-evolucion" / "c.md").write_text("# C\n", encoding="utf-8")
+        self.sections = render_sections([("01-fundamentos/a.md", LESSON_A), ("02-integracion/b.md", LESSON_B)])
+        self.index = b.LessonLinkIndex(self.sections, self.root)
+
+    def test_known_links_are_rewritten_to_lesson_and_heading_anchors(self):
+        html = self.index.rewrite(*self.sections[0])
+        self.assertIn('<a href="#02-integracion-b-1-domain-layer">la capa de dominio</a>', html)
+        self.assertIn('<a href="#02-integracion-b">la lección</a>', html)
+        self.assertNotIn('href="../02-integracion/b.md', html)
+
+        html = self.index.rewrite(*self.sections[1])
+        self.assertIn('<a href="#01-fundamentos-a-introducci-n">introducción</a>', html)
+        self.assertIn('<a href="https://example.com/x.md">', html)
+
+    def test_in_page_anchors_are_left_alone(self):
+        html = self.index.rewrite(*self.sections[0])
+        self.assertIn('<a href="#introducción">el inicio</a>', html)
+
+    def test_unresolved_links_are_reported_with_a_reason(self):
+        html = self.index.rewrite(*self.sections[0])
+        self.assertEqual(self.index.rewritten, 3)
+        self.assertEqual(
+            self.index.unresolved,
+            [
+                {"file": "01-fundamentos/a.md", "href": "../03-evolucion/c.md", "reason": "leccion fuera del build"},
+                {"file": "01-fundamentos/a.md", "href": "../02-integracion/nada.md", "reason": "fichero inexistente"},
+                {"file": "01-fundamentos/a.md", "href": "../02-integracion/b.md#no-existe", "reason": "titulo no encontrado"},
+            ],
+        )
+        # Un titulo que no existe cae en la leccion; un fichero desconocido no se toca.
+        self.assertIn('<a href="#02-integracion-b">un titulo roto</a>', html)
+        self.assertIn('<a href="../03-evolucion/c.md">fuera</a>', html)
+
+
+class BuildReportTests(unittest.TestCase):
+    def test_build_writes_the_unresolved_links_report(self):
+        root = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, root)
+        for path, content in (("01-fundamentos/a.md", LESSON_A), ("02-integracion/b.md", LESSON_B)):
+            (root / path).parent.mkdir(parents=True, exist_ok=True)
+            (root / path).write_text(content, encoding="utf-8")
+        (root / "scripts").mkdir()
+        config = b.BuildConfig(course_root=root, file_order=["01-fundamentos/a.md", "02-integracion/b.md"])
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            b.build_html(config, purge_css_rules=False)
+
+        report = json.loads((config.output_dir / "unresolved-links.json").read_text(encoding="utf-8"))
+        self.assertEqual([item["reason"] for item in report], ["fichero inexistente", "fichero inexistente", "titulo no encontrado"])
+        html = config.output_file.read_text(encoding="utf-8")
+        self.assertIn('href="#02-integracion-b-1-domain-layer"', html)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,117 @@
+"""
+Tests de los backends de Markdown de scripts/build-html.py y de su arnes de conformidad.
+
+    python3 -m unittest discover -s scripts/tests
+"""
+
+import contextlib
+import io
+import random
+import shutil
+import tempfile
+import unittest
+from pathlib import Path
+
+from builder import build_html as b
+
+SAMPLE = """# Titulo
+
+Texto con **negrita**, *enfasis* y `code`.
+
+- uno
+- dos
+
+1. primero
+2) segundo
+
+```swift
+let a = 1 < 2
+```
+
+| a | b |
+|---|---|
+| 1 | 2 |
+
+---
+
+```mermaid
+graph TD
+A --> B
+```
+"""
+
+
+class MarkdownBackendTests(unittest.TestCase):
+    def test_registry_and_unknown_backend(self):
+        self.assertEqual(set(b.MARKDOWN_BACKENDS), {"line", "fast"})
+        for name, backend in b.MARKDOWN_BACKENDS.items():
+            self.assertIsInstance(backend, b.MarkdownBackend)
+            self.assertIs(b.get_markdown_backend(name), backend)
+        with self.assertRaises(SystemExit):
+            b.get_markdown_backend("commonmark")
+
+    def test_reference_output(self):
+        html = b.get_markdown_backend("line").render(SAMPLE, "x")
+        self.assertIn('<h1 id="x-titulo">Titulo</h1>', html)
+        self.assertIn("<strong>negrita</strong>", html)
+        self.assertIn('<pre><code class="language-swift">let a = 1 &lt; 2</code></pre>', html)
+        self.assertIn("<th>a</th>", html)
+        self.assertIn("<td>2</td>", html)
+
+    def test_fast_matches_line_on_sample_and_fuzz_corpus(self):
+        line, fast = b.get_markdown_backend("line"), b.get_markdown_backend("fast")
+        rng = random.Random(7)
+        docs = [("sample", SAMPLE)] + [(f"fuzz-{i}", b.fuzz_markdown(rng)) for i in range(150)]
+        for doc_id, text in docs:
+            with self.subTest(doc_id=doc_id):
+                self.assertEqual(b.normalize_html(fast.render(text, doc_id)), b.normalize_html(line.render(text, doc_id)))
+
+    def test_fast_nav_matches_line_nav(self):
+        files = [("01-fundamentos/a.md", "# A\n"), ("02-integracion/b.md", "texto\n# B\n"), ("anexos/glosario.md", "# Glosario\n")]
+        self.assertEqual(
+            b.normalize_html(b.get_markdown_backend("fast").nav(files)),
+            b.normalize_html(b.get_markdown_backend("line").nav(files)),
+        )
+
+    def test_normalize_html_ignores_whitespace_between_tags(self):
+        self.assertEqual(b.normalize_html("<ul>\n  <li>a  b</li>\n</ul>\n"), "<ul><li>a b</li></ul>")
+
+
+class ConformanceHarnessTests(unittest.TestCase):
+    def setUp(self):
+        self.root = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, self.root)
+        (self.root / "01-fundamentos").mkdir()
+        (self.root / "01-fundamentos" / "a.md").write_text(SAMPLE, encoding="utf-8")
+        self.config = b.BuildConfig(course_root=self.root, file_order=["01-fundamentos/a.md"])
+
+    def run_conformance(self, candidate):
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            mismatches = b.run_conformance("line", candidate, 20, 1, 5, self.config)
+        return mismatches, output.getvalue()
+
+    def test_line_and_fast_conform(self):
+        mismatches, output = self.run_conformance("fast")
+        self.assertEqual(mismatches, 0)
+        self.assertIn("1 lecciones, 20 docs fuzz", output)
+
+    def test_a_diverging_backend_is_reported(self):
+        class BrokenBackend(b.MarkdownBackend):
+            name = "broken"
+
+            def render(self, md_text, file_id):
+                return b.line_md_to_html(md_text, file_id).replace("<strong>", "<b>")
+
+            def nav(self, files_content):
+                return b.line_build_nav(files_content)
+
+        self.addCleanup(b.MARKDOWN_BACKENDS.pop, "broken")
+        b.MARKDOWN_BACKENDS["broken"] = BrokenBackend()
+        mismatches, output = self.run_conformance("broken")
+        self.assertGreaterEqual(mismatches, 1)
+        self.assertIn("[DIFF] curso: 01-fundamentos-a", output)
+
+
+if __name__ == "__main__":
+    unittest.main()
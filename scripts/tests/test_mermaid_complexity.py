@@ -0,0 +1,121 @@
+"""
+Tests del analizador de complejidad de diagramas Mermaid de scripts/build-html.py.
+
+    python3 -m unittest discover -s scripts/tests
+"""
+
+import unittest
+
+from builder import build_html as b
+
+FLOWCHART = """graph TD
+  A[Inicio] --> B{Decision}
+  B -->|si| C["Caso de uso"]
+  B -- no --> D((Fin))
+  subgraph Domain [Dominio]
+    C --> E[Entidad]
+  end
+  %% comentario
+  style A fill:#fff
+  C & D --> F; F --> A
+"""
+
+SEQUENCE = """sequenceDiagram
+  participant V as Vista
+  actor U
+  U->>V: toca
+  V-->>U: pinta
+  loop cada segundo
+    V->>V: refresca
+  end
+  Note over V: nota
+"""
+
+CLASS = """classDiagram
+  class Repo {
+    <<protocol>>
+    +fetch() Item
+  }
+  class Cache
+  Repo <|-- Cache : implementa
+  Repo "1" --> "*" Item
+  Cache : +clear()
+"""
+
+STATE = """stateDiagram-v2
+  [*] --> Idle
+  Idle --> Loading : fetch
+  state Loading {
+    [*] --> Waiting
+    Waiting --> [*]
+  }
+  Loading --> Idle : done
+  Idle : esperando
+"""
+
+
+def counts(source):
+    metrics = b.analyze_mermaid(source)
+    return {key: metrics[key] for key in ("kind", "nodes", "edges", "subgraphs", "labels")}
+
+
+class DiagramCountsTests(unittest.TestCase):
+    def test_flowchart(self):
+        self.assertEqual(counts(FLOWCHART), {"kind": "flowchart", "nodes": 6, "edges": 7, "subgraphs": 1, "labels": 8})
+
+    def test_sequence(self):
+        self.assertEqual(counts(SEQUENCE), {"kind": "sequence", "nodes": 2, "edges": 3, "subgraphs": 1, "labels": 6})
+
+    def test_class(self):
+        self.assertEqual(counts(CLASS), {"kind": "class", "nodes": 3, "edges": 2, "subgraphs": 0, "labels": 4})
+
+    def test_state(self):
+        # [*] es inicio/fin, no un estado; el compuesto Loading cuenta como grupo.
+        self.assertEqual(counts(STATE), {"kind": "state", "nodes": 3, "edges": 5, "subgraphs": 1, "labels": 3})
+
+    def test_unknown_kind_is_not_flagged(self):
+        metrics = b.analyze_mermaid('pie title Mascotas\n  "Perros" : 3\n  "Gatos" : 2\n')
+        self.assertEqual(metrics["kind"], "pie")
+        self.assertEqual((metrics["statements"], metrics["layout_cost"], metrics["flags"]), (2, 2.0, []))
+
+
+class LayoutCostAndFlagsTests(unittest.TestCase):
+    def test_layout_cost(self):
+        self.assertEqual(b.mermaid_layout_cost("sequence", 2, 3, 1, 6), 18)
+        self.assertAlmostEqual(b.mermaid_layout_cost("flowchart", 6, 7, 1, 8), 76.0)
+        self.assertLess(b.mermaid_layout_cost("flowchart", 10, 10, 0, 0), b.mermaid_layout_cost("flowchart", 10, 10, 1, 0))
+
+    def test_large_flowchart_is_flagged_with_a_split_suggestion(self):
+        chain = "\n".join(f"  N{i} --> N{i + 1}" for i in range(40))
+        metrics = b.analyze_mermaid(f"graph LR\n{chain}\n")
+        self.assertEqual((metrics["nodes"], metrics["edges"]), (41, 40))
+        self.assertIn("nodes", metrics["flags"])
+        self.assertTrue(metrics["suggestions"][0].startswith("Dividir en 2 diagramas"))
+
+    def test_long_labels_are_flagged(self):
+        metrics = b.analyze_mermaid(f"graph TD\n  A[{'x' * 90}] --> B[corto<br/>{'y' * 50}]\n")
+        self.assertEqual(metrics["flags"], ["label_chars"])
+        self.assertEqual(metrics["max_label_chars"], 90)
+        self.assertIn("(A)", metrics["suggestions"][0])
+
+    def test_custom_thresholds(self):
+        metrics = b.analyze_mermaid(SEQUENCE, {**b.MERMAID_THRESHOLDS, "edges": 2})
+        self.assertEqual(metrics["flags"], ["edges"])
+        self.assertIn("Separar en varios sequenceDiagram", metrics["suggestions"][0])
+
+
+class ReportTests(unittest.TestCase):
+    def test_blocks_and_report_per_lesson(self):
+        lesson = f"# Leccion\n\n```mermaid\n{FLOWCHART}```\n\n```swift\nlet a = 1\n```\n\n```mermaid\n{STATE}```\n"
+        self.assertEqual([line for line, _ in b.mermaid_blocks(lesson)], [3, 20])
+
+        report = b.analyze_mermaid_files([("a.md", lesson), ("b.md", "# Sin diagramas\n")], {"edges": 6})
+        self.assertEqual((report["diagrams"], report["lessons_with_diagrams"], report["flagged"]), (2, 1, 1))
+        self.assertEqual(report["kinds"], {"flowchart": 1, "state": 1})
+        self.assertEqual(report["thresholds"]["edges"], 6)
+        flagged = b.flagged_mermaid_diagrams(report)
+        self.assertEqual([(path, item["kind"]) for path, item in flagged], [("a.md", "flowchart")])
+
+
+if __name__ == "__main__":
+    unittest.main()
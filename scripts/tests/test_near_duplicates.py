@@ -0,0 +1,98 @@
+"""
+Tests de la deteccion de parrafos casi duplicados (MinHash + LSH) de scripts/build-html.py.
+
+    python3 -m unittest discover -s scripts/tests
+"""
+
+import random
+import shutil
+import tempfile
+import unittest
+from pathlib import Path
+
+from builder import build_html as b
+
+WORDS = ("dominio caso uso puerto adaptador entidad repositorio cache vista modelo estado red actor "
+         "prueba contrato capa flujo error datos sesion").split()
+
+
+def paragraph(seed, words=60):
+    rng = random.Random(seed)
+    return " ".join(rng.choice(WORDS) + str(rng.randint(0, 99)) for _ in range(words))
+
+
+class ParagraphsAndShinglesTests(unittest.TestCase):
+    def test_markdown_paragraphs_skip_code_headings_and_rules(self):
+        md = "# Titulo\nuno\ndos\n\n```swift\nlet a = 1\n```\ntres\n---\n## Otro\ncuatro\n"
+        self.assertEqual(b.markdown_paragraphs(md), [(2, "uno\ndos"), (8, "tres"), (11, "cuatro")])
+
+    def test_word_shingles(self):
+        words = "a b c d e f".split()
+        self.assertEqual(len(b.word_shingles(words, 5)), 2)
+        self.assertEqual(len(b.word_shingles(words[:3], 5)), 1)
+        self.assertEqual(b.word_shingles(words, 5), b.word_shingles(list(words), 5))
+
+
+class MinHashLshTests(unittest.TestCase):
+    def test_signatures_are_reproducible_and_estimate_jaccard(self):
+        a = set(range(0, 300))
+        c = set(range(100, 400))  # Jaccard 200/400 = 0.5
+        shingles_a = b.word_shingles([str(x) for x in sorted(a)], 1)
+        shingles_c = b.word_shingles([str(x) for x in sorted(c)], 1)
+        hasher = b.MinHasher(256, seed=3)
+        sig_a, sig_c = hasher.signature(shingles_a), hasher.signature(shingles_c)
+        self.assertEqual(sig_a, b.MinHasher(256, seed=3).signature(shingles_a))
+        self.assertNotEqual(sig_a, b.MinHasher(256, seed=4).signature(shingles_a))
+        agreement = sum(x == y for x, y in zip(sig_a, sig_c)) / len(sig_a)
+        self.assertAlmostEqual(agreement, 0.5, delta=0.12)
+
+    def test_lsh_pairs_share_at_least_one_band(self):
+        signatures = [[1, 2, 3, 4], [1, 2, 9, 9], [7, 7, 3, 4], [8, 8, 8, 8]]
+        self.assertEqual(b.lsh_candidate_pairs(signatures, bands=2, rows=2), {(0, 1), (0, 2)})
+
+
+class FindNearDuplicatesTests(unittest.TestCase):
+    def test_clusters_near_and_exact_copies_only(self):
+        original = paragraph(1)
+        edited = original.rsplit(" ", 1)[0] + " final"
+        docs = [
+            ("a.md", f"# A\n\n{original}\n\n{paragraph(2)}\n"),
+            ("b.md", f"# B\n\n{edited}\n\ncorto y repetido\n"),
+            ("c.md", f"Intro\n\n{original}\n\ncorto y repetido\n"),
+        ]
+        report = b.find_near_duplicates(docs)
+        self.assertEqual(report["paragraphs"], 4)
+        self.assertEqual(report["clusters_total"], 1)
+        cluster = report["clusters"][0]
+        self.assertEqual([(m["file"], m["line"]) for m in cluster["members"]], [("a.md", 3), ("b.md", 3), ("c.md", 3)])
+        self.assertFalse(cluster["exact"])
+        self.assertGreaterEqual(cluster["min_similarity"], b.NEAR_DUP_THRESHOLD)
+        sizes = [m["bytes"] for m in cluster["members"]]
+        self.assertEqual(cluster["redundant_bytes"], sum(sizes) - max(sizes))
+        self.assertEqual(report["redundant_bytes"], cluster["redundant_bytes"])
+
+    def test_exact_copies_are_marked_and_threshold_applies(self):
+        text = paragraph(5)
+        docs = [("a.md", text), ("b.md", text.upper())]
+        report = b.find_near_duplicates(docs)
+        self.assertEqual(report["exact_clusters"], 1)
+        self.assertEqual(report["clusters"][0]["min_similarity"], 1.0)
+
+        rewritten = " ".join(paragraph(5).split()[:30] + paragraph(6).split()[:30])
+        report = b.find_near_duplicates([("a.md", text), ("b.md", rewritten)])
+        self.assertEqual(report["clusters_total"], 0)
+
+
+class CourseFilesTests(unittest.TestCase):
+    def test_skips_dist_hidden_and_node_modules(self):
+        root = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, root)
+        for rel_path in ("a.md", "01/b.md", "dist/c.md", ".git/d.md", "x/node_modules/e.md", "01/f.txt"):
+            (root / rel_path).parent.mkdir(parents=True, exist_ok=True)
+            (root / rel_path).write_text("# x\n", encoding="utf-8")
+        config = b.BuildConfig(course_root=root, file_order=[])
+        self.assertEqual(b.course_markdown_files(config), ["01/b.md", "a.md"])
+
+
+if __name__ == "__main__":
+    unittest.main()
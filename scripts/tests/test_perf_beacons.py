@@ -0,0 +1,55 @@
+"""
+Tests del informe de beacons de rendimiento (perf-report) de scripts/build-html.py.
+
+    python3 -m unittest discover -s scripts/tests
+"""
+
+import json
+import unittest
+
+from builder import build_html as b
+
+
+def beacon(*entries):
+    return json.dumps({"page": "/", "entries": list(entries)})
+
+
+class AggregatePerfBeaconsTests(unittest.TestCase):
+    def test_groups_by_phase_and_lesson(self):
+        lines = [
+            beacon({"phase": "mermaid", "duration": 10, "section": "intro"}),
+            beacon({"phase": "mermaid", "duration": 30}, {"phase": "highlight", "duration": 4.5, "section": "intro"}),
+        ]
+        report = b.aggregate_perf_beacons(lines, {"intro": "00-intro.md"})
+        self.assertEqual((report["beacons"], report["invalid_lines"], report["measures"]), (2, 0, 3))
+        self.assertEqual(report["phases"]["mermaid"]["count"], 2)
+        self.assertEqual(report["phases"]["mermaid"]["max"], 30)
+        self.assertEqual(report["lessons"]["intro"]["path"], "00-intro.md")
+        self.assertEqual(sorted(report["lessons"]["intro"]["phases"]), ["highlight", "mermaid"])
+
+    def test_lines_without_an_entries_list_are_invalid(self):
+        lines = ["no json", '{"page": "/"}', '{"entries": {"phase": "x"}}', '{"entries": "abc"}', "[]", "", beacon()]
+        report = b.aggregate_perf_beacons(lines, {})
+        self.assertEqual(report["invalid_lines"], 5)
+        self.assertEqual(report["beacons"], 1)
+        self.assertEqual(report["measures"], 0)
+
+    def test_ignores_non_numeric_negative_and_non_finite_durations(self):
+        line = beacon(
+            {"phase": "mermaid", "duration": True},
+            {"phase": "mermaid", "duration": False},
+            {"phase": "mermaid", "duration": "12"},
+            {"phase": "mermaid", "duration": -1},
+            {"phase": 3, "duration": 5},
+            "mermaid",
+            {"phase": "mermaid", "duration": float("nan")},
+            {"phase": "mermaid", "duration": float("inf")},
+            {"phase": "mermaid", "duration": 7},
+        )
+        report = b.aggregate_perf_beacons([line], {})
+        self.assertEqual(report["measures"], 1)
+        self.assertEqual(report["phases"]["mermaid"]["max"], 7)
+
+
+if __name__ == "__main__":
+    unittest.main()
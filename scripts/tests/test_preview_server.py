@@ -0,0 +1,149 @@
+"""
+Tests del servidor de previsualizacion bajo demanda (serve) de scripts/build-html.py.
+
+    python3 -m unittest discover -s scripts/tests
+"""
+
+import contextlib
+import http.client
+import io
+import json
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+from http.server import ThreadingHTTPServer
+from pathlib import Path
+
+from builder import build_html as b
+
+
+class LessonCacheTests(unittest.TestCase):
+    def setUp(self):
+        self.cache = b.LessonCache(max_entries=2)
+        self.renders = []
+
+    def get(self, key, stat, content, deps=("line",)):
+        def render(text):
+            self.renders.append(key)
+            return f"<section>{text}</section>"
+
+        return self.cache.get(key, stat, deps, lambda: content, render)
+
+    def test_hit_revalidated_and_miss(self):
+        self.assertEqual(self.get("a.md", (1, 3), "uno"), ("<section>uno</section>", "miss"))
+        self.assertEqual(self.get("a.md", (1, 3), "uno")[1], "hit")
+        # Nuevo mtime con el mismo contenido: no se vuelve a renderizar.
+        self.assertEqual(self.get("a.md", (2, 3), "uno")[1], "revalidated")
+        self.assertEqual(self.get("a.md", (2, 3), "uno")[1], "hit")
+        self.assertEqual(self.get("a.md", (3, 3), "dos"), ("<section>dos</section>", "miss"))
+        self.assertEqual(self.get("a.md", (3, 3), "dos", deps=("fast",))[1], "miss")
+        self.assertEqual(self.renders, ["a.md", "a.md", "a.md"])
+
+    def test_least_recently_used_entry_is_evicted(self):
+        self.get("a.md", (1, 1), "a")
+        self.get("b.md", (1, 1), "b")
+        self.get("a.md", (1, 1), "a")
+        self.get("c.md", (1, 1), "c")
+        self.assertEqual(list(self.cache.entries), ["a.md", "c.md"])
+        self.assertEqual(self.get("b.md", (1, 1), "b")[1], "miss")
+        stats = self.cache.stats()
+        self.assertEqual((stats["entries"], stats["evictions"], stats["hits"], stats["misses"]), (2, 2, 1, 4))
+
+
+class PreviewServerTests(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.root = Path(tempfile.mkdtemp())
+        for rel_path, content in (
+            ("01-fundamentos/a.md", "# Leccion A\n\nVer [B](../02-integracion/b.md).\n"),
+            ("02-integracion/b.md", "# Leccion B\n\nTexto.\n"),
+            ("assets/study-ux.css", "body { margin: 0; }\n"),
+            ("scripts/secreto.txt", "no se sirve\n"),
+        ):
+            (cls.root / rel_path).parent.mkdir(parents=True, exist_ok=True)
+            (cls.root / rel_path).write_text(content, encoding="utf-8")
+        config = b.BuildConfig(course_root=cls.root, file_order=["01-fundamentos/a.md", "02-integracion/b.md"])
+        cls.preview = b.CoursePreview(config, cache_size=4)
+        cls.server = ThreadingHTTPServer(("127.0.0.1", 0), b.make_preview_handler(cls.preview))
+        # El handler imprime una linea por peticion.
+        cls.quiet = contextlib.redirect_stdout(io.StringIO())
+        cls.quiet.__enter__()
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+        cls.quiet.__exit__(None, None, None)
+        shutil.rmtree(cls.root)
+
+    def fetch(self, path):
+        conn = http.client.HTTPConnection("127.0.0.1", self.server.server_port, timeout=5)
+        self.addCleanup(conn.close)
+        conn.request("GET", path)
+        response = conn.getresponse()
+        return response, response.read().decode("utf-8")
+
+    def test_index_has_empty_sections_pointing_to_lesson_urls(self):
+        response, body = self.fetch("/")
+        self.assertEqual(response.status, 200)
+        self.assertIn('data-preview-src="/__lesson/01-fundamentos-a"></section>', body)
+        self.assertIn('href="#02-integracion-b">Leccion B</a>', body)
+
+    def test_lessons_render_once_and_follow_file_changes(self):
+        lesson = self.root / "02-integracion" / "b.md"
+        response, body = self.fetch("/__lesson/02-integracion-b")
+        self.assertEqual(response.status, 200)
+        self.assertIn("Leccion B", body)
+        self.assertEqual(response.getheader("X-Lesson-Cache"), "miss")
+        self.assertEqual(self.fetch("/__lesson/02-integracion-b")[0].getheader("X-Lesson-Cache"), "hit")
+
+        stat = lesson.stat()
+        os.utime(lesson, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+        self.assertEqual(self.fetch("/__lesson/02-integracion-b")[0].getheader("X-Lesson-Cache"), "revalidated")
+
+        lesson.write_text("# Leccion B\n\nTexto nuevo.\n", encoding="utf-8")
+        os.utime(lesson, ns=(stat.st_atime_ns, stat.st_mtime_ns + 2_000_000_000))
+        response, body = self.fetch("/__lesson/02-integracion-b")
+        self.assertEqual(response.getheader("X-Lesson-Cache"), "miss")
+        self.assertIn("Texto nuevo.", body)
+
+    def test_lesson_links_are_rewritten(self):
+        _, body = self.fetch("/__lesson/01-fundamentos-a")
+        self.assertIn('<a href="#02-integracion-b">B</a>', body)
+
+    def test_stats(self):
+        self.fetch("/__lesson/01-fundamentos-a")
+        response, body = self.fetch("/__stats")
+        self.assertEqual(response.status, 200)
+        stats = json.loads(body)["lesson_cache"]
+        self.assertEqual(stats["max_entries"], 4)
+        self.assertGreaterEqual(stats["entries"], 1)
+
+    def test_assets_are_served(self):
+        response, body = self.fetch("/assets/study-ux.css")
+        self.assertEqual(response.status, 200)
+        self.assertTrue(response.getheader("Content-Type").startswith("text/css"))
+        self.assertEqual(body, "body { margin: 0; }\n")
+
+    def test_unknown_lessons_and_path_traversal_are_404(self):
+        for path in (
+            "/__lesson/no-existe",
+            "/__lesson/../scripts/secreto",
+            "/assets/../scripts/secreto.txt",
+            "/assets/../../etc/passwd",
+            "/assets/..%2Fscripts%2Fsecreto.txt",
+            "/assets/%2e%2e/scripts/secreto.txt",
+            "/assets/",
+            "/scripts/secreto.txt",
+        ):
+            with self.subTest(path=path):
+                response, body = self.fetch(path)
+                self.assertEqual(response.status, 404)
+                self.assertNotIn("no se sirve", body)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,141 @@
+"""
+Tests del proxy mismo origen (serve-same-origin) de scripts/build-html.py contra un bridge simulado.
+
+    python3 -m unittest discover -s scripts/tests
+"""
+
+import http.client
+import shutil
+import tempfile
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+from builder import build_html as b
+
+
+class FakeBridgeHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        if self.path == "/health":
+            body = b'{"ok":true}'
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            if self.command != "HEAD":
+                self.wfile.write(body)
+        elif self.path == "/config":
+            self.send_response(304)
+            self.send_header("ETag", '"v1"')
+            self.end_headers()
+        elif self.path == "/metrics":
+            # Sin Content-Length: el proxy lo reenvia como streaming.
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Connection", "close")
+            self.end_headers()
+            self.wfile.write(b"data: uno\n\n")
+            self.close_connection = True
+        else:
+            self.send_error(404)
+
+    do_HEAD = do_GET
+
+    def do_OPTIONS(self):
+        self.send_response(204)
+        self.send_header("Access-Control-Allow-Methods", "GET, POST")
+        self.end_headers()
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve(server):
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server
+
+
+class SameOriginProxyTests(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.tmp = Path(tempfile.mkdtemp())
+        (cls.tmp / "curso.html").write_text("<html><head><title>x</title></head></html>", encoding="utf-8")
+        cls.bridge_server = serve(ThreadingHTTPServer(("127.0.0.1", 0), FakeBridgeHandler))
+        bridge = b.BridgeConnections(f"http://127.0.0.1:{cls.bridge_server.server_port}")
+        config = b.BuildConfig(course_root=cls.tmp, output_dir=cls.tmp, output_name="curso.html", file_order=[])
+        cls.proxy_server = serve(ThreadingHTTPServer(("127.0.0.1", 0), b.make_same_origin_handler(config, bridge)))
+
+    @classmethod
+    def tearDownClass(cls):
+        for server in (cls.proxy_server, cls.bridge_server):
+            server.shutdown()
+            server.server_close()
+        shutil.rmtree(cls.tmp)
+
+    def setUp(self):
+        self.conn = http.client.HTTPConnection("127.0.0.1", self.proxy_server.server_port, timeout=5)
+        self.addCleanup(self.conn.close)
+
+    def fetch(self, method, path):
+        self.conn.request(method, path)
+        response = self.conn.getresponse()
+        return response, response.read()
+
+    def raw_headers(self, method, path):
+        # http.client oculta el framing: se leen las cabeceras tal como llegan.
+        conn = http.client.HTTPConnection("127.0.0.1", self.proxy_server.server_port, timeout=5)
+        self.addCleanup(conn.close)
+        conn.request(method, path)
+        response = conn.getresponse()
+        headers = {name.lower(): value for name, value in response.getheaders()}
+        response.read()
+        return response.status, headers
+
+    def test_head_is_proxied_without_body(self):
+        status, headers = self.raw_headers("HEAD", "/health")
+        self.assertEqual(status, 200)
+        self.assertEqual(headers["content-length"], "11")
+        self.assertNotIn("transfer-encoding", headers)
+        # La conexion sigue sirviendo: no quedo un cuerpo a medias en el socket.
+        response, body = self.fetch("HEAD", "/health")
+        self.assertEqual((response.status, body), (200, b""))
+        response, body = self.fetch("GET", "/health")
+        self.assertEqual((response.status, body), (200, b'{"ok":true}'))
+
+    def test_204_and_304_have_no_body_or_chunked_framing(self):
+        status, headers = self.raw_headers("OPTIONS", "/ask")
+        self.assertEqual(status, 204)
+        self.assertNotIn("transfer-encoding", headers)
+        self.assertNotIn("content-length", headers)
+        self.assertEqual(headers["access-control-allow-methods"], "GET, POST")
+
+        status, headers = self.raw_headers("GET", "/config")
+        self.assertEqual(status, 304)
+        self.assertNotIn("transfer-encoding", headers)
+        self.assertEqual(headers["etag"], '"v1"')
+
+        for method, path, expected in (("OPTIONS", "/ask", 204), ("GET", "/config", 304), ("GET", "/health", 200)):
+            response, _ = self.fetch(method, path)
+            self.assertEqual(response.status, expected)
+
+    def test_streaming_responses_are_still_chunked(self):
+        status, headers = self.raw_headers("GET", "/metrics")
+        self.assertEqual(status, 200)
+        self.assertEqual(headers["transfer-encoding"], "chunked")
+        response, body = self.fetch("GET", "/metrics")
+        self.assertEqual(body, b"data: uno\n\n")
+
+    def test_head_of_the_course_html_matches_get(self):
+        head, head_body = self.fetch("HEAD", "/curso.html")
+        get, get_body = self.fetch("GET", "/curso.html")
+        self.assertEqual(head_body, b"")
+        self.assertEqual(head.getheader("Content-Length"), str(len(get_body)))
+        self.assertIn(b"sma-assistant-proxy", get_body)
+
+
+if __name__ == "__main__":
+    unittest.main()
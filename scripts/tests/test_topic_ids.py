@@ -0,0 +1,49 @@
+"""
+Tests de los ids numericos de leccion (scripts/topic-ids.json) de scripts/build-html.py.
+
+    python3 -m unittest discover -s scripts/tests
+"""
+
+import json
+import shutil
+import tempfile
+import unittest
+from pathlib import Path
+
+from builder import build_html as b
+
+
+class AssignTopicNumsTests(unittest.TestCase):
+    def setUp(self):
+        self.root = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, self.root)
+        (self.root / "scripts").mkdir()
+        self.config = b.BuildConfig(course_root=self.root, file_order=[])
+        self.path = self.config.topic_ids_file
+
+    def test_new_lessons_get_the_next_free_id(self):
+        nums = b.assign_topic_nums(self.config, ["a.md", "b.md"])
+        self.assertEqual(nums, {"a.md": 1, "b.md": 2})
+        nums = b.assign_topic_nums(self.config, ["c.md", "a.md"])
+        self.assertEqual(nums, {"c.md": 3, "a.md": 1})
+        data = json.loads(self.path.read_text(encoding="utf-8"))
+        self.assertEqual(data, {"next": 4, "topics": {"a.md": 1, "b.md": 2, "c.md": 3}})
+
+    def test_known_lessons_do_not_rewrite_the_file(self):
+        b.assign_topic_nums(self.config, ["a.md", "b.md"])
+        # Formato distinto del que escribe el build: si se reescribiera, cambiaria.
+        self.path.write_text('{"topics": {"b.md": 2, "a.md": 1}, "next": 3}', encoding="utf-8")
+        before = self.path.stat().st_mtime_ns
+        for _ in range(3):
+            self.assertEqual(b.assign_topic_nums(self.config, ["b.md", "a.md"]), {"b.md": 2, "a.md": 1})
+        self.assertEqual(self.path.read_text(encoding="utf-8"), '{"topics": {"b.md": 2, "a.md": 1}, "next": 3}')
+        self.assertEqual(self.path.stat().st_mtime_ns, before)
+        self.assertEqual(list(self.path.parent.iterdir()), [self.path])
+
+    def test_ids_of_removed_lessons_are_not_reused(self):
+        b.assign_topic_nums(self.config, ["a.md", "b.md"])
+        self.assertEqual(b.assign_topic_nums(self.config, ["a.md", "new.md"]), {"a.md": 1, "new.md": 3})
+
+
+if __name__ == "__main__":
+    unittest.main()